@@ -24,6 +24,7 @@ CORS(app, resources={
 
 # Import routes AFTER app is created
 from app.routes import auth, api
+from app import commands
 from app.websocket.routes import websocket_bp
 
 # Register blueprints
@@ -33,5 +34,7 @@ app.register_blueprint(websocket_bp)
 from app.websocket.service import init_websocket_service
 init_websocket_service(app)
 
-with app.app_context():
-    db.create_all()
+# WebSocket worker processes leave the schema to the main process
+if os.getenv("WEBSOCKET_WORKER_INDEX") is None:
+    with app.app_context():
+        db.create_all()
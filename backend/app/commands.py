@@ -0,0 +1,20 @@
+# Maintenance commands, run with: flask --app run <command>
+import click
+from app import app
+from app.services.summary_service import ConversationSummaryService
+from app.services.user_search import UserSearchService
+
+
+@app.cli.command("backfill-summaries")
+@click.option("--batch-size", default=500, show_default=True, help="Conversations per transaction")
+def backfill_summaries(batch_size):
+    """Rebuild conversation_summaries from the message history"""
+    processed = ConversationSummaryService.backfill(batch_size=batch_size)
+    click.echo(f"Rebuilt summaries for {processed} conversations")
+
+
+@app.cli.command("rebuild-user-search")
+def rebuild_user_search():
+    """Re-fill the SQLite user search index from the users table"""
+    indexed = UserSearchService.rebuild_index()
+    click.echo(f"Indexed {indexed} users")
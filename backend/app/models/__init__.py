@@ -3,5 +3,7 @@ from .user import User
 from .converstaions import Conversations
 from .messages import Messages
 from .message_status import MessageStatus
+from .conversation_summary import ConversationSummary
+from . import user_search  # search index DDL for db.create_all()
 
-__all__ = ['db', 'User', 'Conversations', 'Messages', 'MessageStatus']
+__all__ = ['db', 'User', 'Conversations', 'Messages', 'MessageStatus', 'ConversationSummary']
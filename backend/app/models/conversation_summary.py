@@ -0,0 +1,33 @@
+from .database import db
+from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy import Integer, Text, DateTime, ForeignKey
+from datetime import datetime
+from typing import Optional
+
+
+class ConversationSummary(db.Model):
+    """Per-participant summary of a conversation (last message, unread counter, read watermarks).
+
+    Maintained on write by ChatService so the contacts sidebar doesn't have to
+    aggregate over messages / message_status.
+    """
+    __tablename__ = "conversation_summaries"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    conversation_id: Mapped[int] = mapped_column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    peer_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    last_message_preview: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Read / delivered watermarks: every message from the peer with id <= watermark is read / delivered
+    last_read_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_delivered_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    conversation = relationship("Conversations", back_populates="summaries")
+
+    __table_args__ = (
+        db.UniqueConstraint('conversation_id', 'user_id', name='unique_conversation_summary'),
+        # Sidebar read: all rows of a user ordered by latest activity
+        db.Index('ix_conversation_summaries_user_last_message', 'user_id', 'last_message_at'),
+    )
@@ -2,7 +2,7 @@ from .database import db
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy import Integer, String, Text, Boolean, DateTime, ForeignKey
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
 
 class Conversations(db.Model):
@@ -10,14 +10,22 @@ class Conversations(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     sender_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     receiver_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    # Canonical (smaller id, larger id) pair, identical whichever side started the chat
+    min_user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     
     sender = relationship("User", foreign_keys=[sender_id], backref="conversations_as_sender")
     receiver = relationship("User", foreign_keys=[receiver_id], backref="conversations_as_receiver")
     messages = relationship("Messages", back_populates="conversation", cascade="all, delete-orphan")
+    summaries = relationship("ConversationSummary", back_populates="conversation", cascade="all, delete-orphan")
     
-    # Add unique constraint to prevent duplicate conversations
+    # One conversation per pair of users, regardless of direction
     __table_args__ = (
-        db.UniqueConstraint('sender_id', 'receiver_id', name='unique_conversation'),
+        db.UniqueConstraint('min_user_id', 'max_user_id', name='unique_conversation_pair'),
     )
 
+    @staticmethod
+    def pair_key(user_a: int, user_b: int) -> Tuple[int, int]:
+        return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
 
@@ -6,6 +6,22 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+
+def dialect_insert(model):
+    """INSERT construct of the bound database's dialect.
+
+    Gives access to on_conflict_do_nothing / on_conflict_do_update for upserts
+    on both PostgreSQL and SQLite.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(model)
+
 # Generate the initial migration - create migration script
 # alembic revision --autogenerate -m "init-setup"
 
@@ -15,3 +15,10 @@ class Messages(db.Model):
     conversation = relationship("Conversations", back_populates="messages")
     sender = relationship("User", backref="sent_messages")
     status = relationship("MessageStatus", back_populates="message", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset pagination of conversation history over (created_at, id)
+        db.Index('ix_messages_conversation_created_id', 'conversation_id', 'created_at', 'id'),
+        # Unread range counts above a read watermark
+        db.Index('ix_messages_conversation_id_id', 'conversation_id', 'id'),
+    )
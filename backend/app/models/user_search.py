@@ -0,0 +1,69 @@
+"""Search index over users: username, email local part, bio and hobbies.
+
+SQLite:     users_fts, an FTS5 table keyed by user id, kept in sync by triggers
+            on users.
+PostgreSQL: expression indexes on users (a tsvector GIN index plus pg_trgm
+            indexes on username and the email local part), which the database
+            maintains itself.
+Both:       ix_users_username_prefix, a b-tree on lower(username) (in byte
+            order on PostgreSQL) for ordered username prefix scans.
+
+db.create_all() creates them through the after_create hook below; existing
+databases get them from the add_user_search_index and add_username_prefix_index
+migrations. The expressions here must stay identical to the ones in those
+migrations, or PostgreSQL won't use the indexes.
+"""
+from sqlalchemy import DDL, event
+from .user import User
+
+# Email without its domain, so searching for the domain doesn't match everyone
+SQLITE_EMAIL_LOCAL = "CASE WHEN instr({row}.email, '@') > 0 THEN substr({row}.email, 1, instr({row}.email, '@') - 1) ELSE {row}.email END"
+
+SQLITE_SEARCH_DDL = [
+    # prefix='2 3': extra index entries so 2 and 3 character prefix queries don't scan the whole term list
+    """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, email_local, bio, hobbies,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+        VALUES (new.id, new.username, {SQLITE_EMAIL_LOCAL.format(row="new")}, new.bio, new.hobbies);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, email, bio, hobbies ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = old.id;
+        INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+        VALUES (new.id, new.username, {SQLITE_EMAIL_LOCAL.format(row="new")}, new.bio, new.hobbies);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = old.id;
+    END""",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_prefix ON users (lower(username))",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM users_fts",
+    f"""INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+        SELECT id, username, {SQLITE_EMAIL_LOCAL.format(row="users")}, bio, hobbies FROM users""",
+]
+
+PG_EMAIL_LOCAL = "lower(split_part(email, '@', 1))"
+# "C" collation: byte order, so a prefix is a contiguous range of the index
+PG_USERNAME_PREFIX = '(lower(username) COLLATE "C")'
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(split_part(email, '@', 1), '')"
+    " || ' ' || coalesce(bio, '') || ' ' || coalesce(hobbies, ''))"
+)
+
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_users_search_document ON users USING gin ({PG_DOCUMENT})",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_users_email_local_trgm ON users USING gin ({PG_EMAIL_LOCAL} gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_users_username_prefix ON users ({PG_USERNAME_PREFIX})",
+]
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(User.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(User.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -2,7 +2,8 @@ from flask import jsonify, request
 from app import app
 from app.models import User, db
 from app.services.chat_service import ChatService
-from app.services.auth_service import AuthService
+from app.services.message_writer import message_writer
+from app.services.profile_cache import profile_cache
 from app.utils.decorators import authenticate_user, jwt_required
 from sqlalchemy import select
 
@@ -59,10 +60,7 @@ def get_conversation_messages():
         
         conversation_id = data['conversation_id']
         
-        user_conversations = ChatService.get_user_conversations(user_id)
-        conversation_ids = [conv.id for conv in user_conversations]
-        
-        if conversation_id not in conversation_ids:
+        if not ChatService.is_conversation_participant(user_id, conversation_id):
             return jsonify({"error": "Access denied: You don't have access to this conversation"}), 403
         
         messages = ChatService.get_conversation_messages(conversation_id)
@@ -70,18 +68,22 @@ def get_conversation_messages():
         if not messages:
             return jsonify({"error": "Conversation not found or no messages"}), 404
         
-        # Format response using relationships instead of IDs
+        statuses = ChatService.get_message_statuses(messages)
+        # One query at most for all the senders, instead of a User row per sender
+        senders = profile_cache.get_many(message.sender_id for message in messages)
+        
         message_list = []
         for message in messages:
+            sender = senders.get(message.sender_id)
             message_data = {
                 "id": message.id,
-                "conversation_id": message.conversation.id,
-                "sender_username": message.sender.username,
-                "sender_id": message.sender.id,
+                "conversation_id": message.conversation_id,
+                "sender_username": sender.username if sender else None,
+                "sender_id": message.sender_id,
                 "content": message.content,
                 "message_type": message.message_type,
                 "created_at": message.created_at.isoformat(),
-                "status": message.status.status if message.status else "sent"
+                "status": statuses[message.id]
             }
             message_list.append(message_data)
         
@@ -113,22 +115,19 @@ def get_message():
         if not message:
             return jsonify({"error": "Message not found"}), 404
         
-        user_conversations = ChatService.get_user_conversations(user_id)
-        conversation_ids = [conv.id for conv in user_conversations]
-        
-        if message.conversation.id not in conversation_ids:
+        if not ChatService.is_conversation_participant(user_id, message.conversation_id):
             return jsonify({"error": "Access denied: You don't have access to this message"}), 403
         
-        # Use relationships instead of IDs
+        sender = profile_cache.get(message.sender_id)
         message_data = {
             "id": message.id,
-            "conversation_id": message.conversation.id,
-            "sender_username": message.sender.username,
-            "sender_id": message.sender.id,
+            "conversation_id": message.conversation_id,
+            "sender_username": sender.username if sender else None,
+            "sender_id": message.sender_id,
             "content": message.content,
             "message_type": message.message_type,
             "created_at": message.created_at.isoformat(),
-            "status": message.status.status if message.status else "sent"
+            "status": ChatService.get_message_statuses([message])[message.id]
         }
         
         return jsonify({"message": message_data})
@@ -152,21 +151,21 @@ def send_message():
         content = data['content']
         message_type = data.get('message_type', 'text')
         
-        receiver = db.session.get(User, receiver_id)
-        if not receiver:
+        if not profile_cache.get(receiver_id):
             return jsonify({"error": "Receiver not found"}), 404
         
         message = ChatService.send_message(sender_id, receiver_id, content, message_type)
+        sender = profile_cache.get(sender_id)
         
         message_data = {
             "id": message.id,
-            "conversation_id": message.conversation.id,
-            "sender_username": message.sender.username,
-            "sender_id": message.sender.id,
+            "conversation_id": message.conversation_id,
+            "sender_username": sender.username if sender else None,
+            "sender_id": message.sender_id,
             "content": message.content,
             "message_type": message.message_type,
             "created_at": message.created_at.isoformat(),
-            "status": message.status.status if message.status else "sent"
+            "status": ChatService.get_message_statuses([message])[message.id]
         }
         
         return jsonify({
@@ -198,11 +197,15 @@ def get_chat_conversation(user_id):
         current_user_id = request.jwt_user.id
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        before = request.args.get('before')
+        after = request.args.get('after')
         
         messages = ChatService.get_conversation_messages_formatted(
-            current_user_id, user_id, page, per_page
+            current_user_id, user_id, page, per_page, before=before, after=after
         )
         return jsonify(messages)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -211,12 +214,14 @@ def get_chat_conversation(user_id):
 def get_chat_user_profile(user_id):
     """Get user profile for chat"""
     try:
-        user = AuthService.get_user_by_id(user_id)
-        if not user:
+        profile = profile_cache.get(user_id)
+        if not profile:
             return jsonify({"error": "User not found"}), 404
             
-        profile_data = user.to_dict(include_private=False)
-        profile_data["last_online"] = user.last_seen.isoformat() if user.last_seen else None
+        profile_data = profile.to_dict()
+        # last_seen moves with every visit, so it is read fresh rather than cached
+        last_seen = db.session.execute(select(User.last_seen).where(User.id == user_id)).scalar()
+        profile_data["last_online"] = last_seen.isoformat() if last_seen else None
         
         return jsonify(profile_data)
     except Exception as e:
@@ -235,14 +240,14 @@ def send_chat_message():
         if not recipient_id or not content:
             return jsonify({"error": "Recipient ID and content are required"}), 400
             
-        message = ChatService.send_message(request.jwt_user.id, recipient_id, content, message_type)
+        message = message_writer.send_message(request.jwt_user.id, recipient_id, content, message_type)
 
         # Push live update to recipient over WebSocket (best-effort).
         try:
             from app.websocket.server import schedule_send_to_user
 
             # Get sender's profile picture
-            sender_pfp = request.jwt_user.profile_pic or "/avatars/male_avatar.png"
+            sender_pfp = request.jwt_user.pfp
 
             schedule_send_to_user(
                 int(recipient_id),
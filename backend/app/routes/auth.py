@@ -2,6 +2,8 @@ from flask import jsonify, redirect, request, abort, url_for, make_response
 from app import app  
 from app.models import db, User
 from app.services.auth_service import AuthService
+from app.services.profile_cache import profile_cache
+from app.services.suggestions import suggestion_store
 from app.utils.decorators import jwt_required
 from flask_login import login_required, logout_user, login_user, current_user, LoginManager
 from authlib.integrations.flask_client import OAuth
@@ -170,7 +172,7 @@ def delete_account():
 @app.route("/api/auth/profile", methods=["PUT"])
 @jwt_required
 def update_profile():
-    user = request.jwt_user
+    user = db.get_or_404(User, request.jwt_user.id)
     data = request.get_json(silent=True) or {}  #Safely parses JSON body (returns None if invalid JSON)
 
     if "age" in data:
@@ -191,4 +193,6 @@ def update_profile():
             user.hobbies = str(hobbies).strip()
 
     db.session.commit()
+    profile_cache.invalidate(user.id)
+    suggestion_store.invalidate(user.id)
     return jsonify(user.to_dict(include_private=True)), 200
\ No newline at end of file
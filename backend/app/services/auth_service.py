@@ -1,6 +1,8 @@
 from app.models import db, User, Conversations,MessageStatus
 from sqlalchemy import select, or_
 from datetime import datetime
+from app.services.profile_cache import profile_cache
+from app.services.suggestions import suggestion_store
 
 #  institute's domain 
 ALLOWED_DOMAIN = 'nitc.ac.in'
@@ -110,11 +112,17 @@ class AuthService:
                 )
             ).all()
 
+            conversation_ids = [conv.id for conv in conversations]
             for conv in conversations:
                 db.session.delete(conv)
 
             db.session.delete(user)
             db.session.commit()
+            profile_cache.invalidate(user_id)
+            suggestion_store.discard(user_id)
+
+            from app.services.chat_service import ChatService
+            ChatService.forget_conversation_membership(conversation_ids)
             return {"success": True}
         except Exception as e:
             db.session.rollback()
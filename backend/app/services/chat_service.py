@@ -1,8 +1,37 @@
-from sqlalchemy import select, and_, or_, desc, func
-from app.models import db, User, Conversations, Messages, MessageStatus
+import base64
+from datetime import datetime
+from sqlalchemy import event, select, update, and_, or_, desc, func, tuple_
+from app.models import db, User, Conversations, Messages, MessageStatus, ConversationSummary
+from app.models.database import dialect_insert
 from app.websocket.redis_manager import redis_manager
 from app.services.auth_service import AuthService
-from typing import List, Optional, Dict, Any
+from app.services.membership_cache import membership_cache
+from app.services.profile_cache import DEFAULT_PROFILE_PIC, profile_cache
+from app.services.suggestions import suggestion_store
+from app.services.user_search import UserSearchService
+from app.services.summary_service import ConversationSummaryService, READ_TRACKING_MODE
+from typing import List, Optional, Dict, Any, Tuple
+
+# Upper bound for per_page on conversation history requests
+MAX_MESSAGES_PER_PAGE = 100
+
+# Users who got a new contact in the current transaction. Their suggestion lists
+# are invalidated once it commits: before that, a refresh would still see them
+# as strangers and put the new contact back in.
+NEW_CONTACTS_KEY = "new_contacts"
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_new_contacts(session):
+    user_ids = session.info.pop(NEW_CONTACTS_KEY, None)
+    if user_ids:
+        suggestion_store.invalidate(*user_ids)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_new_contacts(session):
+    session.info.pop(NEW_CONTACTS_KEY, None)
+
 
 class ChatService:
     
@@ -20,28 +49,60 @@ class ChatService:
         return conversations
     
     @staticmethod
-    def get_or_create_conversation(sender_id: int, receiver_id: int) -> Conversations:
-        conversation = db.session.execute(
-            select(Conversations).where(
-                or_(
-                    and_(
-                        Conversations.sender_id == sender_id,
-                        Conversations.receiver_id == receiver_id
-                    ),
-                    and_(
-                        Conversations.sender_id == receiver_id,
-                        Conversations.receiver_id == sender_id
-                    )
-                )
-            )
-        ).scalar_one_or_none()
-        
-        if not conversation:
-            conversation = Conversations(
+    def is_conversation_participant(user_id: int, conversation_id: int) -> bool:
+        """Check if the user is one of the two participants of the conversation"""
+        if membership_cache.contains(conversation_id, user_id):
+            return True
+        generation = membership_cache.generation
+
+        # Primary key lookup, no need to load the user's other conversations
+        participants = db.session.execute(
+            select(Conversations.sender_id, Conversations.receiver_id)
+            .where(Conversations.id == conversation_id)
+        ).one_or_none()
+
+        if not participants or user_id not in (participants.sender_id, participants.receiver_id):
+            return False
+
+        membership_cache.add(conversation_id, user_id, generation)
+        return True
+
+    @staticmethod
+    def forget_conversation_membership(conversation_ids: List[int]):
+        """Drop cached membership for deleted conversations, in every process"""
+        membership_cache.forget(conversation_ids)
+
+    @staticmethod
+    def get_or_create_conversation(sender_id: int, receiver_id: int, commit: bool = True) -> Conversations:
+        """Get the conversation between two users, creating it atomically if needed.
+
+        Lookups go through the unique (min_user_id, max_user_id) index. Creation
+        is an INSERT .. ON CONFLICT DO NOTHING, so two first messages racing in
+        opposite directions end up in the same row without a retry.
+        """
+        conversation = ChatService.get_conversation_between_users(sender_id, receiver_id)
+        if conversation:
+            return conversation
+
+        min_user_id, max_user_id = Conversations.pair_key(sender_id, receiver_id)
+        created_id = db.session.execute(
+            dialect_insert(Conversations)
+            .values(
                 sender_id=sender_id,
-                receiver_id=receiver_id
+                receiver_id=receiver_id,
+                min_user_id=min_user_id,
+                max_user_id=max_user_id
             )
-            db.session.add(conversation)
+            .on_conflict_do_nothing(index_elements=["min_user_id", "max_user_id"])
+            .returning(Conversations.id)
+        ).scalar_one_or_none()
+
+        conversation = ChatService.get_conversation_between_users(sender_id, receiver_id)
+        if created_id is not None:
+            ConversationSummaryService.create_for_conversation(conversation)
+            # Each user is now a contact of the other, which suggestions leave out
+            db.session.info.setdefault(NEW_CONTACTS_KEY, set()).update((sender_id, receiver_id))
+        if commit:
             db.session.commit()
         
         return conversation
@@ -60,7 +121,15 @@ class ChatService:
     
     @staticmethod
     def send_message(sender_id: int, recipient_id: int, content: str, message_type: str = "text") -> Messages:
-        conversation = ChatService.get_or_create_conversation(sender_id, recipient_id)
+        message = ChatService.write_message(sender_id, recipient_id, content, message_type)
+        db.session.commit()
+        
+        return message
+    
+    @staticmethod
+    def write_message(sender_id: int, recipient_id: int, content: str, message_type: str = "text") -> Messages:
+        """Add a message with its status / summary updates to the current transaction without committing"""
+        conversation = ChatService.get_or_create_conversation(sender_id, recipient_id, commit=False)
         
         message = Messages(
             conversation_id=conversation.id,
@@ -71,13 +140,14 @@ class ChatService:
         db.session.add(message)
         db.session.flush()  # Get message ID
         
-        status = MessageStatus(
-            message_id=message.id,
-            recipient_id=recipient_id,
-            status="sent"
-        )
-        db.session.add(status)
-        db.session.commit()
+        if READ_TRACKING_MODE == "status":
+            status = MessageStatus(
+                message_id=message.id,
+                recipient_id=recipient_id,
+                status="sent"
+            )
+            db.session.add(status)
+        ConversationSummaryService.record_message(message, recipient_id)
         
         return message
     
@@ -86,45 +156,83 @@ class ChatService:
         """Mark a message as delivered"""
         from datetime import datetime
         
-        status = db.session.execute(
-            select(MessageStatus).where(MessageStatus.message_id == message_id)
-        ).scalar_one_or_none()
-        
-        if status and status.status == "sent":
-            status.status = "delivered"
-            status.delivered_at = datetime.utcnow()
-            db.session.commit()
+        message = db.session.get(Messages, message_id)
+        if not message:
+            return
+
+        recipient_id = ChatService.get_recipient_id(message)
+        ConversationSummaryService.mark_delivered(message.conversation_id, recipient_id, message.id)
+
+        if READ_TRACKING_MODE == "status":
+            status = message.status
+            if status and status.status == "sent":
+                status.status = "delivered"
+                status.delivered_at = datetime.utcnow()
+        db.session.commit()
     
     @staticmethod
     def mark_message_as_read(message_id: int):
         """Mark a message as read"""
         from datetime import datetime
         
-        status = db.session.execute(
-            select(MessageStatus).where(MessageStatus.message_id == message_id)
-        ).scalar_one_or_none()
-        
+        message = db.session.get(Messages, message_id)
+        if not message:
+            return
+
+        recipient_id = ChatService.get_recipient_id(message)
+        if READ_TRACKING_MODE == "watermark":
+            ConversationSummaryService.mark_read(message.conversation_id, recipient_id, message.id, recount_unread=True)
+            db.session.commit()
+            return
+
+        ConversationSummaryService.mark_read(message.conversation_id, recipient_id, message.id)
+        status = message.status
         if status:
+            if status.status != "read":
+                ConversationSummaryService.decrement_unread(message.conversation_id, status.recipient_id)
             status.status = "read"
             status.read_at = datetime.utcnow()
             if not status.delivered_at:
                 status.delivered_at = datetime.utcnow()
-            db.session.commit()
+        db.session.commit()
+
+    @staticmethod
+    def get_recipient_id(message: Messages) -> int:
+        conversation = message.conversation
+        return conversation.receiver_id if message.sender_id == conversation.sender_id else conversation.sender_id
+
+    @staticmethod
+    def get_message_statuses(messages: List[Messages]) -> Dict[int, str]:
+        """'sent' / 'delivered' / 'read' for each message, keyed by message id"""
+        if READ_TRACKING_MODE == "status":
+            return {msg.id: msg.status.status if msg.status else "sent" for msg in messages}
+
+        # Watermark mode: compare each message with its recipient's watermarks
+        watermarks = ConversationSummaryService.get_watermarks(msg.conversation_id for msg in messages)
+        statuses = {}
+        for msg in messages:
+            recipient_watermarks = [
+                marks for (conversation_id, user_id), marks in watermarks.items()
+                if conversation_id == msg.conversation_id and user_id != msg.sender_id
+            ]
+            last_read, last_delivered = recipient_watermarks[0] if recipient_watermarks else (None, None)
+            if last_read is not None and msg.id <= last_read:
+                statuses[msg.id] = "read"
+            elif last_delivered is not None and msg.id <= last_delivered:
+                statuses[msg.id] = "delivered"
+            else:
+                statuses[msg.id] = "sent"
+        return statuses
     
     @staticmethod
     def get_conversation_between_users(sender_id: int, receiver_id: int) -> Optional[Conversations]:
         """Get conversation between two specific users"""
+        min_user_id, max_user_id = Conversations.pair_key(sender_id, receiver_id)
         return db.session.execute(
             select(Conversations).where(
-                or_(
-                    and_(
-                        Conversations.sender_id == sender_id,
-                        Conversations.receiver_id == receiver_id
-                    ),
-                    and_(
-                        Conversations.sender_id == receiver_id,
-                        Conversations.receiver_id == sender_id
-                    )
+                and_(
+                    Conversations.min_user_id == min_user_id,
+                    Conversations.max_user_id == max_user_id
                 )
             )
         ).scalar_one_or_none()
@@ -132,78 +240,99 @@ class ChatService:
     @staticmethod
     def get_user_contacts_with_details(user_id: int) -> List[Dict[str, Any]]:
         """Get user's chat contacts with latest messages and metadata"""
-        conversations = ChatService.get_user_conversations(user_id)
-        
+        # One indexed read of the user's summary rows joined with the peer profile
+        rows = db.session.execute(
+            select(
+                ConversationSummary.conversation_id,
+                ConversationSummary.last_message_preview,
+                ConversationSummary.last_message_at,
+                ConversationSummary.unread_count,
+                User.id.label("user_id"),
+                User.username,
+                User.profile_pic,
+                User.last_seen
+            )
+            .join(User, User.id == ConversationSummary.peer_id)
+            .where(ConversationSummary.user_id == user_id)
+            # Sort by latest message time, conversations without messages last
+            .order_by(ConversationSummary.last_message_at.is_(None), desc(ConversationSummary.last_message_at))
+        ).all()
+
+        online_status = redis_manager.are_users_online([row.user_id for row in rows])
+
         contacts = []
-        for conv in conversations:
-            # Get the other user in conversation
-            other_user = conv.receiver if conv.sender_id == user_id else conv.sender
-            
-            # Get latest message
-            latest_message = db.session.execute(
-                select(Messages)
-                .where(Messages.conversation_id == conv.id)
-                .order_by(desc(Messages.created_at))
-                .limit(1)
-            ).scalar_one_or_none()
-            
-            # Count unread messages
-            unread_count = db.session.execute(
-                select(func.count(MessageStatus.id))
-                .select_from(Messages)
-                .join(MessageStatus, Messages.id == MessageStatus.message_id)
-                .where(
-                    and_(
-                        Messages.conversation_id == conv.id,
-                        Messages.sender_id != user_id,  # Messages from other user
-                        MessageStatus.recipient_id == user_id,
-                        MessageStatus.status.in_(['delivered', 'sent'])  # Not read yet
-                    )
-                )
-            ).scalar() or 0
-            
-            # Check if user is online
-            is_online = redis_manager.is_user_online(other_user.id)
-            
-            contact_data = {
-                "id": str(other_user.id),
-                "conversation_id": conv.id,
-                "name": other_user.username,
-                "pfp_path": other_user.profile_pic or "/avatars/male_avatar.png",
-                "latest_msg": latest_message.content if latest_message else "No messages yet",
-                "latest_msg_time": latest_message.created_at.isoformat() if latest_message else None,
-                "unread_count": unread_count,
-                "is_online": is_online,
-                "last_online": AuthService.get_last_online_message(other_user)
-            }
-            
-            contacts.append(contact_data)
-        
-        # Sort by latest message time
-        contacts.sort(key=lambda x: x['latest_msg_time'] or '', reverse=True)
+        for row in rows:
+            contacts.append({
+                "id": str(row.user_id),
+                "conversation_id": row.conversation_id,
+                "name": row.username,
+                "pfp_path": row.profile_pic or "/avatars/male_avatar.png",
+                "latest_msg": row.last_message_preview if row.last_message_at else "No messages yet",
+                "latest_msg_time": row.last_message_at.isoformat() if row.last_message_at else None,
+                "unread_count": row.unread_count,
+                "is_online": online_status.get(row.user_id, False),
+                "last_online": AuthService.get_last_online_message(row)
+            })
+
         return contacts
     
     @staticmethod
-    def get_conversation_messages_formatted(current_user_id: int, other_user_id: int, page: int = 1, per_page: int = 50) -> List[Dict[str, Any]]:
-        """Get formatted conversation messages for API response"""
+    def encode_cursor(message: Messages) -> str:
+        """Opaque pagination cursor for a message's (created_at, id) position"""
+        raw = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Inverse of encode_cursor, raises ValueError for malformed cursors"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, message_id = raw.split("|")
+            return datetime.fromisoformat(created_at), int(message_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def get_conversation_messages_formatted(current_user_id: int, other_user_id: int, page: int = 1, per_page: int = 50,
+                                            before: Optional[str] = None, after: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get formatted conversation messages for API response
+
+        With `before` / `after` cursors the page is selected by keyset over
+        (created_at, id), which stays an index range scan however deep the
+        client scrolls. Without a cursor the latest messages are returned
+        (`page` is kept for older clients).
+        """
+        per_page = max(1, min(per_page, MAX_MESSAGES_PER_PAGE))
         conversation = ChatService.get_or_create_conversation(current_user_id, other_user_id)
         
-        # Get messages with pagination
-        messages_query = (
-            select(Messages)
-            .where(Messages.conversation_id == conversation.id)
-            .order_by(desc(Messages.created_at))
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-        )
-        
-        messages = db.session.execute(messages_query).scalars().all()
+        position = tuple_(Messages.created_at, Messages.id)
+        messages_query = select(Messages).where(Messages.conversation_id == conversation.id)
+
+        if after:
+            # Newer than the cursor, oldest first
+            messages_query = (
+                messages_query
+                .where(position > ChatService.decode_cursor(after))
+                .order_by(Messages.created_at.asc(), Messages.id.asc())
+                .limit(per_page)
+            )
+            messages = db.session.execute(messages_query).scalars().all()
+        else:
+            if before:
+                messages_query = messages_query.where(position < ChatService.decode_cursor(before))
+            elif page > 1:
+                messages_query = messages_query.offset((page - 1) * per_page)
+
+            messages_query = messages_query.order_by(desc(Messages.created_at), desc(Messages.id)).limit(per_page)
+            # Reverse to get chronological order
+            messages = list(reversed(db.session.execute(messages_query).scalars().all()))
         
         # Convert to JSON format expected by frontend
         message_list = []
-        for msg in reversed(messages):  # Reverse to get chronological order
+        for msg in messages:
             message_data = {
                 "id": str(msg.id),
+                "cursor": ChatService.encode_cursor(msg),
                 "type": "sent" if msg.sender_id == current_user_id else "received",
                 "msg": msg.content,
                 "timestamp": msg.created_at.isoformat(),
@@ -212,8 +341,8 @@ class ChatService:
             
             # Add profile picture for received messages
             if msg.sender_id != current_user_id:
-                sender = msg.sender
-                message_data["pfp"] = sender.profile_pic or "/avatars/male_avatar.png"
+                sender = profile_cache.get(msg.sender_id)
+                message_data["pfp"] = sender.pfp if sender else DEFAULT_PROFILE_PIC
                 
             message_list.append(message_data)
         
@@ -224,44 +353,41 @@ class ChatService:
     
     @staticmethod
     def mark_conversation_messages_as_read(conversation_id: int, user_id: int):
-        """Mark all unread messages in a conversation as read for a user"""
+        """Mark all unread messages in a conversation as read for a user.
+
+        Every history page fetch calls this; the summary row tells whether
+        anything is unread, so re-reading a read conversation writes nothing.
+        """
         from datetime import datetime
         
-        unread_statuses = db.session.execute(
-            select(MessageStatus)
-            .join(Messages, MessageStatus.message_id == Messages.id)
-            .where(
-                and_(
-                    Messages.conversation_id == conversation_id,
-                    MessageStatus.recipient_id == user_id,
-                    MessageStatus.status.in_(['delivered', 'sent'])
+        if not ConversationSummaryService.has_unread(conversation_id, user_id):
+            return
+
+        if READ_TRACKING_MODE == "status":
+            db.session.execute(
+                update(MessageStatus)
+                .where(
+                    and_(
+                        MessageStatus.recipient_id == user_id,
+                        MessageStatus.status.in_(['delivered', 'sent']),
+                        MessageStatus.message_id.in_(
+                            select(Messages.id).where(Messages.conversation_id == conversation_id)
+                        )
+                    )
                 )
+                .values(status='read', read_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
             )
-        ).scalars().all()
-        
-        for status in unread_statuses:
-            status.status = 'read'
-            status.read_at = datetime.utcnow()
         
+        ConversationSummaryService.mark_all_read(conversation_id, user_id)
         db.session.commit()
     
     @staticmethod
     def search_users(query: str, current_user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search for users to start conversations"""
-        users = db.session.execute(
-            select(User)
-            .where(
-                and_(
-                    or_(
-                        User.username.ilike(f'%{query}%'),
-                        User.email.ilike(f'%{query}%')
-                    ),
-                    User.id != current_user_id
-                )
-            )
-            .limit(limit)
-        ).scalars().all()
+        """Search for users to start conversations, best match first"""
+        users = UserSearchService.search(query, current_user_id, limit)
         
+        online_status = redis_manager.are_users_online([user.id for user in users])
         results = []
         for user in users:
             results.append({
@@ -269,7 +395,7 @@ class ChatService:
                 "name": user.username,
                 "email": user.email,
                 "pfp_path": user.profile_pic or "/avatars/male_avatar.png",
-                "is_online": redis_manager.is_user_online(user.id),
+                "is_online": online_status[user.id],
                 "age": user.age,
                 "sex": user.sex,
                 "hobbies": user.hobbies.split(",") if user.hobbies else [],
@@ -280,22 +406,23 @@ class ChatService:
 
     @staticmethod
     def suggest_users(current_user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Suggested users list (used for Find tab and when search is empty)."""
-        users = db.session.execute(
-            select(User)
-            .where(User.id != current_user_id)
-            .order_by(desc(User.last_seen), desc(User.created_at))
-            .limit(limit)
-        ).scalars().all()
+        """Suggested users list (used for Find tab and when search is empty), best match first.
+
+        Reads the user's precomputed list (see SuggestionStore) and renders it
+        from the profile cache, so a warm call doesn't touch the database.
+        """
+        ids = suggestion_store.get(current_user_id, limit)
+        profiles = profile_cache.get_many(ids)
+        users = [profiles[user_id] for user_id in ids if user_id in profiles]
 
+        online_status = redis_manager.are_users_online([user.id for user in users])
         results = []
         for user in users:
             results.append({
                 "id": user.id,
                 "name": user.username,
-                "email": user.email,
-                "pfp_path": user.profile_pic or "/avatars/male_avatar.png",
-                "is_online": redis_manager.is_user_online(user.id),
+                "pfp_path": user.pfp,
+                "is_online": online_status[user.id],
                 "age": user.age,
                 "sex": user.sex,
                 "hobbies": user.hobbies.split(",") if user.hobbies else [],
@@ -307,18 +434,20 @@ class ChatService:
     @staticmethod
     def get_online_contacts(user_id: int) -> List[Dict[str, Any]]:
         """Get list of online users from user's contacts"""
-        user_conversations = ChatService.get_user_conversations(user_id)
+        contacts = db.session.execute(
+            select(User.id, User.username, User.profile_pic)
+            .join(ConversationSummary, ConversationSummary.peer_id == User.id)
+            .where(ConversationSummary.user_id == user_id)
+        ).all()
         
+        online_status = redis_manager.are_users_online([contact.id for contact in contacts])
         online_users = []
-        for conv in user_conversations:
-            other_user = conv.receiver if conv.sender_id == user_id else conv.sender
-            if redis_manager.is_user_online(other_user.id):
+        for contact in contacts:
+            if online_status[contact.id]:
                 online_users.append({
-                    "id": other_user.id,
-                    "name": other_user.username,
-                    "pfp_path": other_user.profile_pic  or "/avatars/male_avatar.png"
+                    "id": contact.id,
+                    "name": contact.username,
+                    "pfp_path": contact.profile_pic  or "/avatars/male_avatar.png"
                 })
                 
         return online_users
-
-
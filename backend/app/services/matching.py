@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from app.models import db, User, ConversationSummary
+from app.services.profile_cache import profile_cache
+
+# Score = TAG_WEIGHT * hobby overlap + AGE_WEIGHT * age proximity + RECENCY_WEIGHT * recency, each in [0, 1]
+TAG_WEIGHT = 0.6
+AGE_WEIGHT = 0.25
+RECENCY_WEIGHT = 0.15
+# Age proximity halves roughly every 3.5 years of difference, recency every ~10 days
+AGE_SCALE_YEARS = 5.0
+RECENCY_SCALE_DAYS = 14.0
+# Proximity given to candidates who didn't set an age
+UNKNOWN_AGE_PROXIMITY = 0.5
+MAX_AGE = 127
+# Stored in place of a missing age: |NO_AGE - age| > MAX_AGE for every valid age, and
+# AGE_PROXIMITY maps all those differences to UNKNOWN_AGE_PROXIMITY
+NO_AGE = 1000
+
+AGE_PROXIMITY = np.full(NO_AGE + 1, UNKNOWN_AGE_PROXIMITY, dtype=np.float32)
+AGE_PROXIMITY[:MAX_AGE + 1] = np.exp(-np.arange(MAX_AGE + 1) / AGE_SCALE_YEARS)
+
+
+def valid_age(age: Optional[int]) -> bool:
+    return age is not None and 0 <= age <= MAX_AGE
+
+
+def normalize_hobbies(hobbies: Optional[str]) -> List[str]:
+    """Comma-joined hobbies as distinct tags: 'Hiking, board  Games,hiking' -> ['hiking', 'board games']"""
+    if not hobbies:
+        return []
+    return list(dict.fromkeys(
+        tag for tag in (" ".join(raw.lower().lstrip("#").split()) for raw in hobbies.split(",")) if tag
+    ))
+
+
+class MatchingSnapshot:
+    """Read-only users x tags matrix plus the per-user columns the score needs.
+
+    Rows are users in id order. The matrix is stored column-wise: the rows of
+    the users having tag t are rows[offsets[t]:offsets[t + 1]], so scoring a
+    user only touches the postings of their own tags.
+    """
+
+    def __init__(self, user_ids: np.ndarray, ages: np.ndarray, inverse_norms: np.ndarray, recency: np.ndarray,
+                 vocabulary: Dict[str, int], offsets: np.ndarray, rows: np.ndarray):
+        self.user_ids = user_ids
+        self.ages = ages
+        # 1 / sqrt(number of tags of the user), for cosine similarity
+        self.inverse_norms = inverse_norms
+        self.recency = recency
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, users: Iterable[tuple]) -> "MatchingSnapshot":
+        """users: (id, age, hobbies, last active datetime) ordered by id"""
+        vocabulary: Dict[str, int] = {}
+        postings: List[List[int]] = []
+        user_ids, ages, tag_counts, active = [], [], [], []
+
+        for row, (user_id, age, hobbies, last_active) in enumerate(users):
+            tags = normalize_hobbies(hobbies)
+            for tag in tags:
+                tag_id = vocabulary.get(tag)
+                if tag_id is None:
+                    tag_id = vocabulary[tag] = len(postings)
+                    postings.append([])
+                postings[tag_id].append(row)
+            user_ids.append(user_id)
+            ages.append(age if valid_age(age) else NO_AGE)
+            tag_counts.append(len(tags))
+            active.append(last_active)
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(posting) for posting in postings], out=offsets[1:])
+
+        idle_days = (np.datetime64(datetime.utcnow(), "s") - np.array(active, dtype="datetime64[s]")) / np.timedelta64(1, "D")
+        recency = np.exp(-np.nan_to_num(np.maximum(idle_days, 0), nan=np.inf) / RECENCY_SCALE_DAYS)
+
+        return cls(
+            user_ids=np.array(user_ids, dtype=np.int64),
+            ages=np.array(ages, dtype=np.int16),
+            inverse_norms=(1 / np.sqrt(np.maximum(tag_counts, 1))).astype(np.float32),
+            recency=recency.astype(np.float32),
+            vocabulary=vocabulary,
+            offsets=offsets,
+            rows=np.fromiter(chain.from_iterable(postings), dtype=np.int32, count=int(offsets[-1])),
+        )
+
+    def scores(self, tags: List[str], age: Optional[int]) -> np.ndarray:
+        """Score of every row for a user with these tags and age"""
+        scores = RECENCY_WEIGHT * self.recency
+
+        tag_ids = [self.vocabulary[tag] for tag in tags if tag in self.vocabulary]
+        if tag_ids:
+            # Cosine similarity of the two tag sets: every shared tag adds
+            # 1 / sqrt(len(tags) * len(their tags))
+            hits = np.concatenate([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in tag_ids])
+            shared = np.bincount(hits, weights=self.inverse_norms[hits], minlength=len(scores))
+            scores += (TAG_WEIGHT / np.sqrt(len(tags))) * shared.astype(np.float32)
+
+        if valid_age(age):
+            scores += AGE_WEIGHT * AGE_PROXIMITY[np.abs(self.ages - np.int16(age))]
+
+        return scores
+
+    def top(self, tags: List[str], age: Optional[int], exclude: Iterable[int], limit: int) -> List[int]:
+        """Ids of the `limit` best scoring users, best first, leaving out the `exclude` ids"""
+        if limit <= 0 or not len(self.user_ids):
+            return []
+        scores = self.scores(tags, age)
+
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.user_ids, exclude), len(self.user_ids) - 1)
+        scores[positions[self.user_ids[positions] == exclude]] = -np.inf
+
+        k = min(limit, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        best = best[np.isfinite(scores[best])]
+        return self.user_ids[best].tolist()
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.user_ids, self.ages, self.inverse_norms, self.recency, self.offsets, self.rows))
+
+
+class MatchingIndex:
+    """Friend suggestions scored in bulk over a MatchingSnapshot of all users.
+
+    The snapshot is rebuilt from the users table once it is older than `ttl`
+    seconds, by the first request that notices (the others keep scoring
+    against the previous snapshot meanwhile). The suggesting user's own
+    hobbies and age come from the profile cache, so their edits apply
+    immediately; other users' edits and new users show up after a rebuild.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.snapshot: Optional[MatchingSnapshot] = None
+        self.lock = threading.Lock()
+        self.builds = 0
+        self.last_build_seconds: Optional[float] = None
+        self.queries = 0
+        self.score_seconds = 0.0
+
+    def current(self) -> MatchingSnapshot:
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() - snapshot.built_at < self.ttl:
+            return snapshot
+        # Only one thread rebuilds; the others keep using the old snapshot, if there is one
+        if self.lock.acquire(blocking=snapshot is None):
+            try:
+                if self.snapshot is snapshot:
+                    self.rebuild()
+            finally:
+                self.lock.release()
+        return self.snapshot
+
+    def rebuild(self) -> MatchingSnapshot:
+        start = time.perf_counter()
+        users = db.session.execute(
+            select(User.id, User.age, User.hobbies, User.last_seen, User.created_at).order_by(User.id)
+        )
+        self.snapshot = MatchingSnapshot.build(
+            (user_id, age, hobbies, last_seen or created_at) for user_id, age, hobbies, last_seen, created_at in users
+        )
+        self.builds += 1
+        self.last_build_seconds = time.perf_counter() - start
+        return self.snapshot
+
+    def suggest(self, user_id: int, limit: int = 10) -> List[int]:
+        """Ids of the best matches for the user, best first, without the user's existing contacts"""
+        profile = profile_cache.get(user_id)
+        if profile is None:
+            return []
+        contacts = db.session.execute(
+            select(ConversationSummary.peer_id).where(ConversationSummary.user_id == user_id)
+        ).scalars().all()
+        snapshot = self.current()
+
+        start = time.perf_counter()
+        ids = snapshot.top(normalize_hobbies(profile.hobbies), profile.age, [user_id, *contacts], limit)
+        self.score_seconds += time.perf_counter() - start
+        self.queries += 1
+        return ids
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "ttl_seconds": self.ttl,
+            "users": len(snapshot.user_ids) if snapshot else 0,
+            "tags": len(snapshot.vocabulary) if snapshot else 0,
+            "user_tags": len(snapshot.rows) if snapshot else 0,
+            "bytes": snapshot.nbytes() if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.built_at, 1) if snapshot else None,
+            "builds": self.builds,
+            "last_build_ms": round(self.last_build_seconds * 1000, 1) if self.last_build_seconds is not None else None,
+            "queries": self.queries,
+            "avg_score_ms": round(self.score_seconds * 1000 / self.queries, 3) if self.queries else None,
+        }
+
+
+matching_index = MatchingIndex(ttl=float(os.getenv("MATCHING_INDEX_TTL_SECONDS", "300")))
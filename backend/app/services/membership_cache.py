@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Tuple
+from app.websocket.redis_manager import redis_manager
+
+# Deleted conversation ids are published here so every process drops them
+MEMBERSHIP_CHANNEL = "chat:membership:forget"
+
+
+class MembershipCache:
+    """Process-local LRU of (conversation_id, user_id) pairs known to be participants, with a TTL.
+
+    Only positive answers are cached; the participants of an existing
+    conversation never change. Deleting conversations drops their entries here
+    and, through Redis pub/sub, in every other process. An entry also expires
+    after `ttl`, which bounds how long a missed invalidation (Redis down, or a
+    SQLite conversation id reused after a delete) can grant access.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 4096):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidation; a lookup that raced one isn't cached
+        self.generation = 0
+        self.listener = None
+        self.listener_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def contains(self, conversation_id: int, user_id: int) -> bool:
+        key = (conversation_id, user_id)
+        with self.lock:
+            expires = self.entries.get(key)
+            if expires is not None and expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+        # Subscribed before the caller reads the database, so no later delete goes unheard
+        self.listen()
+        return False
+
+    def add(self, conversation_id: int, user_id: int, generation: int):
+        """Cache a membership read from the database while self.generation was `generation`"""
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[(conversation_id, user_id)] = time.monotonic() + self.ttl
+            self.entries.move_to_end((conversation_id, user_id))
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def forget(self, conversation_ids: Iterable[int]):
+        """Drop deleted conversations here and in the other processes"""
+        conversation_ids = [int(conversation_id) for conversation_id in conversation_ids]
+        if not conversation_ids:
+            return
+        self.drop(conversation_ids)
+        client = redis_manager.redis_client
+        if client:
+            try:
+                client.publish(MEMBERSHIP_CHANNEL, json.dumps(conversation_ids))
+            except Exception as e:
+                print(f"Error publishing membership invalidation: {e}")
+
+    def drop(self, conversation_ids: Iterable[int]):
+        conversation_ids = set(conversation_ids)
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            for key in [key for key in self.entries if key[0] in conversation_ids]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def listen(self):
+        """Subscribe to the other processes' invalidations, once"""
+        client = redis_manager.redis_client
+        if self.listener is not None or not client:
+            return
+        with self.listener_lock:
+            if self.listener is not None:
+                return
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{MEMBERSHIP_CHANNEL: lambda message: self.drop(json.loads(message["data"]))})
+                self.listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self.on_error)
+            except Exception as e:
+                print(f"Error subscribing to membership invalidations: {e}")
+
+    def on_error(self, error: BaseException, pubsub, thread):
+        # Invalidations may have been missed while disconnected
+        print(f"Membership invalidation listener error: {error}")
+        self.clear()
+        time.sleep(1)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "listening": self.listener is not None,
+        }
+
+
+membership_cache = MembershipCache(
+    ttl=float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "60")),
+    max_size=int(os.getenv("MEMBERSHIP_CACHE_MAX_SIZE", "4096"))
+)
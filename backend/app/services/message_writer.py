@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from typing import List, Optional, Tuple
+from flask import current_app
+from app.models import db, Messages
+from app.services.chat_service import ChatService
+
+
+class GroupCommitWriter:
+    """Opt-in group commit for chat messages (CHAT_GROUP_COMMIT=1).
+
+    Concurrent senders (HTTP requests, WebSocket persistence lanes) hand their
+    message to a single writer thread. The writer collects messages for up to
+    `window_ms` or `max_batch` messages, inserts them all in one transaction and
+    then wakes each caller with its own message. One commit / fsync is shared
+    by the whole batch instead of paid per message.
+
+    Returned messages are detached from any session: their columns (id,
+    conversation_id, created_at, ...) are loaded, relationships are not.
+
+    A caller waits at most `timeout_seconds`. If the writer loop itself fails
+    (not a message's own insert, which is retried alone), every message it
+    holds or has queued fails with that error and the loop starts over.
+    """
+
+    def __init__(self, enabled: bool = False, window_ms: float = 5, max_batch: int = 100,
+                 timeout_seconds: float = 10):
+        self.enabled = enabled
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.timeout = timeout_seconds
+        self.queue: "queue.Queue[Tuple[Tuple, Future]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.app = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.messages = 0
+        self.timeouts = 0
+        self.crashes = 0
+
+    def send_message(self, sender_id: int, recipient_id: int, content: str, message_type: str = "text") -> Messages:
+        """Store a message, through the group commit when enabled. Blocks until it is committed."""
+        if not self.enabled:
+            return ChatService.send_message(sender_id, recipient_id, content, message_type)
+
+        self.start(current_app._get_current_object())
+        future: Future = Future()
+        self.queue.put(((sender_id, recipient_id, content, message_type), future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Withdraws it if still queued; if the writer already took it, it may still be stored
+            future.cancel()
+            self.timeouts += 1
+            raise TimeoutError(f"message not committed within {self.timeout}s") from None
+
+    def start(self, app):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.app = app
+            self.thread = threading.Thread(target=self.run, name="message-writer", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = []
+            try:
+                batch = self.collect()
+                if not batch:
+                    continue
+                with self.app.app_context():
+                    self.write_batch(batch)
+            except Exception as e:
+                self.crashes += 1
+                pending = batch + self.drain()
+                print(f"Message writer failed, failing {len(pending)} pending messages: {e!r}")
+                for _, future in pending:
+                    if not future.done():
+                        try:
+                            future.set_exception(e)
+                        except InvalidStateError:
+                            pass  # cancelled by its caller meanwhile
+
+    def collect(self) -> List[Tuple[Tuple, Future]]:
+        """Next batch: waits for one message, then gathers more for up to the window"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drops messages whose caller timed out; the rest can't be cancelled any more
+        return [(args, future) for args, future in batch if future.set_running_or_notify_cancel()]
+
+    def drain(self) -> List[Tuple[Tuple, Future]]:
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def write_batch(self, batch: List[Tuple[Tuple, Future]]):
+        try:
+            messages = [ChatService.write_message(*args) for args, _ in batch]
+            # Detach before commit so the loaded columns aren't expired for the callers
+            for message in messages:
+                db.session.expunge(message)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Retry one by one so a single bad message doesn't fail the whole batch
+            for args, future in batch:
+                try:
+                    message = ChatService.write_message(*args)
+                    db.session.expunge(message)
+                    db.session.commit()
+                    future.set_result(message)
+                except Exception as e:
+                    db.session.rollback()
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.messages += len(batch)
+        for message, (_, future) in zip(messages, batch):
+            future.set_result(message)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch_size": round(self.messages / self.batches, 2) if self.batches else 0,
+            "queued": self.queue.qsize(),
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "writer_alive": bool(self.thread and self.thread.is_alive()),
+        }
+
+
+message_writer = GroupCommitWriter(
+    enabled=os.getenv("CHAT_GROUP_COMMIT", "0") == "1",
+    window_ms=float(os.getenv("CHAT_GROUP_COMMIT_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("CHAT_GROUP_COMMIT_MAX_BATCH", "100")),
+    timeout_seconds=float(os.getenv("CHAT_GROUP_COMMIT_TIMEOUT_SECONDS", "10"))
+)
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from app.models import db, User
+
+DEFAULT_PROFILE_PIC = "/avatars/male_avatar.png"
+
+
+class UserProfile(NamedTuple):
+    """Compact, read-only copy of the public columns of a user"""
+    id: int
+    username: str
+    profile_pic: Optional[str]
+    age: Optional[int]
+    sex: Optional[str]
+    hobbies: Optional[str]
+    bio: Optional[str]
+    created_at: Optional[datetime]
+
+    @property
+    def pfp(self) -> str:
+        return self.profile_pic or DEFAULT_PROFILE_PIC
+
+    def to_dict(self) -> dict:
+        """Same shape as User.to_dict(include_private=False)"""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "age": self.age,
+            "sex": self.sex,
+            "profile_pic": self.pfp,
+            "bio": self.bio,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "hobbies": self.hobbies.split(",") if self.hobbies else []
+        }
+
+
+PROFILE_COLUMNS = (User.id, User.username, User.profile_pic, User.age, User.sex, User.hobbies, User.bio, User.created_at)
+
+
+class ProfileCache:
+    """Process-local LRU of UserProfile records with a TTL.
+
+    Serves jwt_required and the payload builders that only need a user's
+    public profile (e.g. the sender's picture on every chat message) without
+    a query per request. Profile updates and account deletion invalidate the
+    entry in this process; other processes see the change once their entry
+    expires, so `ttl` bounds how stale a profile can be.
+
+    A read that was already querying when invalidate() ran may return the old
+    row, so invalidate() stamps the user with a new generation and put() drops
+    rows read before it.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[int, Tuple[float, UserProfile]]" = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidate(); user id -> generation of their last
+        # invalidation, bounded like entries. Older ones only leave `forgotten`.
+        self.generation = 0
+        self.invalidated: "OrderedDict[int, int]" = OrderedDict()
+        self.forgotten = 0
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.stale_writes = 0
+
+    def get(self, user_id: int) -> Optional[UserProfile]:
+        """The user's profile, None if the user doesn't exist (misses aren't cached)"""
+        return self.get_many([user_id]).get(int(user_id))
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, UserProfile]:
+        """Profiles of the users that exist, with one query for all the ones not cached"""
+        now = time.monotonic()
+        found: Dict[int, UserProfile] = {}
+        missing = []
+        with self.lock:
+            for user_id in {int(user_id) for user_id in user_ids}:
+                entry = self.entries.get(user_id)
+                if entry and entry[0] > now:
+                    self.entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                else:
+                    missing.append(user_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+            read_generation = self.generation
+
+        if missing:
+            rows = db.session.execute(select(*PROFILE_COLUMNS).where(User.id.in_(missing))).all()
+            self.queries += 1
+            for row in rows:
+                found[row.id] = self.put(UserProfile(*row), read_generation)
+        return found
+
+    def put(self, profile: UserProfile, read_generation: Optional[int] = None) -> UserProfile:
+        """Cache a profile. read_generation is self.generation when its query started:
+        if the user was invalidated since, the profile is returned but not cached."""
+        with self.lock:
+            if read_generation is not None and max(
+                self.invalidated.get(profile.id, 0), self.forgotten
+            ) > read_generation:
+                self.stale_writes += 1
+                return profile
+            self.entries[profile.id] = (time.monotonic() + self.ttl, profile)
+            self.entries.move_to_end(profile.id)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, user_id: int):
+        user_id = int(user_id)
+        with self.lock:
+            self.entries.pop(user_id, None)
+            self.generation += 1
+            self.invalidated[user_id] = self.generation
+            self.invalidated.move_to_end(user_id)
+            if len(self.invalidated) > self.max_size:
+                _, self.forgotten = self.invalidated.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            # Every hit is a user lookup that didn't reach the database
+            "queries_saved": self.hits,
+            "queries": self.queries,
+            "stale_writes_dropped": self.stale_writes,
+        }
+
+
+profile_cache = ProfileCache(
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60")),
+    max_size=int(os.getenv("PROFILE_CACHE_MAX_SIZE", "10000"))
+)
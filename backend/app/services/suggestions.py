@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import List, Optional
+from flask import current_app
+from app.services.matching import matching_index
+from app.websocket.redis_manager import redis_manager
+
+# suggestions:{user_id} holds the user's suggested user ids, best first, comma-joined
+LIST_KEY = "suggestions:{}"
+# Sorted set of user ids scored by the unix time their list is due for a refresh
+DUE_KEY = "suggestions:due"
+
+# The refresher checks for due lists this often, and refreshes at most BATCH per round
+POLL_SECONDS = 1.0
+BATCH = 100
+
+
+class SuggestionStore:
+    """Friend suggestions precomputed per user and kept in Redis.
+
+    GET /api/chat/search without a query reads suggestions:{user_id} instead
+    of scoring every user on each call. A miss (first visit, expired or
+    invalidated list) computes the list once through matching_index and
+    stores it. A background refresher recomputes the lists that come due:
+    every `refresh` seconds for users who are online or reading their list,
+    right away for lists invalidated by a profile edit or a new conversation.
+    Lists of users who went away aren't refreshed and expire after `max_age`
+    seconds, which bounds how stale a served list can be.
+
+    Without Redis every call computes the suggestions directly.
+    """
+
+    def __init__(self, refresh: float = 120, max_age: float = 900, size: int = 20):
+        self.refresh = refresh
+        self.max_age = max_age
+        self.size = size
+        self.thread: Optional[threading.Thread] = None
+        self.app = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self.invalidated = 0
+
+    def get(self, user_id: int, limit: int = 10) -> List[int]:
+        """The user's suggested ids, best first"""
+        client = redis_manager.redis_client
+        if not client:
+            return matching_index.suggest(user_id, limit)
+
+        try:
+            # Reading the list also puts it back on the refresh schedule if it fell off
+            pipe = client.pipeline(transaction=False)
+            pipe.get(LIST_KEY.format(user_id))
+            pipe.zadd(DUE_KEY, {user_id: time.time() + self.refresh}, nx=True)
+            stored = pipe.execute()[0]
+        except Exception as e:
+            print(f"Error reading suggestions: {e}")
+            return matching_index.suggest(user_id, limit)
+
+        self.start(current_app._get_current_object())
+        if stored is not None:
+            self.hits += 1
+            return [int(suggested_id) for suggested_id in stored.split(",") if suggested_id][:limit]
+
+        self.misses += 1
+        return self.compute(user_id)[:limit]
+
+    def compute(self, user_id: int, schedule: bool = True) -> List[int]:
+        """Recompute and store the user's list, and schedule its next refresh"""
+        ids = matching_index.suggest(user_id, self.size)
+        try:
+            pipe = redis_manager.redis_client.pipeline(transaction=False)
+            pipe.set(LIST_KEY.format(user_id), ",".join(map(str, ids)), ex=int(self.max_age))
+            if schedule:
+                pipe.zadd(DUE_KEY, {user_id: time.time() + self.refresh})
+            pipe.execute()
+        except Exception as e:
+            print(f"Error storing suggestions: {e}")
+        return ids
+
+    def invalidate(self, *user_ids: int):
+        """Drop the users' lists and have the refresher rebuild them right away"""
+        client = redis_manager.redis_client
+        if not client or not user_ids:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(*(LIST_KEY.format(user_id) for user_id in user_ids))
+            pipe.zadd(DUE_KEY, {user_id: 0 for user_id in user_ids})
+            pipe.execute()
+            self.invalidated += len(user_ids)
+        except Exception as e:
+            print(f"Error invalidating suggestions: {e}")
+
+    def discard(self, user_id: int):
+        """Drop a deleted user's list for good"""
+        client = redis_manager.redis_client
+        if not client:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(LIST_KEY.format(user_id))
+            pipe.zrem(DUE_KEY, user_id)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error discarding suggestions: {e}")
+
+    def start(self, app):
+        if self.thread and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.app = app
+            self.thread = threading.Thread(target=self.run, name="suggestion-refresher", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            refreshed = 0
+            try:
+                with self.app.app_context():
+                    refreshed = self.refresh_due()
+            except Exception as e:
+                print(f"Error refreshing suggestions: {e}")
+            if refreshed < BATCH:
+                time.sleep(POLL_SECONDS)
+
+    def refresh_due(self) -> int:
+        client = redis_manager.redis_client
+        due = [int(user_id) for user_id in client.zrangebyscore(DUE_KEY, "-inf", time.time(), start=0, num=BATCH)]
+        if not due:
+            return 0
+
+        # ZREM succeeds for only one refresher when several processes run one
+        pipe = client.pipeline(transaction=False)
+        for user_id in due:
+            pipe.zrem(DUE_KEY, user_id)
+        claimed = [user_id for user_id, removed in zip(due, pipe.execute()) if removed]
+
+        online = redis_manager.are_users_online(claimed)
+        for user_id in claimed:
+            # Offline users keep their list until it expires, but it isn't refreshed again
+            self.compute(user_id, schedule=online[user_id])
+            self.refreshed += 1
+        return len(claimed)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": redis_manager.redis_client is not None,
+            "refresh_seconds": self.refresh,
+            "max_age_seconds": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "refreshed": self.refreshed,
+            "invalidated": self.invalidated,
+        }
+
+
+suggestion_store = SuggestionStore(
+    refresh=float(os.getenv("SUGGESTIONS_REFRESH_SECONDS", "120")),
+    max_age=float(os.getenv("SUGGESTIONS_MAX_AGE_SECONDS", "900")),
+    size=int(os.getenv("SUGGESTIONS_LIST_SIZE", "20"))
+)
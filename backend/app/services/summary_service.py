@@ -0,0 +1,343 @@
+import os
+from sqlalchemy import select, update, delete, and_, or_, desc, func, case
+from app.models import db, Conversations, Messages, MessageStatus, ConversationSummary
+
+# Max characters of a message kept as the sidebar preview
+PREVIEW_LENGTH = 200
+
+# How read state is tracked:
+#   "status"    - one message_status row per message (default)
+#   "watermark" - only the per-participant read/delivered watermarks on conversation_summaries
+READ_TRACKING_MODE = os.getenv("READ_TRACKING_MODE", "status")
+
+
+def _raise_watermark(column, message_id):
+    """SQL expression moving a watermark column up to message_id, never down"""
+    return case((or_(column.is_(None), column < message_id), message_id), else_=column)
+
+
+class ConversationSummaryService:
+    """Keeps conversation_summaries in sync with messages.
+
+    None of these methods commit - they are called inside the caller's
+    transaction so the summary is written together with the message / status change.
+    """
+
+    @staticmethod
+    def make_preview(content: str) -> str:
+        return content[:PREVIEW_LENGTH] if content else content
+
+    @staticmethod
+    def participants(conversation: Conversations) -> list:
+        """(user_id, peer_id) of each summary row: two, or one for a conversation with yourself"""
+        if conversation.sender_id == conversation.receiver_id:
+            return [(conversation.sender_id, conversation.receiver_id)]
+        return [(conversation.sender_id, conversation.receiver_id), (conversation.receiver_id, conversation.sender_id)]
+
+    @staticmethod
+    def create_for_conversation(conversation: Conversations):
+        """Add the per-participant rows for a new conversation"""
+        db.session.add_all([
+            ConversationSummary(
+                conversation_id=conversation.id,
+                user_id=user_id,
+                peer_id=peer_id,
+                unread_count=0
+            )
+            for user_id, peer_id in ConversationSummaryService.participants(conversation)
+        ])
+
+    @staticmethod
+    def record_message(message: Messages, recipient_id: int):
+        """Point both participants' rows at the new message and bump the recipient's unread counter"""
+        result = db.session.execute(
+            update(ConversationSummary)
+            .where(ConversationSummary.conversation_id == message.conversation_id)
+            .values(
+                last_message_id=message.id,
+                last_message_preview=ConversationSummaryService.make_preview(message.content),
+                last_message_at=message.created_at,
+                unread_count=case(
+                    # Notes to yourself don't count as unread, as in compute_rows
+                    (
+                        and_(ConversationSummary.user_id == recipient_id, ConversationSummary.user_id != message.sender_id),
+                        ConversationSummary.unread_count + 1
+                    ),
+                    else_=ConversationSummary.unread_count
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        if result.rowcount < (1 if message.sender_id == recipient_id else 2):
+            # Conversation predates the summary table and wasn't backfilled yet
+            ConversationSummaryService.rebuild_conversation(message.conversation_id)
+
+    @staticmethod
+    def decrement_unread(conversation_id: int, user_id: int, count: int = 1):
+        db.session.execute(
+            update(ConversationSummary)
+            .where(
+                and_(
+                    ConversationSummary.conversation_id == conversation_id,
+                    ConversationSummary.user_id == user_id
+                )
+            )
+            .values(unread_count=case(
+                (ConversationSummary.unread_count > count, ConversationSummary.unread_count - count),
+                else_=0
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def unread_count_query(conversation_id, user_id, last_read_message_id):
+        """Range count of the peer's messages above a read watermark (works with SQL expressions too)"""
+        return (
+            select(func.count(Messages.id))
+            .where(
+                and_(
+                    Messages.conversation_id == conversation_id,
+                    Messages.sender_id != user_id,
+                    Messages.id > func.coalesce(last_read_message_id, 0)
+                )
+            )
+        )
+
+    @staticmethod
+    def mark_delivered(conversation_id: int, user_id: int, message_id: int):
+        db.session.execute(
+            update(ConversationSummary)
+            .where(
+                and_(
+                    ConversationSummary.conversation_id == conversation_id,
+                    ConversationSummary.user_id == user_id
+                )
+            )
+            .values(last_delivered_message_id=_raise_watermark(ConversationSummary.last_delivered_message_id, message_id))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def mark_read(conversation_id: int, user_id: int, message_id: int, recount_unread: bool = False):
+        """Raise the read watermark to message_id. With recount_unread the counter becomes a range count."""
+        values = {
+            "last_read_message_id": _raise_watermark(ConversationSummary.last_read_message_id, message_id),
+            "last_delivered_message_id": _raise_watermark(ConversationSummary.last_delivered_message_id, message_id),
+        }
+        if recount_unread:
+            # SET expressions see the old row, so count above max(old watermark, message_id)
+            values["unread_count"] = ConversationSummaryService.unread_count_query(
+                ConversationSummary.conversation_id,
+                ConversationSummary.user_id,
+                _raise_watermark(ConversationSummary.last_read_message_id, message_id)
+            ).scalar_subquery()
+
+        db.session.execute(
+            update(ConversationSummary)
+            .where(
+                and_(
+                    ConversationSummary.conversation_id == conversation_id,
+                    ConversationSummary.user_id == user_id
+                )
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def has_unread(conversation_id: int, user_id: int) -> bool:
+        """Whether marking the conversation read would change anything for the user.
+
+        False when the summary has no unread messages and the read watermark is
+        at the latest message. True when there is no summary row yet (database
+        not backfilled), since then nothing is known.
+        """
+        row = db.session.execute(
+            select(
+                ConversationSummary.unread_count,
+                ConversationSummary.last_message_id,
+                ConversationSummary.last_read_message_id
+            )
+            .where(
+                and_(
+                    ConversationSummary.conversation_id == conversation_id,
+                    ConversationSummary.user_id == user_id
+                )
+            )
+        ).first()
+        return row is None or bool(row.unread_count) or row.last_read_message_id != row.last_message_id
+
+    @staticmethod
+    def mark_all_read(conversation_id: int, user_id: int):
+        """Single-row update: watermarks jump to the latest message and the counter is cleared"""
+        latest = func.coalesce(ConversationSummary.last_message_id, ConversationSummary.last_read_message_id)
+        db.session.execute(
+            update(ConversationSummary)
+            .where(
+                and_(
+                    ConversationSummary.conversation_id == conversation_id,
+                    ConversationSummary.user_id == user_id
+                )
+            )
+            .values(
+                last_read_message_id=latest,
+                last_delivered_message_id=_raise_watermark(ConversationSummary.last_delivered_message_id, latest),
+                unread_count=0
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def get_watermarks(conversation_ids) -> dict:
+        """{(conversation_id, user_id): (last_read_message_id, last_delivered_message_id)}"""
+        conversation_ids = list(set(conversation_ids))
+        if not conversation_ids:
+            return {}
+        return {
+            (row.conversation_id, row.user_id): (row.last_read_message_id, row.last_delivered_message_id)
+            for row in db.session.execute(
+                select(
+                    ConversationSummary.conversation_id,
+                    ConversationSummary.user_id,
+                    ConversationSummary.last_read_message_id,
+                    ConversationSummary.last_delivered_message_id
+                )
+                .where(ConversationSummary.conversation_id.in_(conversation_ids))
+            )
+        }
+
+    @staticmethod
+    def compute_rows(conversations) -> list:
+        """Compute summary rows for the given conversations from messages / message_status"""
+        conversations = list(conversations)
+        if not conversations:
+            return []
+        conversation_ids = [conv.id for conv in conversations]
+
+        latest_message_id = (
+            select(Messages.id)
+            .where(Messages.conversation_id == Conversations.id)
+            .order_by(desc(Messages.created_at), desc(Messages.id))
+            .limit(1)
+            .correlate(Conversations)
+            .scalar_subquery()
+        )
+        latest = {
+            row.conversation_id: row
+            for row in db.session.execute(
+                select(
+                    Conversations.id.label("conversation_id"),
+                    Messages.id.label("message_id"),
+                    Messages.content,
+                    Messages.created_at
+                )
+                .join(Messages, Messages.id == latest_message_id)
+                .where(Conversations.id.in_(conversation_ids))
+            )
+        }
+
+        # Watermarks are the max of what is already recorded and what message_status says
+        watermarks = ConversationSummaryService.get_watermarks(conversation_ids)
+        for row in db.session.execute(
+            select(
+                Messages.conversation_id,
+                MessageStatus.recipient_id,
+                func.max(case((MessageStatus.status == 'read', Messages.id))).label("last_read"),
+                func.max(case((MessageStatus.status.in_(['delivered', 'read']), Messages.id))).label("last_delivered")
+            )
+            .join(MessageStatus, Messages.id == MessageStatus.message_id)
+            .where(Messages.conversation_id.in_(conversation_ids))
+            .group_by(Messages.conversation_id, MessageStatus.recipient_id)
+        ):
+            key = (row.conversation_id, row.recipient_id)
+            read, delivered = watermarks.get(key, (None, None))
+            watermarks[key] = (
+                max(filter(None, (read, row.last_read)), default=None),
+                max(filter(None, (delivered, row.last_delivered)), default=None),
+            )
+
+        unread = {
+            (row.conversation_id, row.recipient_id): row.unread_count
+            for row in db.session.execute(
+                select(
+                    Messages.conversation_id,
+                    MessageStatus.recipient_id,
+                    func.count(MessageStatus.id).label("unread_count")
+                )
+                .join(MessageStatus, Messages.id == MessageStatus.message_id)
+                .where(
+                    and_(
+                        Messages.conversation_id.in_(conversation_ids),
+                        Messages.sender_id != MessageStatus.recipient_id,
+                        MessageStatus.status.in_(['delivered', 'sent'])
+                    )
+                )
+                .group_by(Messages.conversation_id, MessageStatus.recipient_id)
+            )
+        }
+
+        rows = []
+        for conv in conversations:
+            last = latest.get(conv.id)
+            for user_id, peer_id in ConversationSummaryService.participants(conv):
+                last_read, last_delivered = watermarks.get((conv.id, user_id), (None, None))
+                if READ_TRACKING_MODE == "watermark":
+                    unread_count = db.session.execute(
+                        ConversationSummaryService.unread_count_query(conv.id, user_id, last_read)
+                    ).scalar()
+                else:
+                    unread_count = unread.get((conv.id, user_id), 0)
+                rows.append({
+                    "conversation_id": conv.id,
+                    "user_id": user_id,
+                    "peer_id": peer_id,
+                    "last_message_id": last.message_id if last else None,
+                    "last_message_preview": ConversationSummaryService.make_preview(last.content) if last else None,
+                    "last_message_at": last.created_at if last else None,
+                    "unread_count": unread_count,
+                    "last_read_message_id": last_read,
+                    "last_delivered_message_id": last_delivered,
+                })
+        return rows
+
+    @staticmethod
+    def rebuild_conversation(conversation_id: int):
+        conversation = db.session.get(Conversations, conversation_id)
+        rows = ConversationSummaryService.compute_rows([conversation]) if conversation else []
+        db.session.execute(
+            delete(ConversationSummary)
+            .where(ConversationSummary.conversation_id == conversation_id)
+            .execution_options(synchronize_session=False)
+        )
+        if rows:
+            db.session.execute(ConversationSummary.__table__.insert(), rows)
+
+    @staticmethod
+    def backfill(batch_size: int = 500) -> int:
+        """Rebuild every summary row from the message history. Commits per batch, returns conversations processed."""
+        processed = 0
+        last_id = 0
+        while True:
+            conversations = db.session.execute(
+                select(Conversations)
+                .where(Conversations.id > last_id)
+                .order_by(Conversations.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not conversations:
+                break
+
+            conversation_ids = [conv.id for conv in conversations]
+            rows = ConversationSummaryService.compute_rows(conversations)
+            db.session.execute(
+                delete(ConversationSummary)
+                .where(ConversationSummary.conversation_id.in_(conversation_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(ConversationSummary.__table__.insert(), rows)
+            db.session.commit()
+
+            processed += len(conversations)
+            last_id = conversation_ids[-1]
+        return processed
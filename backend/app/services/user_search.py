@@ -0,0 +1,168 @@
+import re
+from typing import List
+from sqlalchemy import select, text, and_, or_
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app.models import db, User
+from app.models.user_search import PG_DOCUMENT, PG_EMAIL_LOCAL, PG_USERNAME_PREFIX, SQLITE_REBUILD
+
+# bm25 weights of users_fts columns: username, email_local, bio, hobbies
+SQLITE_COLUMN_WEIGHTS = "10.0, 5.0, 1.0, 2.0"
+
+# Only this many matches are ranked. Short prefixes ("jo") match a large share
+# of all users and ranking costs ~2 us per match, so past this many matches
+# only the newest ones are ranked. Users whose username starts with the query
+# are always ranked too: up to SEARCH_CANDIDATES of them come from an ordered
+# scan of the lower(username) index, and an exact match sorts first in it.
+SEARCH_CANDIDATES = 1000
+
+# The newest matches are rowid >= the id of the SEARCH_CANDIDATES-th newest match
+# (FTS5 applies rowid ranges inside the index scan, so bm25 only runs on those
+# rows). Exact username first, then the other username prefix matches in
+# alphabetical order, then the rest by bm25.
+SQLITE_SEARCH = text(f"""
+    WITH prefixed AS (
+        SELECT id, lower(username) AS name FROM users
+        WHERE lower(username) >= :query AND lower(username) < :query_end
+        ORDER BY lower(username)
+        LIMIT :candidates
+    ), matches AS (
+        SELECT rowid AS id, bm25(users_fts, {SQLITE_COLUMN_WEIGHTS}) AS score FROM users_fts
+        WHERE users_fts MATCH :match
+            AND rowid >= coalesce((
+                SELECT rowid FROM users_fts WHERE users_fts MATCH :match
+                ORDER BY rowid DESC LIMIT 1 OFFSET :candidates
+            ), 0)
+    )
+    SELECT id FROM (
+        SELECT id, name = :query AS exact, name, NULL AS score FROM prefixed
+        UNION ALL
+        SELECT id, 0, NULL, score FROM matches WHERE id NOT IN (SELECT id FROM prefixed)
+    )
+    WHERE id != :exclude_user_id
+    ORDER BY exact DESC, name IS NULL, name, score, id
+    LIMIT :limit
+""")
+
+# Word-prefix matches through the tsvector index, substring matches on username /
+# email through the trigram indexes, newest first; plus the username prefix
+# matches from the ordered ix_users_username_prefix scan. Exact username first,
+# then username prefix, then similarity.
+POSTGRES_SEARCH = text(f"""
+    WITH candidates AS (
+        (
+            SELECT id FROM users
+            WHERE {PG_DOCUMENT} @@ to_tsquery('simple', :tsquery)
+                OR lower(username) LIKE :contains
+                OR {PG_EMAIL_LOCAL} LIKE :contains
+            ORDER BY id DESC
+            LIMIT :candidates
+        )
+        UNION
+        (
+            SELECT id FROM users
+            WHERE {PG_USERNAME_PREFIX} >= :query AND {PG_USERNAME_PREFIX} < :query_end
+            ORDER BY {PG_USERNAME_PREFIX}
+            LIMIT :candidates
+        )
+    )
+    SELECT users.id FROM candidates JOIN users ON users.id = candidates.id
+    WHERE users.id != :exclude_user_id
+    ORDER BY
+        lower(username) = :query DESC,
+        lower(username) LIKE :prefix DESC,
+        greatest(similarity(lower(username), :query), similarity({PG_EMAIL_LOCAL}, :query))
+            + ts_rank({PG_DOCUMENT}, to_tsquery('simple', :tsquery)) DESC,
+        users.id
+    LIMIT :limit
+""")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _prefix_end(prefix: str) -> str:
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class UserSearchService:
+    """Ranked user search with prefix autocomplete (see app/models/user_search.py for the index)"""
+
+    @staticmethod
+    def tokens(query: str) -> List[str]:
+        return re.findall(r"\w+", query.lower())
+
+    @staticmethod
+    def search_ids(query: str, exclude_user_id: int, limit: int = 10) -> List[int]:
+        """Ids of the best matching users, best first. Every word of the query is matched as a prefix."""
+        tokens = UserSearchService.tokens(query)
+        if not tokens:
+            return []
+
+        normalized = query.strip().lower()
+        dialect = db.session.get_bind().dialect.name
+        try:
+            if dialect == "sqlite":
+                match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+                rows = db.session.execute(SQLITE_SEARCH, {
+                    "match": match, "query": normalized, "query_end": _prefix_end(normalized),
+                    "exclude_user_id": exclude_user_id, "candidates": SEARCH_CANDIDATES, "limit": limit
+                })
+                return [row[0] for row in rows]
+
+            if dialect == "postgresql":
+                rows = db.session.execute(POSTGRES_SEARCH, {
+                    "tsquery": " & ".join(f"{token}:*" for token in tokens),
+                    "contains": f"%{_escape_like(normalized)}%",
+                    "prefix": f"{_escape_like(normalized)}%",
+                    "query": normalized,
+                    "query_end": _prefix_end(normalized),
+                    "exclude_user_id": exclude_user_id,
+                    "candidates": SEARCH_CANDIDATES,
+                    "limit": limit,
+                })
+                return [row[0] for row in rows]
+
+        except (OperationalError, ProgrammingError) as e:
+            # Index not created yet (database older than the add_user_search_index migration)
+            db.session.rollback()
+            print(f"User search index unavailable, falling back to a table scan: {e}")
+
+        return UserSearchService.scan_ids(query, exclude_user_id, limit)
+
+    @staticmethod
+    def scan_ids(query: str, exclude_user_id: int, limit: int = 10) -> List[int]:
+        """Unindexed substring match, for databases without the search index"""
+        return list(db.session.execute(
+            select(User.id)
+            .where(
+                and_(
+                    or_(
+                        User.username.ilike(f'%{query}%'),
+                        User.email.ilike(f'%{query}%')
+                    ),
+                    User.id != exclude_user_id
+                )
+            )
+            .limit(limit)
+        ).scalars())
+
+    @staticmethod
+    def search(query: str, exclude_user_id: int, limit: int = 10) -> List[User]:
+        """Best matching users, best first"""
+        ids = UserSearchService.search_ids(query, exclude_user_id, limit)
+        if not ids:
+            return []
+        users = {user.id: user for user in db.session.execute(select(User).where(User.id.in_(ids))).scalars()}
+        return [users[user_id] for user_id in ids if user_id in users]
+
+    @staticmethod
+    def rebuild_index() -> int:
+        """Re-fill the SQLite FTS table from users (PostgreSQL's indexes need no rebuild)"""
+        if db.session.get_bind().dialect.name != "sqlite":
+            return 0
+        for statement in SQLITE_REBUILD:
+            db.session.execute(text(statement))
+        db.session.commit()
+        return db.session.execute(text("SELECT count(*) FROM users_fts")).scalar()
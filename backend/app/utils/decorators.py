@@ -4,6 +4,7 @@ from flask_login import current_user
 import jwt
 import os
 from app.models import db, User
+from app.services.profile_cache import profile_cache
 
 def validate_json(f):
     """Decorator to validate JSON requests"""
@@ -68,7 +69,11 @@ def jwt_required(f):
             if not user_id:
                 return jsonify({"error": "Invalid token payload"}), 401
                 
-            user = db.get_or_404(User, user_id)
+            # Cached UserProfile (id, username, profile_pic, ...), not a session-bound User;
+            # routes that modify the user load it themselves
+            user = profile_cache.get(user_id)
+            if user is None:
+                return jsonify({"error": "Authentication failed"}), 401
             request.jwt_user = user
             return f(*args, **kwargs)
             
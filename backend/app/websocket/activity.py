@@ -0,0 +1,61 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class ActivityTracker:
+    """Coalesces last-seen updates in memory and writes them to Redis in batches.
+
+    Every inbound frame and every delivery touches the user's activity. A touch
+    only records the time in a dict; every `interval` seconds the flusher
+    writes all users touched since the last flush with one pipelined round-trip
+    (HSET last_seen + EXPIRE per user). So each user is written at most once
+    per interval however chatty they are, and a flush costs one round-trip
+    however many users it carries.
+    """
+
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self.pending: Dict[int, str] = {}  # user_id -> last seen (ISO, UTC)
+        self.task: Optional[asyncio.Task] = None
+        self.touches = 0
+        self.flushes = 0
+        self.written = 0
+
+    def touch(self, user_id: int):
+        self.pending[user_id] = datetime.utcnow().isoformat()
+        self.touches += 1
+
+    def forget(self, user_id: int):
+        """The user went offline: don't write a last_seen that would revive their key"""
+        self.pending.pop(user_id, None)
+
+    def start(self, redis_manager):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run(redis_manager))
+
+    async def run(self, redis_manager):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush(redis_manager)
+
+    async def flush(self, redis_manager):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        if await redis_manager.flush_user_activity(batch):
+            self.flushes += 1
+            self.written += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "pending_users": len(self.pending),
+            "touches": self.touches,
+            "flushes": self.flushes,
+            "users_written": self.written,
+        }
+
+
+activity = ActivityTracker(interval=float(os.getenv("WEBSOCKET_ACTIVITY_FLUSH_SECONDS", "15")))
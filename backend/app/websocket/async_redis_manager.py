@@ -0,0 +1,205 @@
+import redis.asyncio as aioredis
+import os
+import time
+from typing import Dict, Any, Iterable, Set
+from datetime import datetime
+from app.websocket.redis_manager import NODES_KEY, PRESENCE_KEY, PRESENCE_LEASE_SECONDS
+
+# Longest a command waits for a free pooled connection
+POOL_TIMEOUT_SECONDS = 5
+
+class AsyncRedisConnectionManager:
+    """asyncio counterpart of RedisConnectionManager for the WebSocket event loop.
+
+    Same keys and semantics, but every call is awaited on its own connection
+    pool, so a slow Redis only stalls the coroutine waiting on it instead of
+    blocking the whole loop.
+    """
+
+    def __init__(self):
+        self.redis_client = None
+
+    async def connect(self):
+        """Create the client - must run inside the WebSocket server's event loop"""
+        try:
+            redis_url = os.getenv("REDIS_URL")
+            if redis_url:
+                # Blocking pool: past max_connections a command waits for a free
+                # connection (up to POOL_TIMEOUT_SECONDS) instead of failing with
+                # "Too many connections", which dropped room events and presence
+                # updates under bursts
+                pool = aioredis.BlockingConnectionPool.from_url(
+                    redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                    max_connections=int(os.getenv("WEBSOCKET_REDIS_MAX_CONNECTIONS", "50")),
+                    timeout=POOL_TIMEOUT_SECONDS
+                )
+                self.redis_client = aioredis.Redis.from_pool(pool)
+                await self.redis_client.ping()
+                print(" Connected to Redis (async)")
+            else:
+                self.redis_client = None
+        except Exception as e:
+            print(f" Async Redis connection failed: {e}")
+            self.redis_client = None
+
+    async def close(self):
+        if self.redis_client:
+            await self.redis_client.aclose()
+            self.redis_client = None
+
+    async def set_user_online(self, user_id: int, connection_info: Dict[str, Any]):
+        """Mark user as online with connection info"""
+        if not self.redis_client:
+            return False
+
+        try:
+            key = f"ws:user:{user_id}"
+            data = {
+                "connected_at": datetime.utcnow().isoformat(),
+                "last_seen": datetime.utcnow().isoformat(),
+                **connection_info
+            }
+
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                # Hash, so activity updates can set last_seen without reading the rest back
+                pipe.delete(key)
+                pipe.hset(key, mapping={field: str(value) for field, value in data.items()})
+                pipe.expire(key, 3600)  # 1 hour TTL
+                pipe.zadd(PRESENCE_KEY, {user_id: time.time()})
+                # Every node the user is connected through, for cross-node delivery
+                pipe.sadd(f"{key}:nodes", data.get("server_id", "main"))
+                pipe.expire(f"{key}:nodes", 3600)
+                await pipe.execute()
+            return True
+
+        except Exception as e:
+            print(f"Error setting user online: {e}")
+            return False
+
+    async def set_user_offline(self, user_id: int, server_id: str = "main"):
+        """The user's last socket on server_id closed. Offline once no node has any left."""
+        if not self.redis_client:
+            return False
+
+        try:
+            nodes_key = f"ws:user:{user_id}:nodes"
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.srem(nodes_key, server_id)
+                pipe.scard(nodes_key)
+                _, remaining = await pipe.execute()
+            if remaining:
+                return True
+
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.zrem(PRESENCE_KEY, user_id)
+                pipe.delete(f"ws:user:{user_id}")
+                await pipe.execute()
+            return True
+
+        except Exception as e:
+            print(f"Error setting user offline: {e}")
+            return False
+
+    async def is_user_online(self, user_id: int) -> bool:
+        if not self.redis_client:
+            return False
+
+        try:
+            score = await self.redis_client.zscore(PRESENCE_KEY, user_id)
+            return score is not None and score >= time.time() - PRESENCE_LEASE_SECONDS
+        except Exception as e:
+            print(f"Error checking user online status: {e}")
+            return False
+
+    async def get_user_nodes(self, user_id: int) -> Set[str]:
+        """Ids of the WebSocket nodes the user has sockets on"""
+        if not self.redis_client:
+            return set()
+
+        try:
+            return await self.redis_client.smembers(f"ws:user:{user_id}:nodes")
+        except Exception as e:
+            print(f"Error getting user nodes: {e}")
+            return set()
+
+    async def remove_user_node(self, user_id: int, server_id: str):
+        """Forget a node that no longer serves the user (e.g. it crashed)"""
+        if not self.redis_client:
+            return False
+
+        try:
+            await self.redis_client.srem(f"ws:user:{user_id}:nodes", server_id)
+            return True
+        except Exception as e:
+            print(f"Error removing user node: {e}")
+            return False
+
+    async def update_user_activity(self, user_id: int):
+        """Update user's last seen timestamp"""
+        return await self.flush_user_activity({user_id: datetime.utcnow().isoformat()})
+
+    async def flush_user_activity(self, last_seen: Dict[int, str]):
+        """Write last_seen for many users and renew their TTLs, in one round-trip"""
+        if not self.redis_client or not last_seen:
+            return False
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for user_id, seen in last_seen.items():
+                    key = f"ws:user:{user_id}"
+                    pipe.hset(key, "last_seen", seen)
+                    pipe.expire(key, 3600)
+                    pipe.expire(f"{key}:nodes", 3600)
+                await pipe.execute()
+            return True
+
+        except Exception as e:
+            print(f"Error updating user activity: {e}")
+            return False
+
+    async def heartbeat(self, node_id: str, user_ids: Iterable[int], chunk_size: int = 1000):
+        """Renew this node's lease and the presence of every user connected to it.
+        Also keeps the TTLs of idle users' keys from running out while they stay connected."""
+        if not self.redis_client:
+            return False
+
+        try:
+            now = time.time()
+            user_ids = list(user_ids)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.zadd(NODES_KEY, {node_id: now})
+                for start in range(0, len(user_ids), chunk_size):
+                    chunk = user_ids[start:start + chunk_size]
+                    pipe.zadd(PRESENCE_KEY, {user_id: now for user_id in chunk})
+                    for user_id in chunk:
+                        pipe.expire(f"ws:user:{user_id}", 3600)
+                        pipe.expire(f"ws:user:{user_id}:nodes", 3600)
+                await pipe.execute()
+            return True
+
+        except Exception as e:
+            print(f"Error renewing presence heartbeat: {e}")
+            return False
+
+    async def reap_presence(self) -> int:
+        """Drop users and nodes whose heartbeat is older than the lease, e.g. after a node crashed.
+        Idempotent, so every node may run it. Returns the number of users dropped."""
+        if not self.redis_client:
+            return 0
+
+        try:
+            cutoff = time.time() - PRESENCE_LEASE_SECONDS
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(PRESENCE_KEY, "-inf", f"({cutoff}")
+                pipe.zremrangebyscore(NODES_KEY, "-inf", f"({cutoff}")
+                users, _ = await pipe.execute()
+            return users
+
+        except Exception as e:
+            print(f"Error reaping presence: {e}")
+            return 0
+
+async_redis_manager = AsyncRedisConnectionManager()
@@ -2,20 +2,41 @@ import asyncio
 import websockets
 import json
 import logging
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, Union
 from datetime import datetime
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 logger = logging.getLogger(__name__)
 
 class WebSocketClient:
     """WebSocket client for testing and integration"""
     
-    def __init__(self, url: str = "ws://localhost:8765", token: str = None):
+    def __init__(self, url: str = "ws://localhost:8765", token: str = None, protocol: str = "json"):
+        """protocol: "json" or "msgpack" (binary frames, needs the msgpack package on both ends)"""
         self.url = url
         self.token = token
+        self.requested_protocol = protocol if msgpack is not None else "json"
+        self.protocol = "json"
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.message_handlers: Dict[str, Callable] = {}
         self.is_connected = False
+
+    async def _send(self, message: Dict[str, Any]):
+        if self.protocol == "msgpack":
+            await self.websocket.send(msgpack.packb(message, use_bin_type=True))
+        else:
+            await self.websocket.send(json.dumps(message))
+
+    @staticmethod
+    def _decode(frame: Union[str, bytes]) -> Dict[str, Any]:
+        """Binary frames are MessagePack (timestamps become datetimes), text frames JSON"""
+        if isinstance(frame, bytes):
+            return msgpack.unpackb(frame, raw=False, timestamp=3)
+        return json.loads(frame)
         
     async def connect(self) -> bool:
         """Connect to WebSocket server"""
@@ -25,15 +46,17 @@ class WebSocketClient:
             # Send authentication
             auth_message = {
                 "type": "authenticate",
-                "token": self.token
+                "token": self.token,
+                "protocol": self.requested_protocol
             }
             await self.websocket.send(json.dumps(auth_message))
             
-            # Wait for authentication response
+            # Wait for authentication response, in the protocol the server agreed to
             response = await self.websocket.recv()
-            auth_response = json.loads(response)
+            auth_response = self._decode(response)
             
             if auth_response.get("type") == "authenticated":
+                self.protocol = "msgpack" if isinstance(response, bytes) else "json"
                 self.is_connected = True
                 logger.info("WebSocket connected and authenticated")
                 return True
@@ -64,7 +87,7 @@ class WebSocketClient:
             "message_type": message_type
         }
         
-        await self.websocket.send(json.dumps(message))
+        await self._send(message)
     
     async def mark_delivered(self, message_id: int):
         """Mark message as delivered"""
@@ -76,7 +99,7 @@ class WebSocketClient:
             "message_id": message_id
         }
         
-        await self.websocket.send(json.dumps(message))
+        await self._send(message)
     
     async def mark_read(self, message_id: int):
         """Mark message as read"""
@@ -88,7 +111,7 @@ class WebSocketClient:
             "message_id": message_id
         }
         
-        await self.websocket.send(json.dumps(message))
+        await self._send(message)
     
     async def send_typing_indicator(self, recipient_id: int, is_typing: bool):
         """Send typing indicator"""
@@ -101,7 +124,7 @@ class WebSocketClient:
             "is_typing": is_typing
         }
         
-        await self.websocket.send(json.dumps(message))
+        await self._send(message)
     
     async def ping(self):
         """Send ping message"""
@@ -109,7 +132,7 @@ class WebSocketClient:
             raise ConnectionError("WebSocket not connected")
         
         message = {"type": "ping"}
-        await self.websocket.send(json.dumps(message))
+        await self._send(message)
     
     def add_message_handler(self, message_type: str, handler: Callable[[Dict[str, Any]], None]):
         """Add handler for specific message type"""
@@ -123,7 +146,7 @@ class WebSocketClient:
         try:
             async for message in self.websocket:
                 try:
-                    data = json.loads(message)
+                    data = self._decode(message)
                     message_type = data.get("type")
                     
                     if message_type in self.message_handlers:
@@ -131,8 +154,8 @@ class WebSocketClient:
                     else:
                         logger.info(f"Unhandled message: {data}")
                         
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON received: {message}")
+                except ValueError:
+                    logger.error(f"Invalid frame received: {message!r}")
                     
         except websockets.exceptions.ConnectionClosed:
             self.is_connected = False
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import math
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+
+from app.websocket.redis_manager import NODES_KEY, PRESENCE_LEASE_SECONDS
+
+# Identifies this WebSocket process in Redis (presence, room membership, pub/sub)
+NODE_ID = os.getenv("WEBSOCKET_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Share rooms and route direct messages between WebSocket nodes through Redis.
+# Always on when the WebSocket tier runs as worker processes.
+CLUSTER_ENABLED = os.getenv("WEBSOCKET_CLUSTER", "0") == "1" or int(os.getenv("WEBSOCKET_WORKERS", "0")) > 0
+
+# Rooms whose TTL never started still expire eventually, e.g. after a node crashed
+ROOM_IDLE_TTL_SECONDS = 24 * 3600
+
+
+class RoomRegistry:
+    """Redis registry of private rooms shared by all WebSocket nodes.
+
+    ws:room:{id}         hash: created_at, creator_user_id, expires_at (unix time
+                         once the TTL started) and node:{node id} -> sockets that
+                         node has in the room
+    ws:room:{id}:events  pub/sub channel relaying room events between nodes
+
+    Every node still keeps its own sockets in private_rooms and delivers to them
+    directly. The registry only holds what the other nodes need: the metadata,
+    the member count across nodes and a copy of each room event. A node is
+    subscribed to a room's channel while it has sockets in that room.
+
+    Only nodes holding a lease in ws:nodes are counted. The node:* field of a
+    node whose lease ran out (a crashed or restarted worker) is ignored and
+    removed the next time the room is read, so its sockets don't keep the
+    room alive.
+
+    Like AsyncRedisConnectionManager, every call is a no-op returning None when
+    the registry isn't started or Redis fails, so callers fall back to local state.
+    """
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.redis = None
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        self.on_event: Optional[Callable[[str, dict], Awaitable[None]]] = None
+        self.rooms: Set[str] = set()  # rooms this node is subscribed to
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    def start(self, redis_client, on_event: Callable[[str, dict], Awaitable[None]]):
+        """Use redis_client and hand room events published by other nodes to on_event"""
+        self.redis = redis_client
+        self.on_event = on_event
+        self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        print(f" Room registry enabled (node {self.node_id})")
+
+    @staticmethod
+    def _key(room_id: str) -> str:
+        return f"ws:room:{room_id}"
+
+    @staticmethod
+    def _channel(room_id: str) -> str:
+        return f"ws:room:{room_id}:events"
+
+    @staticmethod
+    def _live_nodes(pipe):
+        """Queue the read of the nodes whose lease is still valid"""
+        pipe.zrangebyscore(NODES_KEY, time.time() - PRESENCE_LEASE_SECONDS, "+inf")
+
+    def _node_counts(self, data: dict, live_nodes: Iterable[str]) -> Tuple[int, List[str]]:
+        """Sockets in the room on live nodes, and the node:* fields of dead nodes"""
+        live = set(live_nodes) | {self.node_id}  # our lease may not be written yet
+        total, dead = 0, []
+        for field, value in data.items():
+            if not field.startswith("node:"):
+                continue
+            if field[len("node:"):] in live:
+                total += int(value)
+            else:
+                dead.append(field)
+        return max(0, total), dead
+
+    async def _parse(self, key: str, data: dict, live_nodes: Iterable[str]) -> dict:
+        user_count, dead = self._node_counts(data, live_nodes)
+        if dead:
+            await self.redis.hdel(key, *dead)
+        creator = data.get("creator_user_id")
+        expires_at = data.get("expires_at")
+        return {
+            "creator_user_id": int(creator) if creator else None,
+            "expires_at": float(expires_at) if expires_at else None,
+            "user_count": user_count,
+        }
+
+    async def create(self, room_id: str, creator_user_id: Optional[int] = None) -> Optional[dict]:
+        """Register the room unless another node already did. Returns its metadata."""
+        if not self.redis:
+            return None
+
+        try:
+            key = self._key(room_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hsetnx(key, "created_at", time.time())
+                if creator_user_id is not None:
+                    pipe.hsetnx(key, "creator_user_id", creator_user_id)
+                pipe.hgetall(key)
+                self._live_nodes(pipe)
+                results = await pipe.execute()
+
+            if results[0]:
+                await self.redis.expire(key, ROOM_IDLE_TTL_SECONDS)
+            return await self._parse(key, results[-2], results[-1])
+
+        except Exception as e:
+            print(f"Error registering room {room_id}: {e}")
+            return None
+
+    async def get(self, room_id: str) -> Optional[dict]:
+        if not self.redis:
+            return None
+
+        try:
+            key = self._key(room_id)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(key)
+                self._live_nodes(pipe)
+                data, live_nodes = await pipe.execute()
+            return await self._parse(key, data, live_nodes) if data.get("created_at") else None
+        except Exception as e:
+            print(f"Error reading room {room_id}: {e}")
+            return None
+
+    async def join(self, room_id: str, count: int = 1) -> Optional[dict]:
+        """Count sockets of this node into the room. Returns its metadata with the new total."""
+        if not self.redis:
+            return None
+
+        try:
+            key = self._key(room_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hsetnx(key, "created_at", time.time())  # revives a room deleted concurrently
+                pipe.hincrby(key, f"node:{self.node_id}", count)
+                pipe.hgetall(key)
+                self._live_nodes(pipe)
+                revived, _, data, live_nodes = await pipe.execute()
+
+            if revived:
+                await self.redis.expire(key, ROOM_IDLE_TTL_SECONDS)
+            return await self._parse(key, data, live_nodes)
+
+        except Exception as e:
+            print(f"Error joining room {room_id}: {e}")
+            return None
+
+    async def leave(self, room_id: str, count: int = 1) -> Optional[int]:
+        """Count sockets of this node out of the room. Returns the members left on all
+        nodes; the room is deleted when there are none."""
+        if not self.redis:
+            return None
+
+        try:
+            key = self._key(room_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, f"node:{self.node_id}", -count)
+                pipe.hgetall(key)
+                self._live_nodes(pipe)
+                _, data, live_nodes = await pipe.execute()
+
+            remaining, dead = self._node_counts(data, live_nodes)
+            if remaining == 0 or not data.get("created_at"):
+                await self.redis.delete(key)
+                return 0
+            if dead:
+                await self.redis.hdel(key, *dead)
+            return remaining
+
+        except Exception as e:
+            print(f"Error leaving room {room_id}: {e}")
+            return None
+
+    async def start_ttl(self, room_id: str, expires_at: float) -> Optional[float]:
+        """Set the room's deadline unless another node already did. Returns the deadline in effect."""
+        if not self.redis:
+            return None
+
+        try:
+            key = self._key(room_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hsetnx(key, "expires_at", expires_at)
+                pipe.hget(key, "expires_at")
+                _, deadline = await pipe.execute()
+
+            deadline = float(deadline)
+            await self.redis.expireat(key, math.ceil(deadline))
+            return deadline
+
+        except Exception as e:
+            print(f"Error starting TTL for room {room_id}: {e}")
+            return None
+
+    async def delete(self, room_id: str):
+        if not self.redis:
+            return
+
+        try:
+            await self.redis.delete(self._key(room_id))
+        except Exception as e:
+            print(f"Error deleting room {room_id}: {e}")
+
+    async def publish(self, room_id: str, event: dict):
+        """Relay a room event to the other nodes"""
+        if not self.redis:
+            return
+
+        try:
+            await self.redis.publish(self._channel(room_id), json.dumps({
+                "node": self.node_id,
+                "room_id": room_id,
+                "event": event,
+            }))
+        except Exception as e:
+            print(f"Error publishing event for room {room_id}: {e}")
+
+    async def subscribe(self, room_id: str):
+        if not self.redis or room_id in self.rooms:
+            return
+
+        try:
+            self.rooms.add(room_id)
+            await self.pubsub.subscribe(self._channel(room_id))
+            # The pub/sub connection only exists after the first subscribe
+            if self.listener is None or self.listener.done():
+                self.listener = asyncio.get_running_loop().create_task(self.listen())
+        except Exception as e:
+            self.rooms.discard(room_id)
+            print(f"Error subscribing to room {room_id}: {e}")
+
+    async def unsubscribe(self, room_id: str):
+        if not self.redis or room_id not in self.rooms:
+            return
+
+        try:
+            self.rooms.discard(room_id)
+            await self.pubsub.unsubscribe(self._channel(room_id))
+        except Exception as e:
+            print(f"Error unsubscribing from room {room_id}: {e}")
+
+    async def listen(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message:
+                    continue
+
+                envelope = json.loads(message["data"])
+                # Our own events were already delivered locally
+                if envelope.get("node") == self.node_id or envelope.get("room_id") not in self.rooms:
+                    continue
+                await self.on_event(envelope["room_id"], envelope["event"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error relaying room event: {e}")
+                await asyncio.sleep(1)
+
+
+room_registry = RoomRegistry(NODE_ID)
+
+
+class DirectMessageRouter:
+    """Delivers events for users connected to other WebSocket nodes.
+
+    Every node subscribes to its own inbox channel, ws:node:{node id}:inbox.
+    To reach a user, the sender looks up the nodes in ws:user:{id}:nodes and
+    publishes the event once to each other node's inbox. The receiving node
+    drains whatever has arrived (up to `batch_size` events) and hands the batch
+    to its local delivery in one go.
+    """
+
+    def __init__(self, node_id: str, batch_size: int = 256):
+        self.node_id = node_id
+        self.batch_size = batch_size
+        self.redis = None
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        self.on_batch: Optional[Callable[[List[Tuple[int, dict]]], Awaitable[None]]] = None
+        self.routed = 0
+        self.received = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    @staticmethod
+    def inbox(node_id: str) -> str:
+        return f"ws:node:{node_id}:inbox"
+
+    async def start(self, redis_client, on_batch: Callable[[List[Tuple[int, dict]]], Awaitable[None]]):
+        """Subscribe to this node's inbox and hand delivered batches of (user_id, event) to on_batch"""
+        try:
+            self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            await self.pubsub.subscribe(self.inbox(self.node_id))
+            self.redis = redis_client
+            self.on_batch = on_batch
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        except Exception as e:
+            print(f"Error subscribing to node inbox: {e}")
+
+    async def route(self, user_id: int, event: dict, nodes: Set[str]) -> Set[str]:
+        """Publish the event to the inbox of every other node in nodes. Returns the nodes
+        nobody listens on any more (stale entries of crashed nodes)."""
+        targets = [node for node in nodes if node != self.node_id]
+        if not self.redis or not targets:
+            return set()
+
+        try:
+            data = json.dumps({"user_id": user_id, "event": event})
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for node in targets:
+                    pipe.publish(self.inbox(node), data)
+                receivers = await pipe.execute()
+
+            self.routed += len(targets)
+            return {node for node, count in zip(targets, receivers) if not count}
+
+        except Exception as e:
+            print(f"Error routing message to user {user_id}: {e}")
+            return set()
+
+    async def listen(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message:
+                    continue
+
+                # Drain what is already buffered into the same batch
+                batch = [message]
+                while len(batch) < self.batch_size:
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+                    if not message:
+                        break
+                    batch.append(message)
+
+                items = []
+                for message in batch:
+                    envelope = json.loads(message["data"])
+                    items.append((int(envelope["user_id"]), envelope["event"]))
+                self.received += len(items)
+                await self.on_batch(items)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error draining node inbox: {e}")
+                await asyncio.sleep(1)
+
+
+def publish_to_user_nodes(redis_client, user_id: int, event: dict) -> bool:
+    """Blocking counterpart of DirectMessageRouter.route for processes without a WebSocket
+    loop, e.g. the Flask process when the WebSocket tier runs as workers. True if any node got it."""
+    if not redis_client:
+        return False
+
+    try:
+        nodes = redis_client.smembers(f"ws:user:{user_id}:nodes")
+        if not nodes:
+            return False
+
+        data = json.dumps({"user_id": user_id, "event": event})
+        pipe = redis_client.pipeline(transaction=False)
+        for node in nodes:
+            pipe.publish(DirectMessageRouter.inbox(node), data)
+        return any(pipe.execute())
+
+    except Exception as e:
+        print(f"Error routing message to user {user_id}: {e}")
+        return False
+
+
+message_router = DirectMessageRouter(NODE_ID)
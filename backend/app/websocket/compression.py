@@ -0,0 +1,144 @@
+import os
+from typing import List
+
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+# zlib state besides the window and memLevel buffers (see zlib's zconf.h)
+DEFLATE_STATE_BYTES = 6 * 1024
+INFLATE_STATE_BYTES = 7 * 1024
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that sends messages under `min_size` bytes uncompressed.
+
+    Compressing a small event costs about as much CPU as a 10 KB history page
+    costs per kilobyte, for a saving of ~150 bytes. The extension allows
+    uncompressed messages on a compressed connection (RSV1 unset), so small
+    ones can simply be passed through.
+    """
+
+    def __init__(self, *args, min_size: int = 0, settings: "CompressionSettings" = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self.settings = settings
+        self.skipping = False  # current fragmented message is sent uncompressed
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+
+        if frame.opcode is frames.OP_CONT:
+            if self.skipping:
+                self.skipping = not frame.fin
+                return frame
+        elif len(frame.data) < self.min_size:
+            self.skipping = not frame.fin
+            if self.settings:
+                self.settings.skipped += 1
+            return frame
+
+        encoded = super().encode(frame)
+        if self.settings:
+            if frame.opcode is not frames.OP_CONT:
+                self.settings.compressed += 1
+            self.settings.bytes_in += len(frame.data)
+            self.settings.bytes_out += len(encoded.data)
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate like the library default, with ThresholdPerMessageDeflate"""
+
+    def __init__(self, settings: "CompressionSettings", **kwargs):
+        super().__init__(**kwargs)
+        self.settings = settings
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.settings.min_size,
+            settings=self.settings,
+        )
+
+
+class CompressionSettings:
+    """Server-side permessage-deflate settings, plus counters for the status route.
+
+    enabled              negotiate compression with clients that offer it
+    window_bits          LZ77 window (9-15) in both directions; the window is
+                         most of the per-connection memory
+    mem_level            zlib memLevel (1-9) of the server's compressor
+    min_size             messages smaller than this go out uncompressed
+    no_context_takeover  reset the compressors after every message, so an idle
+                         socket holds no zlib state at all, at the cost of a
+                         worse ratio on streams of similar small messages
+    """
+
+    def __init__(self, enabled: bool = True, window_bits: int = 12, mem_level: int = 5,
+                 min_size: int = 0, no_context_takeover: bool = False):
+        if not 9 <= window_bits <= 15:
+            # zlib doesn't support 8 for raw deflate streams
+            print(f"WebSocket compression window bits must be 9-15, using 12 instead of {window_bits}")
+            window_bits = 12
+        if not 1 <= mem_level <= 9:
+            print(f"WebSocket compression memory level must be 1-9, using 5 instead of {mem_level}")
+            mem_level = 5
+        self.enabled = enabled
+        self.window_bits = window_bits
+        self.mem_level = mem_level
+        self.min_size = min_size
+        self.no_context_takeover = no_context_takeover
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def extensions(self) -> List[ServerPerMessageDeflateFactory]:
+        """Extension factories for websockets.serve(..., compression=None, extensions=...)"""
+        if not self.enabled:
+            return []
+        return [ThresholdDeflateFactory(
+            self,
+            server_no_context_takeover=self.no_context_takeover,
+            client_no_context_takeover=self.no_context_takeover,
+            server_max_window_bits=self.window_bits,
+            client_max_window_bits=self.window_bits,
+            compress_settings={"memLevel": self.mem_level},
+        )]
+
+    def idle_bytes_per_connection(self) -> int:
+        """zlib memory a compressed connection holds between messages (zlib's own formulas).
+        Clients that don't accept client_max_window_bits decompress with a 15-bit window."""
+        if not self.enabled or self.no_context_takeover:
+            return 0
+        deflate = (1 << (self.window_bits + 2)) + (1 << (self.mem_level + 9)) + DEFLATE_STATE_BYTES
+        inflate = (1 << self.window_bits) + INFLATE_STATE_BYTES
+        return deflate + inflate
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_bits": self.window_bits,
+            "mem_level": self.mem_level,
+            "min_size": self.min_size,
+            "no_context_takeover": self.no_context_takeover,
+            "idle_bytes_per_connection": self.idle_bytes_per_connection(),
+            "compressed_messages": self.compressed,
+            "uncompressed_messages": self.skipped,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        }
+
+
+compression = CompressionSettings(
+    enabled=os.getenv("WEBSOCKET_COMPRESSION", "1") == "1",
+    window_bits=int(os.getenv("WEBSOCKET_COMPRESSION_WINDOW_BITS", "12")),
+    mem_level=int(os.getenv("WEBSOCKET_COMPRESSION_MEM_LEVEL", "5")),
+    min_size=int(os.getenv("WEBSOCKET_COMPRESSION_MIN_SIZE", "0")),
+    no_context_takeover=os.getenv("WEBSOCKET_COMPRESSION_NO_CONTEXT_TAKEOVER", "0") == "1"
+)
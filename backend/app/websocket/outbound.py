@@ -0,0 +1,191 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple, Union
+
+Frame = Union[str, bytes]
+
+# What to do when a socket's queue is full:
+#   "disconnect"  - close the socket; the client reconnects and reloads what it missed (default)
+#   "drop_oldest" - discard the oldest queued frames
+#   "coalesce"    - replace an older queued frame with the same coalesce key
+#                   (e.g. room member counts), else discard the oldest
+SLOW_CONSUMER_POLICIES = ("disconnect", "drop_oldest", "coalesce")
+
+# Close code sent to a socket disconnected for falling behind
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+
+class OutboundQueue:
+    """Bounded outbound queue of one socket, drained by its own writer task.
+
+    Senders only append to the queue, so a client on a bad link backs up its
+    own queue instead of stalling the coroutine that fans an event out.
+    """
+
+    def __init__(self, websocket, user_id: Optional[int], max_frames: int, max_bytes: int, policy: str,
+                 protocol: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.protocol = protocol  # wire protocol negotiated at authentication
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.frames: Deque[Tuple[Optional[str], Frame]] = deque()
+        self.bytes = 0
+        self.sent = 0
+        self.drops = 0
+        self.closing = False
+        self.closed = False
+        self.close_code = 1000
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def depth(self) -> int:
+        return len(self.frames)
+
+    def put(self, data: Frame, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a frame. False if the socket is gone or was just disconnected for falling behind."""
+        if self.closing or self.closed:
+            return False
+
+        size = len(data)
+        if len(self.frames) >= self.max_frames or self.bytes + size > self.max_bytes:
+            if not self.make_room(size, coalesce_key):
+                return False
+
+        self.frames.append((coalesce_key, data))
+        self.bytes += size
+        self.wakeup.set()
+        return True
+
+    def make_room(self, size: int, coalesce_key: Optional[str]) -> bool:
+        if self.policy == "disconnect":
+            print(f"Disconnecting slow consumer user {self.user_id}: {len(self.frames)} frames, {self.bytes} bytes queued")
+            self.drops += len(self.frames) + 1
+            self.abort(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+
+        if self.policy == "coalesce" and coalesce_key is not None:
+            for index, (key, data) in enumerate(self.frames):
+                if key == coalesce_key:
+                    del self.frames[index]
+                    self.bytes -= len(data)
+                    self.drops += 1
+                    break
+
+        while self.frames and (len(self.frames) >= self.max_frames or self.bytes + size > self.max_bytes):
+            _, data = self.frames.popleft()
+            self.bytes -= len(data)
+            self.drops += 1
+        return True
+
+    def close_after(self, data: Frame) -> bool:
+        """Send what is queued plus a final frame, then close the socket"""
+        if self.closing or self.closed:
+            return False
+
+        self.frames.append((None, data))
+        self.bytes += len(data)
+        self.closing = True
+        self.wakeup.set()
+        return True
+
+    def abort(self, code: int):
+        """Drop everything queued and close the socket now"""
+        self.frames.clear()
+        self.bytes = 0
+        self.closing = True
+        self.close_code = code
+        self.task.cancel()
+        asyncio.get_running_loop().create_task(
+            self.websocket.close(code=code, reason="slow consumer")
+        )
+
+    async def run(self):
+        try:
+            while True:
+                if not self.frames:
+                    if self.closing:
+                        await self.websocket.close(code=self.close_code)
+                        return
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+
+                _, data = self.frames.popleft()
+                self.bytes -= len(data)
+                await self.websocket.send(data)
+                self.sent += 1
+
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Connection closed under us, the handler's cleanup takes it from here
+            pass
+        finally:
+            self.closed = True
+            self.frames.clear()
+            self.bytes = 0
+
+
+class OutboundManager:
+    """Outbound queues of every authenticated socket on this node, plus their metrics"""
+
+    def __init__(self, max_frames: int = 256, max_bytes: int = 1024 * 1024, policy: str = "disconnect"):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            print(f"Unknown slow consumer policy {policy!r}, using 'disconnect'")
+            policy = "disconnect"
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.queues: Dict[Any, OutboundQueue] = {}
+        # Totals of queues already closed
+        self.closed_drops = 0
+        self.slow_disconnects = 0
+
+    def open(self, websocket, user_id: Optional[int] = None, protocol: str = "json") -> OutboundQueue:
+        queue = self.queues.get(websocket)
+        if queue is None:
+            queue = OutboundQueue(websocket, user_id, self.max_frames, self.max_bytes, self.policy, protocol)
+            self.queues[websocket] = queue
+        return queue
+
+    def get(self, websocket) -> Optional[OutboundQueue]:
+        return self.queues.get(websocket)
+
+    def discard(self, websocket):
+        queue = self.queues.pop(websocket, None)
+        if queue is None:
+            return
+        self.closed_drops += queue.drops
+        if queue.close_code == SLOW_CONSUMER_CLOSE_CODE:
+            self.slow_disconnects += 1
+        if not queue.task.done():
+            queue.task.cancel()
+
+    def stats(self) -> dict:
+        """Totals over all sockets; served by the public status route, so nothing per user"""
+        queues = list(self.queues.values())
+        return {
+            "policy": self.policy,
+            "max_frames": self.max_frames,
+            "max_bytes": self.max_bytes,
+            "sockets": len(queues),
+            "msgpack_sockets": sum(1 for q in queues if q.protocol == "msgpack"),
+            "queued_frames": sum(q.depth() for q in queues),
+            "queued_bytes": sum(q.bytes for q in queues),
+            "drops": self.closed_drops + sum(q.drops for q in queues),
+            "slow_disconnects": self.slow_disconnects + sum(
+                1 for q in queues if q.close_code == SLOW_CONSUMER_CLOSE_CODE
+            ),
+            "deepest_frames": max((q.depth() for q in queues), default=0),
+            "deepest_bytes": max((q.bytes for q in queues), default=0),
+        }
+
+
+outbound = OutboundManager(
+    max_frames=int(os.getenv("WEBSOCKET_OUTBOUND_MAX_FRAMES", "256")),
+    max_bytes=int(os.getenv("WEBSOCKET_OUTBOUND_MAX_BYTES", str(1024 * 1024))),
+    policy=os.getenv("WEBSOCKET_SLOW_CONSUMER_POLICY", "disconnect")
+)
@@ -0,0 +1,61 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+
+class PersistenceBusyError(Exception):
+    """Raised when a persistence lane already has too much queued work"""
+
+
+class PersistenceExecutor:
+    """Runs blocking database work for the WebSocket server off the event loop.
+
+    Work is sharded by key (the sender id) onto single-threaded lanes, so all
+    jobs of one sender run in submission order while different senders are
+    persisted in parallel. Each lane accepts at most `max_pending` queued jobs;
+    beyond that submit() fails fast with PersistenceBusyError instead of
+    letting memory and latency grow without bound.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 256):
+        self.lanes: List[ThreadPoolExecutor] = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ws-persist-{i}")
+            for i in range(max(1, workers))
+        ]
+        self.max_pending = max_pending
+        # Only read / written from the event loop thread
+        self.pending = [0] * len(self.lanes)
+        self.rejected = 0
+
+    async def submit(self, key: int, fn: Callable, *args) -> Any:
+        lane = hash(key) % len(self.lanes)
+        if self.pending[lane] >= self.max_pending:
+            self.rejected += 1
+            raise PersistenceBusyError(f"Persistence lane {lane} is full")
+
+        self.pending[lane] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.lanes[lane], fn, *args)
+        finally:
+            self.pending[lane] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "lanes": len(self.lanes),
+            "max_pending_per_lane": self.max_pending,
+            "pending": sum(self.pending),
+            "busiest_lane_pending": max(self.pending),
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        for lane in self.lanes:
+            lane.shutdown(wait=True)
+
+
+persistence_executor = PersistenceExecutor(
+    workers=int(os.getenv("WEBSOCKET_DB_WORKERS", "4")),
+    max_pending=int(os.getenv("WEBSOCKET_DB_MAX_PENDING", "256"))
+)
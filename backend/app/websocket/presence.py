@@ -0,0 +1,52 @@
+import asyncio
+import time
+from typing import Callable, Iterable, Optional
+
+from app.websocket.cluster import NODE_ID
+from app.websocket.redis_manager import HEARTBEAT_SECONDS
+
+
+class PresenceHeartbeat:
+    """Keeps this node's users online in the ws:presence sorted set.
+
+    Every `interval` seconds the node re-scores all of its connected users and
+    its own entry in ws:nodes with the current time (one pipeline), then reaps
+    users and nodes whose score is older than the lease. A crashed node stops
+    renewing, so its users drop out of presence within one lease instead of
+    staying online forever; users also connected to a live node are kept by
+    that node's heartbeat.
+    """
+
+    def __init__(self, node_id: str, interval: float = HEARTBEAT_SECONDS):
+        self.node_id = node_id
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.beats = 0
+        self.reaped = 0
+        self.last_beat: Optional[float] = None
+
+    def start(self, redis_manager, connected_users: Callable[[], Iterable[int]]):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run(redis_manager, connected_users))
+
+    async def run(self, redis_manager, connected_users: Callable[[], Iterable[int]]):
+        while True:
+            try:
+                if await redis_manager.heartbeat(self.node_id, connected_users()):
+                    self.beats += 1
+                    self.last_beat = time.time()
+                self.reaped += await redis_manager.reap_presence()
+            except Exception as e:
+                print(f"Error in presence heartbeat: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "heartbeats": self.beats,
+            "last_heartbeat": self.last_beat,
+            "users_reaped": self.reaped,
+        }
+
+
+presence = PresenceHeartbeat(NODE_ID)
@@ -1,10 +1,20 @@
 import redis
-import json
 import os
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Tuple
 import asyncio
 from datetime import datetime
 
+# Sorted set of online user ids scored by their last heartbeat (unix time), and
+# of WebSocket node ids scored by their last lease renewal
+PRESENCE_KEY = "ws:presence"
+NODES_KEY = "ws:nodes"
+
+# Every node renews its users' heartbeats this often; a user or node whose
+# heartbeat is older than the lease counts as offline and gets reaped
+HEARTBEAT_SECONDS = int(os.getenv("WEBSOCKET_HEARTBEAT_SECONDS", "30"))
+PRESENCE_LEASE_SECONDS = 3 * HEARTBEAT_SECONDS
+
 class RedisConnectionManager:
     """Manages WebSocket connections using Redis"""
     
@@ -45,14 +55,14 @@ class RedisConnectionManager:
                 **connection_info
             }
             
-            self.redis_client.setex(
-                key, 
-                3600,  # 1 hour TTL
-                json.dumps(data)
-            )
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.hset(key, mapping={field: str(value) for field, value in data.items()})
+            pipe.expire(key, 3600)  # 1 hour TTL
             
-            # Add to online users set
-            self.redis_client.sadd("ws:online_users", user_id)
+            # Add to online users
+            pipe.zadd(PRESENCE_KEY, {user_id: time.time()})
+            pipe.execute()
             return True
             
         except Exception as e:
@@ -65,7 +75,7 @@ class RedisConnectionManager:
         
         try:
             # Remove from online users
-            self.redis_client.srem("ws:online_users", user_id)
+            self.redis_client.zrem(PRESENCE_KEY, user_id)
             
             # Remove connection info
             key = f"ws:user:{user_id}"
@@ -81,21 +91,82 @@ class RedisConnectionManager:
             return False
         
         try:
-            return self.redis_client.sismember("ws:online_users", user_id)
+            score = self.redis_client.zscore(PRESENCE_KEY, user_id)
+            return score is not None and score >= time.time() - PRESENCE_LEASE_SECONDS
         except Exception as e:
             print(f"Error checking user online status: {e}")
             return False
-    
-    def get_online_users(self) -> list:
-        """Get list of all online users"""
+
+    def are_users_online(self, user_ids: List[int]) -> Dict[int, bool]:
+        """Check online status for many users in a single round-trip"""
+        user_ids = list(user_ids)
+        if not self.redis_client or not user_ids:
+            return {user_id: False for user_id in user_ids}
+
+        try:
+            try:
+                scores = self.redis_client.zmscore(PRESENCE_KEY, user_ids)
+            except redis.ResponseError:
+                # ZMSCORE needs Redis 6.2+, fall back to one pipelined round-trip
+                pipe = self.redis_client.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.zscore(PRESENCE_KEY, user_id)
+                scores = pipe.execute()
+            cutoff = time.time() - PRESENCE_LEASE_SECONDS
+            return {user_id: score is not None and score >= cutoff for user_id, score in zip(user_ids, scores)}
+        except Exception as e:
+            print(f"Error checking online status in bulk: {e}")
+            return {user_id: False for user_id in user_ids}
+
+    def get_online_users(self, within: Optional[int] = None, offset: int = 0, count: Optional[int] = None) -> list:
+        """Users with a heartbeat in the last `within` seconds (default: the lease), oldest heartbeat first.
+        With count, only users offset .. offset + count of that order (ZRANGEBYSCORE LIMIT)."""
         if not self.redis_client:
             return []
         
         try:
-            return [int(user_id) for user_id in self.redis_client.smembers("ws:online_users")]
+            cutoff = time.time() - (within or PRESENCE_LEASE_SECONDS)
+            limit = {"start": offset, "num": count} if count is not None else {}
+            return [int(user_id) for user_id in self.redis_client.zrangebyscore(PRESENCE_KEY, cutoff, "+inf", **limit)]
         except Exception as e:
             print(f"Error getting online users: {e}")
             return []
+
+    def count_online_users(self, within: Optional[int] = None) -> int:
+        """O(1) count of the presence set, or O(log n) count of heartbeats in the last `within` seconds"""
+        if not self.redis_client:
+            return 0
+
+        try:
+            if within is None:
+                return self.redis_client.zcard(PRESENCE_KEY)
+            return self.redis_client.zcount(PRESENCE_KEY, time.time() - within, "+inf")
+        except Exception as e:
+            print(f"Error counting online users: {e}")
+            return 0
+
+    def scan_online_users(self, cursor: int = 0, count: int = 100, skip: int = 0) -> Tuple[int, int, List[int]]:
+        """One page of at most `count` online users. Returns (next cursor, next skip, user ids); both are 0 when done.
+
+        ZSCAN's COUNT is only a hint (a small set comes back whole), so a scan step
+        returning more than `count` users is handed out over several pages: `skip`
+        is how many of that step's users the earlier pages returned. Users online
+        for the whole scan are returned at least once, except that a set small
+        enough to be kept sorted by heartbeat may reorder between those pages.
+        """
+        if not self.redis_client:
+            return 0, 0, []
+
+        try:
+            next_cursor, page = self.redis_client.zscan(PRESENCE_KEY, cursor, count=count)
+            cutoff = time.time() - PRESENCE_LEASE_SECONDS
+            users = [int(user_id) for user_id, score in page[skip:skip + count] if score >= cutoff]
+            if skip + count < len(page):
+                return cursor, skip + count, users
+            return next_cursor, 0, users
+        except Exception as e:
+            print(f"Error scanning online users: {e}")
+            return 0, 0, []
     
     def update_user_activity(self, user_id: int):
         """Update user's last seen timestamp"""
@@ -104,15 +175,11 @@ class RedisConnectionManager:
         
         try:
             key = f"ws:user:{user_id}"
-            if self.redis_client.exists(key):
-                # Get existing data
-                data = json.loads(self.redis_client.get(key) or "{}")
-                data["last_seen"] = datetime.utcnow().isoformat()
-                
-                # Update with new TTL
-                self.redis_client.setex(key, 3600, json.dumps(data))
-                return True
-            return False
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(key, "last_seen", datetime.utcnow().isoformat())
+            pipe.expire(key, 3600)
+            pipe.execute()
+            return True
             
         except Exception as e:
             print(f"Error updating user activity: {e}")
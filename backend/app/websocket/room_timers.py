@@ -0,0 +1,76 @@
+import asyncio
+import math
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+class ExpiryScheduler:
+    """Bucketed expiry scheduler (a hashed timer wheel) for private room TTLs.
+
+    Deadlines are rounded up to `resolution`-second slots. Each slot holds the
+    set of keys expiring in it, and a single ticker task sweeps due slots and
+    hands their keys to the callback in one batch. Compared with one sleeping
+    task per room this costs two dict entries per timer; schedule and cancel
+    are O(1).
+    """
+
+    def __init__(self, resolution: float = 1.0):
+        self.resolution = resolution
+        self.slots: Dict[int, Set[str]] = {}
+        self.deadlines: Dict[str, int] = {}  # key -> slot
+        self.cursor: Optional[int] = None  # last slot swept
+        self.task: Optional[asyncio.Task] = None
+        self.expired = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _slot(self, when: float) -> int:
+        return math.ceil(when / self.resolution)
+
+    def schedule(self, key: str, delay: float) -> float:
+        """(Re)schedule key to expire after delay seconds. Returns the deadline in loop time."""
+        self.cancel(key)
+        deadline = self._now() + delay
+        slot = max(self._slot(deadline), (self.cursor or 0) + 1)
+        self.slots.setdefault(slot, set()).add(key)
+        self.deadlines[key] = slot
+        return deadline
+
+    def cancel(self, key: str) -> bool:
+        slot = self.deadlines.pop(key, None)
+        if slot is None:
+            return False
+        keys = self.slots.get(slot)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.slots[slot]
+        return True
+
+    def pending(self) -> int:
+        return len(self.deadlines)
+
+    def start(self, on_expire: Callable[[List[str]], Awaitable[None]]):
+        if self.task is None or self.task.done():
+            self.cursor = math.floor(self._now() / self.resolution)
+            self.task = asyncio.get_running_loop().create_task(self.run(on_expire))
+
+    async def run(self, on_expire: Callable[[List[str]], Awaitable[None]]):
+        while True:
+            await asyncio.sleep(self.resolution)
+            # Slots whose whole time range has passed
+            now_slot = math.floor(self._now() / self.resolution)
+
+            due: List[str] = []
+            while self.cursor < now_slot:
+                self.cursor += 1
+                for key in self.slots.pop(self.cursor, ()):
+                    self.deadlines.pop(key, None)
+                    due.append(key)
+
+            if due:
+                self.expired += len(due)
+                try:
+                    await on_expire(due)
+                except Exception as e:
+                    print(f"Error expiring {len(due)} timer(s): {e}")
@@ -6,9 +6,19 @@ import os
 from datetime import datetime, timedelta
 from app.websocket.service import websocket_service
 from app.websocket.redis_manager import redis_manager
+from app.websocket import server as websocket_server
+from app.websocket.persistence import persistence_executor
+from app.services.profile_cache import profile_cache
+from app.services.membership_cache import membership_cache
+from app.services.matching import matching_index
+from app.services.suggestions import suggestion_store
+from app.services.message_writer import message_writer
 
 websocket_bp = Blueprint('websocket', __name__, url_prefix='/api/websocket')
 
+# Most users /users/online returns per page
+ONLINE_USERS_MAX_PAGE = 1000
+
 @websocket_bp.route('/token', methods=['POST'])
 @jwt_required
 def generate_websocket_token():
@@ -51,10 +61,24 @@ def generate_websocket_token():
 
 @websocket_bp.route('/status', methods=['GET'])
 def websocket_status():
+    """Public health / metrics endpoint: counts and totals only, never user ids"""
     return jsonify({
         "status": "running" if websocket_service.is_running else "stopped",
         "redis_connected": redis_manager.redis_client is not None,
-        "online_users_count": len(redis_manager.get_online_users())
+        "online_users_count": redis_manager.count_online_users(),
+        "pending_room_timers": websocket_server.room_expiry.pending(),
+        "node_id": websocket_server.NODE_ID,
+        "workers": websocket_service.supervisor.alive() if websocket_service.supervisor else None,
+        "outbound": websocket_server.outbound.stats(),
+        "compression": websocket_server.compression.stats(),
+        "activity": websocket_server.activity.stats(),
+        "presence": websocket_server.presence.stats(),
+        "persistence": persistence_executor.stats(),
+        "profile_cache": profile_cache.stats(),
+        "membership_cache": membership_cache.stats(),
+        "matching": matching_index.stats(),
+        "suggestions": suggestion_store.stats(),
+        "message_writer": message_writer.stats()
     })
 
 @websocket_bp.route('/users/<int:user_id>/online', methods=['GET'])
@@ -69,9 +93,34 @@ def check_user_online_status(user_id):
 @websocket_bp.route('/users/online', methods=['GET'])
 @jwt_required
 def get_online_users():
-    """Get list of all online users from Redis"""
-    online_users = websocket_service.get_online_users()
+    """Page through online users: ?cursor=<next_cursor>&limit=100, next_cursor is null on the last page.
+    ?within=N lists the users with a heartbeat in the last N seconds instead, oldest heartbeat first."""
+    limit = min(max(request.args.get('limit', 100, type=int), 1), ONLINE_USERS_MAX_PAGE)
+    cursor = request.args.get('cursor', '0')
+    within = request.args.get('within', type=int)
+
+    if within:
+        # The cursor is an offset into the users ordered by heartbeat
+        if not cursor.isdigit():
+            return jsonify({"error": "Invalid cursor"}), 400
+        offset = int(cursor)
+        online_users = websocket_service.get_online_users(within, offset, limit + 1)
+        more = len(online_users) > limit
+        return jsonify({
+            "online_users": online_users[:limit],
+            "count": websocket_service.count_online_users(within),
+            "next_cursor": str(offset + limit) if more else None
+        })
+
+    # "<ZSCAN cursor>" or "<ZSCAN cursor>:<users of that scan step already returned>"
+    scan_cursor, _, skip = cursor.partition(':')
+    if not scan_cursor.isdigit() or not (skip or '0').isdigit():
+        return jsonify({"error": "Invalid cursor"}), 400
+    next_cursor, next_skip, online_users = websocket_service.scan_online_users(int(scan_cursor), limit, int(skip or 0))
+    if next_skip:
+        next_cursor = f"{next_cursor}:{next_skip}"
     return jsonify({
         "online_users": online_users,
-        "count": len(online_users)
+        "count": websocket_service.count_online_users(),
+        "next_cursor": str(next_cursor) if next_cursor else None
     })
@@ -3,12 +3,33 @@ import websockets
 import json
 import jwt
 import os
+import time
 from datetime import datetime
-from typing import Dict, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from app.websocket.async_redis_manager import async_redis_manager
 from app.websocket.redis_manager import redis_manager
+from app.websocket.persistence import persistence_executor, PersistenceBusyError
+from app.websocket.room_timers import ExpiryScheduler
+from app.websocket.outbound import outbound
+from app.websocket.compression import compression
+from app.websocket.activity import activity
+from app.websocket.presence import presence
+from app.websocket.cluster import CLUSTER_ENABLED, NODE_ID, message_router, publish_to_user_nodes, room_registry
 from app.models.database import db
 from dotenv import load_dotenv
 
+try:
+    # Optional faster encoder for outgoing events
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Optional binary wire protocol, negotiated per connection
+    import msgpack
+except ImportError:
+    msgpack = None
+
 load_dotenv()
 
 # Flask app reference is injected from app initialization to avoid circular imports.
@@ -26,6 +47,146 @@ local_connections: Dict[int, Set[websockets.WebSocketServerProtocol]] = {}
 # Captured event loop for cross-thread scheduling (Flask thread -> WS thread)
 ws_event_loop: Optional[asyncio.AbstractEventLoop] = None
 
+
+# Wire protocols a client can ask for in its authenticate message. Text frames
+# are always JSON and binary frames MessagePack, in both directions.
+PROTOCOLS = ("json", "msgpack") if msgpack is not None else ("json",)
+
+# ISO strings sent as native MessagePack timestamps (top level and in "data")
+TIMESTAMP_FIELDS = ("created_at", "timestamp")
+
+
+def _native_timestamps(message: dict, nested: bool = True) -> dict:
+    """Copy of message with its ISO timestamp strings parsed; message itself is left as is"""
+    converted = message
+    for key in TIMESTAMP_FIELDS:
+        value = message.get(key)
+        if not isinstance(value, str):
+            continue
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            # Our naive timestamps are UTC (re-parsing is cheaper than datetime.replace)
+            parsed = datetime.fromisoformat(value + "+00:00")
+        if converted is message:
+            converted = dict(message)
+        converted[key] = parsed
+
+    data = message.get("data")
+    if nested and isinstance(data, dict):
+        native = _native_timestamps(data, nested=False)
+        if native is not data:
+            if converted is message:
+                converted = dict(message)
+            converted["data"] = native
+    return converted
+
+
+def encode_event(message: dict, protocol: str = "json") -> Union[str, bytes]:
+    """Serialize an outgoing event (orjson when installed, MessagePack if negotiated)"""
+    if protocol == "msgpack":
+        return msgpack.packb(_native_timestamps(message), use_bin_type=True, datetime=True)
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message)
+
+
+def decode_event(frame: Union[str, bytes]) -> dict:
+    """Parse an incoming frame. Raises ValueError for malformed frames."""
+    if isinstance(frame, bytes):
+        if msgpack is None:
+            raise ValueError("Binary frames are not supported")
+        return msgpack.unpackb(frame, raw=False)
+    return json.loads(frame)
+
+
+def socket_protocol(websocket) -> str:
+    queue = outbound.get(websocket)
+    return queue.protocol if queue is not None else "json"
+
+
+class EncodedFrames(dict):
+    """An event encoded at most once per wire protocol: frames[protocol]"""
+
+    def __init__(self, message: dict):
+        super().__init__()
+        self.message = message
+
+    def __missing__(self, protocol: str):
+        data = self[protocol] = encode_event(self.message, protocol)
+        return data
+
+
+def coalesce_key(message: dict) -> Optional[str]:
+    """Events a newer one of the same key makes obsolete (used by the "coalesce" slow consumer policy)"""
+    if message.get("type") in ("user_joined_room", "user_left_room"):
+        return f"members:{message.get('room_id')}"
+    return None
+
+
+async def send_event(websocket, message: dict):
+    """Send one event to one socket, through its outbound queue once it has one"""
+    queue = outbound.get(websocket)
+    if queue is not None:
+        queue.put(encode_event(message, queue.protocol), coalesce_key(message))
+        return
+    await websocket.send(encode_event(message))
+
+
+async def broadcast(sockets: Iterable, message: dict, exclude=None) -> Set:
+    """Send one event to many sockets.
+
+    The event is encoded once and appended to every socket's outbound queue;
+    each socket's writer task sends it, so a slow socket only backs up its own
+    queue. Returns the sockets that are gone (or were just disconnected as slow
+    consumers) so the caller can drop them in one pass.
+    """
+    targets = [ws for ws in sockets if ws is not exclude]
+    if not targets:
+        return set()
+
+    frames = EncodedFrames(message)
+    key = coalesce_key(message)
+    failed = set()
+    unqueued = []
+    for ws in targets:
+        queue = outbound.get(ws)
+        if queue is None:
+            unqueued.append(ws)
+        elif not queue.put(frames[queue.protocol], key):
+            failed.add(ws)
+
+    if unqueued:
+        data = frames["json"]
+        results = await asyncio.gather(*(ws.send(data) for ws in unqueued), return_exceptions=True)
+        failed.update(ws for ws, result in zip(unqueued, results) if isinstance(result, Exception))
+    return failed
+
+
+async def close_with_event(sockets: Iterable, message: dict) -> Set:
+    """Send a final event to the sockets and close them, after what is already queued for them"""
+    frames = EncodedFrames(message)
+
+    async def notify_and_close(ws):
+        await ws.send(frames["json"])
+        await ws.close()
+
+    failed = set()
+    unqueued = []
+    for ws in list(sockets):
+        queue = outbound.get(ws)
+        if queue is None:
+            unqueued.append(ws)
+        elif not queue.close_after(frames[queue.protocol]):
+            failed.add(ws)
+
+    if unqueued:
+        results = await asyncio.gather(*(notify_and_close(ws) for ws in unqueued), return_exceptions=True)
+        failed.update(ws for ws, result in zip(unqueued, results) if isinstance(result, Exception))
+    return failed
+
 def authenticate_token(token: str) -> Optional[int]:
     try:
         secret_key = os.getenv("SECRET_KEY", "dev-secret-key")
@@ -37,11 +198,49 @@ def authenticate_token(token: str) -> Optional[int]:
 ROOM_TIME_SECONDS = 300
 
 # =======================
-# Private Rooms (In-Memory)
+# Private Rooms
 # TTL starts when 2nd socket joins
+#
+# private_rooms holds this node's sockets of each room. With WEBSOCKET_CLUSTER=1
+# the room itself (creator, member count, deadline) lives in the Redis room
+# registry, and room events are relayed to the other nodes over pub/sub.
 # =======================
 private_rooms: Dict[str, dict] = {}
 
+# All room TTLs share one bucketed scheduler instead of a sleeping task per room
+room_expiry = ExpiryScheduler(resolution=1.0)
+
+# Reverse index of private_rooms["users"]: socket -> ids of the rooms it is in.
+# Disconnect cleanup only visits the socket's own rooms instead of every room.
+socket_rooms: Dict[websockets.WebSocketServerProtocol, Set[str]] = {}
+
+
+def add_room_member(room_id: str, websocket):
+    private_rooms[room_id]["users"].add(websocket)
+    socket_rooms.setdefault(websocket, set()).add(room_id)
+
+
+def remove_room_members(room_id: str, sockets: Iterable):
+    room = private_rooms.get(room_id)
+    for ws in list(sockets):
+        if room:
+            room["users"].discard(ws)
+        rooms = socket_rooms.get(ws)
+        if rooms is not None:
+            rooms.discard(room_id)
+            if not rooms:
+                socket_rooms.pop(ws, None)
+
+
+async def remove_private_room(room_id: str):
+    """Drop this node's copy of the room (its TTL timer, socket index and subscription)"""
+    room = private_rooms.get(room_id)
+    room_expiry.cancel(room_id)
+    if room:
+        remove_room_members(room_id, room["users"])
+        private_rooms.pop(room_id, None)
+    await room_registry.unsubscribe(room_id)
+
 
 def create_private_room(room_id: str, creator_user_id: Optional[int] = None):
     if room_id in private_rooms:
@@ -50,7 +249,6 @@ def create_private_room(room_id: str, creator_user_id: Optional[int] = None):
     private_rooms[room_id] = {
         "users": set(),
         "expires_at": None,
-        "task": None,
         "ttl_started": False,
         "creator_user_id": creator_user_id,
     }
@@ -62,101 +260,250 @@ def create_room(room_id: str):
     create_private_room(room_id)
 
 
-async def destroy_private_rooms(roomid: str):
-    await asyncio.sleep(ROOM_TIME_SECONDS)
+async def register_private_room(room_id: str, creator_user_id: Optional[int] = None) -> dict:
+    """Create the room (in the registry too) or claim an existing room that has no creator"""
+    meta = await room_registry.create(room_id, creator_user_id)
+    if meta:
+        creator_user_id = meta["creator_user_id"]
+
+    create_private_room(room_id, creator_user_id)
+    room = private_rooms[room_id]
+    # If it was created without a creator (older state), claim it.
+    if room.get("creator_user_id") is None:
+        room["creator_user_id"] = creator_user_id
+    return room
+
+
+async def find_private_room(room_id: str) -> Optional[dict]:
+    """This node's copy of the room, mirrored from the registry when it only lives on other nodes"""
+    room = private_rooms.get(room_id)
+    if room is not None or not room_registry.enabled:
+        return room
+
+    meta = await room_registry.get(room_id)
+    if not meta:
+        return None
+    create_private_room(room_id, meta["creator_user_id"])
+    if meta["expires_at"]:
+        apply_room_ttl(room_id, meta["expires_at"])
+    return private_rooms.get(room_id)
+
+
+async def join_room(room_id: str, websocket) -> int:
+    """Add a socket to the room. Returns the room's member count across all nodes."""
+    room = private_rooms[room_id]
+    add_room_member(room_id, websocket)
+    if not room_registry.enabled:
+        return len(room["users"])
 
-    room = private_rooms.get(roomid)
-    if not room :
+    await room_registry.subscribe(room_id)
+    meta = await room_registry.join(room_id)
+    if not meta:
+        return len(room["users"])
+    if meta["expires_at"]:
+        apply_room_ttl(room_id, meta["expires_at"])
+    return meta["user_count"]
+
+
+async def leave_room(room_id: str, sockets: Iterable) -> int:
+    """Remove sockets from the room. Returns the members left across all nodes.
+
+    This node's copy of the room is dropped once none of its sockets are left;
+    the registry deletes the room itself once no node has any.
+    """
+    room = private_rooms.get(room_id)
+    members = [ws for ws in sockets if room and ws in room["users"]]
+    remove_room_members(room_id, members)
+    remaining = len(room["users"]) if room else 0
+
+    if room_registry.enabled:
+        total = await room_registry.leave(room_id, len(members))
+        if total is not None:
+            remaining = total
+
+    if room is not None and not room["users"]:
+        await remove_private_room(room_id)
+    return remaining
+
+
+async def broadcast_to_room(room_id: str, event: dict, exclude=None):
+    """Send a room event to this node's sockets directly and relay it to the other nodes"""
+    room = private_rooms.get(room_id)
+    sockets = room["users"] if room else ()
+    dead, _ = await asyncio.gather(
+        broadcast(sockets, event, exclude=exclude),
+        room_registry.publish(room_id, event)
+    )
+    if dead:
+        await leave_room(room_id, dead)
+
+
+async def handle_remote_room_event(room_id: str, event: dict):
+    """Deliver a room event published by another node to this node's sockets"""
+    room = private_rooms.get(room_id)
+    if not room:
+        return
+
+    if event.get("type") in ("room_ended", "room_expired"):
+        await close_with_event(room["users"], event)
+        await remove_private_room(room_id)
+        return
+
+    if event.get("ttl_started") and event.get("expires_in") is not None:
+        apply_room_ttl(room_id, time.time() + event["expires_in"])
+
+    dead = await broadcast(room["users"], event)
+    if dead:
+        await leave_room(room_id, dead)
+
+
+async def expire_private_rooms(room_ids: List[str]):
+    """Scheduler callback: destroy a batch of rooms whose TTL ran out"""
+    rooms = [(room_id, private_rooms.get(room_id)) for room_id in room_ids]
+    rooms = [(room_id, room) for room_id, room in rooms if room]
+
+    async def expire(room_id: str, room: dict):
+        event = {
+            "type": "room_expired",
+            "room_id": room_id
+        }
+        failed, _ = await asyncio.gather(
+            close_with_event(room["users"], event),
+            room_registry.publish(room_id, event)
+        )
+        await room_registry.delete(room_id)
+        return failed
+
+    results = await asyncio.gather(*(expire(room_id, room) for room_id, room in rooms), return_exceptions=True)
+
+    for (room_id, _), failed in zip(rooms, results):
+        if isinstance(failed, Exception):
+            print(f"Error in handling destroying room : {room_id} - {failed}")
+        elif failed:
+            print(f"Error in handling destroying room : {room_id} - {len(failed)} socket(s) failed")
+        await remove_private_room(room_id)
+    if rooms:
+        print(f"{len(rooms)} room(s) destroyed after TTL")
+
+
+def apply_room_ttl(room_id: str, expires_at: float):
+    """Schedule this node's expiry of the room at expires_at (unix time)"""
+    room = private_rooms.get(room_id)
+    if not room or room.get("ttl_started"):
         return
-    for ws in list(room["users"]):
-        try: 
-            await ws.send(json.dumps({
-                "type":"room_expired",
-                "room_id" : roomid
-            }))
-            await ws.close()
-        except Exception as e:
-             print(f"Error in handling destroying romm : {roomid} - {e}")
-    
-    private_rooms.pop(roomid, None)
-    print(f"Room {roomid} destroyed after TTL")
 
-def start_room_ttl(room_id: str):
+    room_expiry.schedule(room_id, expires_at - time.time())
+    room["expires_at"] = expires_at
+    room["ttl_started"] = True
+
+
+async def start_room_ttl(room_id: str):
     room = private_rooms.get(room_id)
     if not room or room.get("ttl_started"):
         return
-    loop = asyncio.get_running_loop()
-    task = loop.create_task(destroy_private_rooms(room_id))
 
-    room["task"]=task
-    room["expires_at"]=loop.time() + ROOM_TIME_SECONDS
-    room["ttl_started"]=True
+    expires_at = time.time() + ROOM_TIME_SECONDS
+    # Another node may have started it first, its deadline wins
+    expires_at = await room_registry.start_ttl(room_id, expires_at) or expires_at
+    apply_room_ttl(room_id, expires_at)
     print(f"TTL started for room {room_id}")
 
 def _room_expires_in_seconds(room_id: str) -> Optional[int]:
     room = private_rooms.get(room_id)
     if not room or not room.get("ttl_started") or room.get("expires_at") is None:
         return None
-    loop = asyncio.get_running_loop()
-    return max(0, int(room["expires_at"] - loop.time()))
+    return max(0, int(room["expires_at"] - time.time()))
 
 
 async def end_private_room(room_id: str):
     """Manually ending a room"""
-    room = private_rooms.get(room_id)
+    room = await find_private_room(room_id)
     if not room:
         return
-    if room.get("task"):
-        room["task"].cancel()
+    room_expiry.cancel(room_id)
 
-    for ws in list(room["users"]):
-        try:
-            await ws.send(json.dumps({
-                "type": "room_ended",
-                "room_id": room_id
-            }))
-            await ws.close()
-        except Exception as e:
-            print(f"Error notifying user in room {room_id}: {e}")
+    event = {
+        "type": "room_ended",
+        "room_id": room_id
+    }
+    failed, _ = await asyncio.gather(
+        close_with_event(room["users"], event),
+        room_registry.publish(room_id, event)
+    )
+    if failed:
+        print(f"Error notifying {len(failed)} user(s) in room {room_id}")
     
     # Remove room
-    private_rooms.pop(room_id, None)
+    await room_registry.delete(room_id)
+    await remove_private_room(room_id)
     print(f"Room {room_id} manually ended")
     
 
-async def send_to_user(user_id: int, message: dict):
-    """ if they're online locally"""
+async def send_to_local_user(user_id: int, *messages: dict):
+    """Send events, in order, to the user's sockets on this node"""
     sockets = local_connections.get(user_id)
     if not sockets:
         return
 
-    dead: Set[websockets.WebSocketServerProtocol] = set()
-    for ws in list(sockets):
-        try:
-            await ws.send(json.dumps(message))
-        except Exception as e:
-            print(f"Failed to send WS message to user {user_id}: {e}")
-            dead.add(ws)
-
-    if dead:
-        sockets.difference_update(dead)
+    for message in messages:
+        dead = await broadcast(sockets, message)
+        if dead:
+            print(f"Failed to send WS message to user {user_id} on {len(dead)} socket(s)")
+            sockets.difference_update(dead)
 
     if sockets:
-        redis_manager.update_user_activity(user_id)
+        activity.touch(user_id)
         local_connections[user_id] = sockets
     else:
         local_connections.pop(user_id, None)
-        redis_manager.set_user_offline(user_id)
+        activity.forget(user_id)
+        await async_redis_manager.set_user_offline(user_id, NODE_ID)
+
+
+async def send_to_remote_user(user_id: int, message: dict):
+    """Publish the event to the other nodes the user is connected through"""
+    nodes = await async_redis_manager.get_user_nodes(user_id)
+    stale = await message_router.route(user_id, message, nodes)
+    for node in stale:
+        await async_redis_manager.remove_user_node(user_id, node)
+
+
+async def send_to_user(user_id: int, message: dict):
+    """Push an event to all of the user's sockets, on this node and on other nodes"""
+    if not message_router.enabled:
+        await send_to_local_user(user_id, message)
+        return
+
+    await asyncio.gather(
+        send_to_local_user(user_id, message),
+        send_to_remote_user(user_id, message)
+    )
+
+
+async def deliver_routed_messages(batch: List[Tuple[int, dict]]):
+    """Deliver a batch drained from this node's inbox, each user's events in order"""
+    by_user: Dict[int, List[dict]] = {}
+    for user_id, message in batch:
+        by_user.setdefault(user_id, []).append(message)
+
+    await asyncio.gather(*(
+        send_to_local_user(user_id, *messages)
+        for user_id, messages in by_user.items()
+    ))
 
 
 def schedule_send_to_user(user_id: int, message: dict) -> bool:
     """Schedule a message to be sent to a user from a non-async / different thread.
 
     Returns True if scheduled, False if the WS loop isn't ready.
+    Without a WS loop in this process (WEBSOCKET_WORKERS mode) the message is
+    published straight to the inboxes of the worker(s) serving the user.
     """
     global ws_event_loop
     loop = ws_event_loop
     if loop is None or not loop.is_running():
+        if CLUSTER_ENABLED:
+            return publish_to_user_nodes(redis_manager.redis_client, user_id, message)
         return False
 
     try:
@@ -168,148 +515,90 @@ def schedule_send_to_user(user_id: int, message: dict) -> bool:
 
 async def handle_create_private_room(websocket, room_id: str):
     if not room_id:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "error",
             "message": "room_id required"
-        }))
+        })
         return
 
-    create_private_room(room_id)
-    await websocket.send(json.dumps({
+    await register_private_room(room_id)
+    await send_event(websocket, {
         "type": "room_created",
         "room_id": room_id,
-    }))
+    })
 
     await handle_join_private_room(websocket, room_id)
 
 
 async def handle_create_private_room_for_user(websocket, sender_id: int, room_id: str):
     if not room_id:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "error",
             "message": "room_id required"
-        }))
+        })
         return
 
-    room = private_rooms.get(room_id)
-    if room is None:
-        create_private_room(room_id, creator_user_id=sender_id)
-    else:
-        # If it was created without a creator (older state), claim it.
-        if room.get("creator_user_id") is None:
-            room["creator_user_id"] = sender_id
+    await register_private_room(room_id, creator_user_id=sender_id)
 
-    await websocket.send(json.dumps({
+    await send_event(websocket, {
         "type": "room_created",
         "room_id": room_id,
-    }))
+    })
 
     await handle_join_private_room_for_user(websocket, sender_id, room_id)
 
 
 async def handle_join_private_room(websocket, room_id: str):
     """Handle joining a private room"""
+    await handle_join_private_room_for_user(websocket, None, room_id)
+
+
+async def handle_join_private_room_for_user(websocket, sender_id: Optional[int], room_id: str):
+    """Join handler that can also provide is_creator flag."""
     if not room_id:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "error",
             "message": "room_id required"
-        }))
+        })
         return
 
     # IMPORTANT: joining should NOT create rooms.
     # This prevents users from joining random codes that don't exist.
-    room = private_rooms.get(room_id)
-
+    room = await find_private_room(room_id)
     if not room:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "room_not_found",
             "room_id": room_id,
             "message": "Room not found"
-        }))
+        })
         return
 
-    # Add user to room
-    room["users"].add(websocket)
-    user_count = len(room["users"])
+    user_count = await join_room(room_id, websocket)
 
     # Start TTL when 2nd socket joins
-    if user_count == 2 and not room["ttl_started"]:
-        start_room_ttl(room_id)
+    if user_count >= 2 and not room["ttl_started"]:
+        await start_room_ttl(room_id)
 
     expires_in = _room_expires_in_seconds(room_id)
+    is_creator = bool(sender_id) and room.get("creator_user_id") == sender_id
 
-    await websocket.send(json.dumps({
+    await send_event(websocket, {
         "type": "joined_room",
         "room_id": room_id,
         "user_count": user_count,
         "ttl_started": room["ttl_started"],
         "expires_in": expires_in,
-        "is_creator": False,
-    }))
-    
-    # Notify other users in room
-    for ws in list(room["users"]):
-        if ws != websocket:
-            try:
-                    await ws.send(json.dumps({
-                        "type": "user_joined_room",
-                        "room_id": room_id,
-                        "user_count": user_count,
-                        "ttl_started": room["ttl_started"],
-                        "expires_in": expires_in,
-                    }))
-            except Exception:
-                room["users"].discard(ws)
-
-
-async def handle_join_private_room_for_user(websocket, sender_id: int, room_id: str):
-    """Join handler that can also provide is_creator flag."""
-    if not room_id:
-        await websocket.send(json.dumps({
-            "type": "error",
-            "message": "room_id required"
-        }))
-        return
-
-    room = private_rooms.get(room_id)
-    if not room:
-        await websocket.send(json.dumps({
-            "type": "room_not_found",
-            "room_id": room_id,
-            "message": "Room not found"
-        }))
-        return
-
-    room["users"].add(websocket)
-    user_count = len(room["users"])
-
-    if user_count == 2 and not room["ttl_started"]:
-        start_room_ttl(room_id)
-
-    expires_in = _room_expires_in_seconds(room_id)
-    is_creator = bool(sender_id) and room.get("creator_user_id") == sender_id
+        "is_creator": is_creator,
+    })
 
-    await websocket.send(json.dumps({
-        "type": "joined_room",
+    # Notify other users in room
+    await broadcast_to_room(room_id, {
+        "type": "user_joined_room",
         "room_id": room_id,
         "user_count": user_count,
         "ttl_started": room["ttl_started"],
         "expires_in": expires_in,
-        "is_creator": is_creator,
-    }))
-
-    for ws in list(room["users"]):
-        if ws != websocket:
-            try:
-                await ws.send(json.dumps({
-                    "type": "user_joined_room",
-                    "room_id": room_id,
-                    "user_count": user_count,
-                    "ttl_started": room["ttl_started"],
-                    "expires_in": expires_in,
-                }))
-            except Exception:
-                room["users"].discard(ws)
+    }, exclude=websocket)
 
 
 async def handle_leave_private_room(websocket, room_id: str):
@@ -319,52 +608,40 @@ async def handle_leave_private_room(websocket, room_id: str):
     room = private_rooms.get(room_id)
     if not room:
         # idempotent
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "left_room",
             "room_id": room_id,
-        }))
+        })
         return
 
-    if websocket in room.get("users", set()):
-        room["users"].discard(websocket)
-
-    remaining = len(room["users"])
+    ttl_started = room.get("ttl_started", False)
     expires_in = None
     try:
         expires_in = _room_expires_in_seconds(room_id)
     except Exception:
         expires_in = None
 
+    # Drops the room once it is empty (also cancels its TTL timer)
+    remaining = await leave_room(room_id, [websocket])
+
     # Ack to leaver
     try:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "left_room",
             "room_id": room_id,
-        }))
+        })
     except Exception:
         pass
 
     # Notify remaining sockets
-    for ws in list(room["users"]):
-        try:
-            await ws.send(json.dumps({
-                "type": "user_left_room",
-                "room_id": room_id,
-                "user_count": remaining,
-                "ttl_started": room.get("ttl_started", False),
-                "expires_in": expires_in,
-            }))
-        except Exception:
-            room["users"].discard(ws)
-
-    # If empty, delete
-    if remaining == 0:
-        if room.get("task"):
-            try:
-                room["task"].cancel()
-            except Exception:
-                pass
-        private_rooms.pop(room_id, None)
+    if remaining:
+        await broadcast_to_room(room_id, {
+            "type": "user_left_room",
+            "room_id": room_id,
+            "user_count": remaining,
+            "ttl_started": ttl_started,
+            "expires_in": expires_in,
+        })
 
 
 async def handle_room_message(websocket, sender_id: int, room_id: str, payload: dict):
@@ -374,25 +651,20 @@ async def handle_room_message(websocket, sender_id: int, room_id: str, payload:
 
     room = private_rooms.get(room_id)
     if not room:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "room_expired",
             "room_id": room_id
-        }))
+        })
         return
     
     # Broadcast to all other users in room
-    for ws in list(room["users"]):
-        if ws != websocket:
-            try:
-                await ws.send(json.dumps({
-                    "type": "room_message",
-                    "room_id": room_id,
-                    "payload": payload,
-                    "sender_id": sender_id,
-                    "timestamp": datetime.utcnow().isoformat(),
-                }))
-            except Exception:
-                room["users"].discard(ws)
+    await broadcast_to_room(room_id, {
+        "type": "room_message",
+        "room_id": room_id,
+        "payload": payload,
+        "sender_id": sender_id,
+        "timestamp": datetime.utcnow().isoformat(),
+    }, exclude=websocket)
 
 
 async def handle_end_room(websocket, sender_id: int, room_id: str):
@@ -400,21 +672,48 @@ async def handle_end_room(websocket, sender_id: int, room_id: str):
     if not room_id:
         return
 
-    room = private_rooms.get(room_id)
+    room = await find_private_room(room_id)
     if not room:
         return
 
     creator_user_id = room.get("creator_user_id")
     if creator_user_id is not None and creator_user_id != sender_id:
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "error",
             "message": "Only the creator can end the room"
-        }))
+        })
         return
 
     await end_private_room(room_id)
 
 
+def persist_chat_message(sender_id: int, recipient_id: int, content: str, msg_type: str) -> dict:
+    """Store a 1-to-1 message and build its `new_message` payload. Blocking, runs on a persistence lane."""
+    from app.services.message_writer import message_writer
+    from app.services.profile_cache import DEFAULT_PROFILE_PIC, profile_cache
+
+    def persist():
+        message = message_writer.send_message(sender_id, recipient_id, content, msg_type)
+        sender = profile_cache.get(sender_id)
+        sender_pfp = sender.pfp if sender else DEFAULT_PROFILE_PIC
+
+        return {
+            "id": message.id,
+            "sender_id": sender_id,
+            "recipient_id": recipient_id,
+            "conversation_id": message.conversation_id,
+            "content": content,
+            "created_at": message.created_at.isoformat(),
+            "message_type": msg_type,
+            "pfp": sender_pfp,
+        }
+
+    if flask_app is not None:
+        with flask_app.app_context():
+            return persist()
+    return persist()
+
+
 async def handle_message(websocket, sender_id: int, message_data: dict):
     """Handle incoming messages - router function"""
     message_type = message_data.get("type")
@@ -455,45 +754,21 @@ async def handle_message(websocket, sender_id: int, message_data: dict):
         if not recipient_id or not content:
             return
         
-        from app.services.chat_service import ChatService
-        from app.models import User
-
-        message_payload = None
         try:
-            if flask_app is not None:
-                with flask_app.app_context():
-                    message = ChatService.send_message(sender_id, recipient_id, content, msg_type)
-                    sender = db.session.get(User, sender_id)
-                    sender_pfp = sender.profile_pic if sender and sender.profile_pic else "/avatars/male_avatar.png"
-                    
-                    message_payload = {
-                        "id": message.id,
-                        "sender_id": sender_id,
-                        "recipient_id": recipient_id,
-                        "conversation_id": message.conversation_id,
-                        "content": content,
-                        "created_at": message.created_at.isoformat(),
-                        "message_type": msg_type,
-                        "pfp": sender_pfp,
-                    }
-            else:
-                message = ChatService.send_message(sender_id, recipient_id, content, msg_type)
-                sender = db.session.get(User, sender_id)
-                sender_pfp = sender.profile_pic if sender and sender.profile_pic else "/avatars/male_avatar.png"
-                
-                message_payload = {
-                    "id": message.id,
-                    "sender_id": sender_id,
-                    "recipient_id": recipient_id,
-                    "conversation_id": message.conversation_id,
-                    "content": content,
-                    "created_at": message.created_at.isoformat(),
-                    "message_type": msg_type,
-                    "pfp": sender_pfp,
-                }
+            # DB work runs on the persistence lanes, the loop keeps serving other sockets
+            message_payload = await persistence_executor.submit(
+                sender_id, persist_chat_message, sender_id, recipient_id, content, msg_type
+            )
+        except PersistenceBusyError:
+            await send_event(websocket, {
+                "type": "error",
+                "code": "server_busy",
+                "message": "Server busy, message not sent"
+            })
+            return
         except Exception as e:
             print(f"Error persisting WS message {sender_id}->{recipient_id}: {e}")
-            await websocket.send(json.dumps({"type": "error", "message": "Failed to persist message"}))
+            await send_event(websocket, {"type": "error", "message": "Failed to persist message"})
             return
         
         if message_payload:
@@ -508,38 +783,43 @@ async def websocket_handler(websocket, path):
     try:
         # Wait for authentication
         auth_message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-        auth_data = json.loads(auth_message)
+        auth_data = decode_event(auth_message)
         
         if auth_data.get("type") != "authenticate":
-            await websocket.send(json.dumps({"type": "error", "message": "Authentication required"}))
+            await send_event(websocket, {"type": "error", "message": "Authentication required"})
             return
         
         user_id = authenticate_token(auth_data.get("token"))
         if not user_id:
-            await websocket.send(json.dumps({"type": "error", "message": "Invalid token"}))
+            await send_event(websocket, {"type": "error", "message": "Invalid token"})
             return
         
         # Store connection locally and mark online in Redis
         local_connections.setdefault(user_id, set()).add(websocket)
-        redis_manager.set_user_online(user_id, {
-            "server_id": "main",
+        # Requested protocol if supported, JSON otherwise; the client sees which from the frame type
+        protocol = auth_data.get("protocol", "json")
+        outbound.open(websocket, user_id, protocol if protocol in PROTOCOLS else "json")
+        await async_redis_manager.set_user_online(user_id, {
+            "server_id": NODE_ID,
             "connected_at": datetime.utcnow().isoformat()
         })
         
         # Send authentication success
-        await websocket.send(json.dumps({
+        await send_event(websocket, {
             "type": "authenticated",
-            "user_id": user_id
-        }))
+            "user_id": user_id,
+            "protocol": socket_protocol(websocket)
+        })
         
         # Listen for messages
         async for message in websocket:
             try:
-                data = json.loads(message)
+                data = decode_event(message)
                 await handle_message(websocket, user_id, data)
-                redis_manager.update_user_activity(user_id)
-            except json.JSONDecodeError as e:
-                print(f"Invalid JSON from user {user_id}: {e}")
+                # Coalesced, written to Redis at most once per flush interval
+                activity.touch(user_id)
+            except ValueError as e:
+                print(f"Invalid frame from user {user_id}: {e!r}")
             except Exception as e:
                 print(f"Error handling message from user {user_id}: {e}")
                 
@@ -551,6 +831,7 @@ async def websocket_handler(websocket, path):
         print(f"WebSocket error for user {user_id}: {e}")
     finally:
         # Clean up connection
+        outbound.discard(websocket)
         if user_id:
             sockets = local_connections.get(user_id)
             if sockets and websocket in sockets:
@@ -560,51 +841,57 @@ async def websocket_handler(websocket, path):
                 local_connections[user_id] = sockets
             else:
                 local_connections.pop(user_id, None)
-                redis_manager.set_user_offline(user_id)
-
-            # Remove websocket from all private rooms + cleanup empty rooms
-            for room_id, room in list(private_rooms.items()):
-                if websocket in room.get("users", set()):
-                    room["users"].discard(websocket)
-                    try:
-                        await websocket.close()
-                    except Exception:
-                        pass
-
-                    # Notify remaining users
-                    remaining = len(room["users"])
+                activity.forget(user_id)
+                await async_redis_manager.set_user_offline(user_id, NODE_ID)
+
+            # Remove websocket from its private rooms + cleanup empty rooms
+            joined_rooms = socket_rooms.pop(websocket, set())
+            if joined_rooms:
+                try:
+                    await websocket.close()
+                except Exception:
+                    pass
+
+            for room_id in joined_rooms:
+                room = private_rooms.get(room_id)
+                if not room:
+                    continue
+                ttl_started = room.get("ttl_started", False)
+                expires_in = None
+                try:
+                    expires_in = _room_expires_in_seconds(room_id)
+                except Exception:
                     expires_in = None
-                    try:
-                        expires_in = _room_expires_in_seconds(room_id)
-                    except Exception:
-                        expires_in = None
-
-                    for ws in list(room["users"]):
-                        try:
-                            await ws.send(json.dumps({
-                                "type": "user_left_room",
-                                "room_id": room_id,
-                                "user_count": remaining,
-                                "ttl_started": room.get("ttl_started", False),
-                                "expires_in": expires_in,
-                            }))
-                        except Exception:
-                            room["users"].discard(ws)
-
-                    # If room is empty, destroy it
-                    if remaining == 0:
-                        if room.get("task"):
-                            try:
-                                room["task"].cancel()
-                            except Exception:
-                                pass
-                        private_rooms.pop(room_id, None)
+
+                # Drops the room once it is empty (also cancels its TTL timer)
+                remaining = await leave_room(room_id, [websocket])
+
+                # Notify remaining users
+                if remaining:
+                    await broadcast_to_room(room_id, {
+                        "type": "user_left_room",
+                        "room_id": room_id,
+                        "user_count": remaining,
+                        "ttl_started": ttl_started,
+                        "expires_in": expires_in,
+                    })
             print(f"User {user_id} disconnected")
 
-async def start_websocket_server(host: str = "0.0.0.0", port: int = 8765):
+async def start_websocket_server(host: str = "0.0.0.0", port: int = 8765, reuse_port: bool = False):
     """Start WebSocket server"""
     global ws_event_loop
     ws_event_loop = asyncio.get_running_loop()
+    # Presence client bound to this loop (the sync redis_manager would block it)
+    await async_redis_manager.connect()
+    room_expiry.start(expire_private_rooms)
+    activity.start(async_redis_manager)
+    presence.start(async_redis_manager, lambda: list(local_connections))
+    if CLUSTER_ENABLED and async_redis_manager.redis_client:
+        room_registry.start(async_redis_manager.redis_client, handle_remote_room_event)
+        await message_router.start(async_redis_manager.redis_client, deliver_routed_messages)
     print(f"WebSocket server running on ws://{host}:{port}")
-    async with websockets.serve(websocket_handler, host, port):
+    # reuse_port lets several worker processes listen on the same port.
+    # permessage-deflate is configured by WEBSOCKET_COMPRESSION_* instead of the library default.
+    async with websockets.serve(websocket_handler, host, port, reuse_port=reuse_port,
+                                compression=None, extensions=compression.extensions()):
         await asyncio.Future()  # run forever
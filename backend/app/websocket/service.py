@@ -5,10 +5,12 @@ from app.websocket.server import start_websocket_server
 from app.websocket import server as websocket_server
 from app.websocket.redis_manager import redis_manager
 import os
+import socket
 
 class WebSocketService:    
     def __init__(self):
         self.server_thread: Optional[threading.Thread] = None
+        self.supervisor = None
         self.is_running = False
         
     def start_server_in_thread(self, host: str = "0.0.0.0", port: int = 8765):
@@ -32,14 +34,32 @@ class WebSocketService:
         # daemon=True => it will exit automatically when the main program exits (avoiding zombie threads).
         self.server_thread.start()
         self.is_running = True
+
+    def start_workers(self, host: str = "0.0.0.0", port: int = 8765, workers: int = 2):
+        """Run the WebSocket server as worker processes sharing the port (SO_REUSEPORT)"""
+        if self.is_running:
+            return
+
+        # Imported here: the module is also the workers' entry point (python -m)
+        from app.websocket.workers import WorkerSupervisor
+        self.supervisor = WorkerSupervisor(workers, host, port)
+        self.supervisor.start()
+        self.is_running = True
     
     def is_user_online(self, user_id: int) -> bool:
         """Check if user is online using Redis"""
         return redis_manager.is_user_online(user_id)
     
-    def get_online_users(self) -> list:
-        """Get list of all online users"""
-        return redis_manager.get_online_users()
+    def get_online_users(self, within: Optional[int] = None, offset: int = 0, count: Optional[int] = None) -> list:
+        """Get list of online users (heartbeat in the last `within` seconds), optionally one slice of it"""
+        return redis_manager.get_online_users(within, offset, count)
+
+    def count_online_users(self, within: Optional[int] = None) -> int:
+        return redis_manager.count_online_users(within)
+
+    def scan_online_users(self, cursor: int = 0, count: int = 100, skip: int = 0):
+        """One page of online users: (next cursor, next skip, user ids), both 0 when done"""
+        return redis_manager.scan_online_users(cursor, count, skip)
 
 # Global service instance
 websocket_service = WebSocketService()
@@ -53,13 +73,23 @@ def init_websocket_service(app=None):
         if run_main is not None and run_main != "true":
             return websocket_service
 
+    # Inside a worker process app.websocket.workers runs the server itself
+    if os.getenv("WEBSOCKET_WORKER_INDEX") is not None:
+        return websocket_service
+
     host = os.getenv("WEBSOCKET_HOST", "0.0.0.0")
     port = int(os.getenv("WEBSOCKET_PORT", "8765"))
+    workers = int(os.getenv("WEBSOCKET_WORKERS", "0"))
 
     if app is not None:
         websocket_server.set_flask_app(app)
-    
-    websocket_service.start_server_in_thread(host, port)
+
+    if workers > 0 and hasattr(socket, "SO_REUSEPORT"):
+        websocket_service.start_workers(host, port, workers)
+    else:
+        if workers > 0:
+            print("SO_REUSEPORT is not supported here, running the WebSocket server in-process")
+        websocket_service.start_server_in_thread(host, port)
     
     if app:
         app.websocket_service = websocket_service
@@ -0,0 +1,130 @@
+import asyncio
+import atexit
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from app.websocket.cluster import NODE_ID
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Restart delay after a crash, doubled while a worker keeps crashing shortly after start
+RESTART_BACKOFF_SECONDS = 1
+MAX_RESTART_BACKOFF_SECONDS = 30
+# A worker that stayed up this long is considered healthy again
+STABLE_AFTER_SECONDS = 10
+
+
+class WorkerSupervisor:
+    """Runs the WebSocket tier as N worker processes sharing one port.
+
+    Every worker binds host:port with SO_REUSEPORT, so the kernel spreads new
+    connections over them and each worker's event loop gets its own core. The
+    workers share rooms and direct messages through Redis (WEBSOCKET_CLUSTER),
+    each under its own node id. A monitor thread restarts crashed workers.
+    """
+
+    def __init__(self, workers: int, host: str = "0.0.0.0", port: int = 8765):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.processes: List[Optional[subprocess.Popen]] = [None] * workers
+        self.started_at = [0.0] * workers
+        self.restart_at = [0.0] * workers
+        self.backoff = [RESTART_BACKOFF_SECONDS] * workers
+        self.restarts = [0] * workers
+        self.monitor_thread: Optional[threading.Thread] = None
+        self.stopping = False
+
+    def start(self):
+        if not os.getenv("REDIS_URL"):
+            print("WEBSOCKET_WORKERS without REDIS_URL: rooms and messages won't reach sockets on other workers")
+
+        for index in range(self.workers):
+            self.spawn(index)
+        self.monitor_thread = threading.Thread(target=self.monitor, name="ws-supervisor", daemon=True)
+        self.monitor_thread.start()
+        atexit.register(self.stop)
+
+    def spawn(self, index: int):
+        env = dict(
+            os.environ,
+            WEBSOCKET_WORKER_INDEX=str(index),
+            # New id per process: the crashed process's room counts drop out with its lease
+            WEBSOCKET_NODE_ID=f"{NODE_ID}-w{index}.{self.restarts[index]}",
+            WEBSOCKET_HOST=self.host,
+            WEBSOCKET_PORT=str(self.port),
+        )
+        self.processes[index] = subprocess.Popen(
+            [sys.executable, "-m", "app.websocket.workers"],
+            env=env,
+            cwd=BACKEND_DIR
+        )
+        self.started_at[index] = time.monotonic()
+        print(f"WebSocket worker {index} started (pid {self.processes[index].pid})")
+
+    def monitor(self):
+        while not self.stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if self.stopping:
+                    return
+
+                if process is not None and process.poll() is not None:
+                    if now - self.started_at[index] >= STABLE_AFTER_SECONDS:
+                        self.backoff[index] = RESTART_BACKOFF_SECONDS
+                    print(f"WebSocket worker {index} exited with {process.returncode}, restarting in {self.backoff[index]}s")
+                    self.processes[index] = None
+                    self.restart_at[index] = now + self.backoff[index]
+                    self.backoff[index] = min(self.backoff[index] * 2, MAX_RESTART_BACKOFF_SECONDS)
+
+                elif process is None and now >= self.restart_at[index]:
+                    self.restarts[index] += 1
+                    self.spawn(index)
+
+    def alive(self) -> int:
+        return sum(1 for process in self.processes if process is not None and process.poll() is None)
+
+    def stop(self):
+        self.stopping = True
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def exit_with_parent(parent_pid: int):
+    """Don't outlive the supervisor, an orphaned worker would keep holding the port"""
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    print("WebSocket supervisor exited, stopping worker")
+    os._exit(0)
+
+
+def main():
+    """Entry point of one worker process (started by WorkerSupervisor)"""
+    from app import app
+    from app.websocket import server as websocket_server
+
+    host = os.getenv("WEBSOCKET_HOST", "0.0.0.0")
+    port = int(os.getenv("WEBSOCKET_PORT", "8765"))
+
+    websocket_server.set_flask_app(app)
+    threading.Thread(target=exit_with_parent, args=(os.getppid(),), daemon=True).start()
+    try:
+        asyncio.run(websocket_server.start_websocket_server(host, port, reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Redis traffic of presence activity updates during a busy room.
+
+    python -m benchmarks.activity [flush seconds]   (default 15)
+    BENCHMARK_REDIS_URL=redis://host:6379/15 python -m benchmarks.activity 1
+
+Runs the WebSocket server in this process against the Redis at
+BENCHMARK_REDIS_URL (default redis://127.0.0.1:6379/15) with
+WEBSOCKET_ACTIVITY_FLUSH_SECONDS set to the argument. 50 users join one
+room and each sends 40 room messages (2000 inbound frames, 50 ms apart per
+round). Every round-trip and command the server's Redis client sends is
+counted from the first message until 8 seconds (or one flush interval, if
+longer) after the last one, so the count includes at least one flush.
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+from benchmarks.common import database_path, load_app
+
+USERS = 50
+MESSAGES = 40
+QUIET_SECONDS = 8
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    flush_seconds = sys.argv[1] if len(sys.argv) > 1 else "15"
+    os.environ["REDIS_URL"] = os.getenv("BENCHMARK_REDIS_URL", "redis://127.0.0.1:6379/15")
+    os.environ["WEBSOCKET_ACTIVITY_FLUSH_SECONDS"] = flush_seconds
+    app = load_app(database_path("activity"))
+
+    import jwt
+    import websockets
+    import redis.asyncio.connection as connection
+    from app.websocket import server as websocket_server
+
+    # Count what the server's async Redis client puts on the wire
+    counts = {"round_trips": 0, "commands": 0}
+    send_packed_command = connection.AbstractConnection.send_packed_command
+    pack_command = connection.AbstractConnection.pack_command
+
+    async def counted_send(self, command, check_health=True):
+        counts["round_trips"] += 1
+        return await send_packed_command(self, command, check_health)
+
+    def counted_pack(self, *args):
+        counts["commands"] += 1
+        return pack_command(self, *args)
+
+    connection.AbstractConnection.send_packed_command = counted_send
+    connection.AbstractConnection.pack_command = counted_pack
+
+    websocket_server.set_flask_app(app)
+    room_id = f"bench-{os.getpid()}"
+
+    async def run():
+        port = free_port()
+        server = asyncio.create_task(websocket_server.start_websocket_server("127.0.0.1", port))
+        await asyncio.sleep(1)
+
+        sockets = []
+        for user_id in range(1, USERS + 1):
+            token = jwt.encode({"user_id": user_id, "type": "websocket"}, app.config["SECRET_KEY"], algorithm="HS256")
+            ws = await websockets.connect(f"ws://127.0.0.1:{port}", compression=None)
+            await ws.send(json.dumps({"type": "authenticate", "token": token}))
+            await ws.recv()
+            sockets.append(ws)
+        await sockets[0].send(json.dumps({"type": "create_private_room", "room_id": room_id}))
+        for ws in sockets[1:]:
+            await ws.send(json.dumps({"type": "join_private_room", "room_id": room_id}))
+        await asyncio.sleep(1.5)
+
+        async def drain(ws):
+            try:
+                while True:
+                    await ws.recv()
+            except websockets.ConnectionClosed:
+                pass
+
+        drains = [asyncio.create_task(drain(ws)) for ws in sockets]
+        before = dict(counts)
+        start = time.perf_counter()
+        for n in range(MESSAGES):
+            for ws in sockets:
+                await ws.send(json.dumps({"type": "room_message", "room_id": room_id, "payload": n}))
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(max(QUIET_SECONDS, float(flush_seconds)))
+        elapsed = time.perf_counter() - start
+
+        round_trips = counts["round_trips"] - before["round_trips"]
+        commands = counts["commands"] - before["commands"]
+        print(f"flush every {flush_seconds}s: {USERS * MESSAGES} inbound frames in {elapsed:.1f}s, "
+              f"{round_trips} Redis round-trips, {commands} commands")
+        print(f"activity: {websocket_server.activity.stats()}")
+
+        for ws in sockets:
+            await ws.close()
+        for task in drains:
+            task.cancel()
+        server.cancel()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
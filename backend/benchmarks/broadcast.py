@@ -0,0 +1,85 @@
+"""Room fan-out: encode-once broadcast() against encoding and sending per recipient.
+
+    python -m benchmarks.broadcast
+
+Sends one room_message event to 10, 100 and 1000 in-memory sockets, the
+first of which takes 50 ms per send (a client on a bad link):
+  per recipient - json.dumps and await send for each socket in turn, as
+                  room fan-out worked before broadcast()
+  broadcast     - the event encoded once and queued on each socket's
+                  outbound queue, sent by the queues' writer tasks
+Prints how long the caller is blocked, and when the last fast socket got
+the frame. Also prints the cost of encoding the event per recipient.
+"""
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.common import database_path, load_app, median_ms
+
+SIZES = (10, 100, 1000)
+SLOW_SEND_SECONDS = 0.05
+
+
+class FakeSocket:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.received_at = None
+
+    async def send(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received_at = time.perf_counter()
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def main():
+    load_app(database_path("broadcast"))
+    from app.websocket import server as websocket_server
+    from app.websocket.outbound import outbound
+
+    event = {
+        "type": "room_message",
+        "room_id": "room-1",
+        "sender_id": 1,
+        "payload": {"text": "hello everyone, this is a room message of ordinary length"},
+        "timestamp": "2025-01-01T12:00:00",
+    }
+
+    async def per_recipient(sockets):
+        for ws in sockets:
+            await ws.send(json.dumps(event))
+
+    async def queued(sockets):
+        await websocket_server.broadcast(sockets, event)
+
+    async def measure(size, fan_out, use_queues):
+        sockets = [FakeSocket(SLOW_SEND_SECONDS)] + [FakeSocket() for _ in range(size - 1)]
+        if use_queues:
+            for ws in sockets:
+                outbound.open(ws)
+        start = time.perf_counter()
+        await fan_out(sockets)
+        blocked = time.perf_counter() - start
+        while any(ws.received_at is None for ws in sockets[1:]):
+            await asyncio.sleep(0)
+        served = max(ws.received_at for ws in sockets[1:]) - start
+        for ws in sockets:
+            outbound.discard(ws)
+        return blocked * 1000, served * 1000
+
+    print(f"encode per recipient: {median_ms(lambda: json.dumps(event), runs=10000) * 1000:.2f} us, "
+          f"encode_event once: {median_ms(lambda: websocket_server.encode_event(event), runs=10000) * 1000:.2f} us")
+    print(f"one socket takes {SLOW_SEND_SECONDS * 1000:.0f} ms per send")
+    for size in SIZES:
+        for label, fan_out, use_queues in (("per recipient", per_recipient, False), ("broadcast", queued, True)):
+            blocked, served = asyncio.run(measure(size, fan_out, use_queues))
+            print(f"{size:5} sockets  {label:14} caller blocked {blocked:7.2f} ms   "
+                  f"fast sockets served after {served:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Shared setup of the benchmark scripts.
+
+Run them from backend/ as modules, e.g. `python -m benchmarks.user_search 100000`.
+Each script builds its own SQLite database under BENCHMARK_DIR (default: the
+system temp directory) and reuses it on the next run with the same size.
+"""
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+BENCHMARK_DIR = os.getenv("BENCHMARK_DIR", tempfile.gettempdir())
+
+
+def database_path(name: str) -> str:
+    return os.path.join(BENCHMARK_DIR, f"chat-benchmark-{name}.db")
+
+
+def load_app(database_path: str, database_url: Optional[str] = None):
+    """The Flask app on the given SQLite file (or database_url), without starting the WebSocket server"""
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{database_path}"
+    # init_websocket_service skips the server in the reloader's parent process
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["WERKZEUG_RUN_MAIN"] = "false"
+    from app import app
+    return app
+
+
+def timings_ms(fn: Callable[[], object], runs: int) -> List[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def median_ms(fn: Callable[[], object], runs: int = 20) -> float:
+    return statistics.median(timings_ms(fn, runs))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,112 @@
+"""permessage-deflate settings: idle memory per connection, CPU and bytes per message.
+
+    python -m benchmarks.compression
+
+For each setting, builds 500 server-side extensions, sends one history page
+through each in both directions, and measures with tracemalloc the memory
+they keep between messages (next to CompressionSettings' own estimate).
+Then encodes 3000 varied ~200 B room events and 300 varied history pages of
+50 messages on one extension, and prints the time and output size per message.
+"""
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import database_path, load_app
+
+CONNECTIONS = 500
+WORDS = ("the meeting tomorrow at ten is moved to room four please bring notes and coffee "
+         "ok thanks see you later").split()
+
+
+def room_events(count: int) -> list:
+    return [
+        json.dumps({
+            "type": "room_message",
+            "room_id": "f3a9c2d4-1b6e-4c11-9a55-0d1e2f3a4b5c",
+            "payload": {"x": random.random(), "y": random.random()},
+            "sender_id": random.randint(1, 5000),
+            "timestamp": f"2026-10-18T07:38:{i % 60:02d}.{random.randint(0, 999999):06d}",
+        }).encode()
+        for i in range(count)
+    ]
+
+
+def history_pages(count: int) -> list:
+    return [
+        json.dumps({"messages": [
+            {
+                "id": 1000 + i * 50 + j,
+                "conversation_id": 7 + i,
+                "sender_id": random.randint(1, 5000),
+                "recipient_id": random.randint(1, 5000),
+                "content": " ".join(random.choice(WORDS) for _ in range(8)),
+                "message_type": "text",
+                "is_read": True,
+                "created_at": f"2026-10-{1 + i % 28:02d}T07:{j % 60:02d}:00",
+            }
+            for j in range(50)
+        ]}).encode()
+        for i in range(count)
+    ]
+
+
+def main():
+    load_app(database_path("compression"))
+    from websockets.frames import Frame, OP_TEXT
+    from app.websocket.compression import CompressionSettings, ThresholdPerMessageDeflate
+
+    def extension(settings):
+        takeover = settings.no_context_takeover
+        return ThresholdPerMessageDeflate(
+            takeover, takeover, settings.window_bits, settings.window_bits, {"memLevel": settings.mem_level},
+            min_size=settings.min_size
+        )
+
+    def idle_bytes(settings) -> float:
+        gc.collect()
+        tracemalloc.start()
+        extensions = [extension(settings) for _ in range(CONNECTIONS)]
+        for ext in extensions:
+            sent = ext.encode(Frame(OP_TEXT, pages[0]))
+            # The client sends back a compressed message, so the inflater is set up too
+            ext.decode(Frame(OP_TEXT, sent.data, rsv1=True))
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size / CONNECTIONS
+
+    def per_message(settings, messages) -> tuple:
+        ext = extension(settings)
+        out = 0
+        start = time.perf_counter()
+        for data in messages:
+            out += len(ext.encode(Frame(OP_TEXT, data)).data)
+        return (time.perf_counter() - start) / len(messages) * 1e6, out / len(messages)
+
+    random.seed(1)
+    events = room_events(3000)
+    pages = history_pages(300)
+    settings = {
+        "wb12 ml5 min0": CompressionSettings(min_size=0),
+        "wb12 ml5 min256": CompressionSettings(min_size=256),
+        "wb9 ml1 min256": CompressionSettings(window_bits=9, mem_level=1, min_size=256),
+        "wb15 ml8 min256": CompressionSettings(window_bits=15, mem_level=8, min_size=256),
+        "wb12 nct min0": CompressionSettings(no_context_takeover=True),
+        "wb12 nct min256": CompressionSettings(no_context_takeover=True, min_size=256),
+    }
+
+    print(f"off: room event {sum(map(len, events)) / len(events):.0f} B, "
+          f"history page {sum(map(len, pages)) / len(pages):.0f} B")
+    print(f"{'setting':18} {'idle mem/conn':>13} {'(estimate)':>11}   {'room event':>16}   {'history page':>18}")
+    for label, setting in settings.items():
+        memory = idle_bytes(setting)
+        event_us, event_bytes = per_message(setting, events)
+        page_us, page_bytes = per_message(setting, pages)
+        print(f"{label:18} {memory / 1024:10.1f} KB {setting.idle_bytes_per_connection() / 1024:8.1f} KB   "
+              f"{event_us:5.1f} us {event_bytes:5.0f} B   {page_us:6.1f} us {page_bytes:6.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Contacts sidebar: SQL statements and latency of one refresh.
+
+    python -m benchmarks.contacts [messages per conversation]   (default 20)
+
+Builds a fresh database where the reader has 10, 100 and 1000
+conversations, each with the given number of messages from the peer (a
+third of them unread), plus half as many conversations between other users.
+Prints the number of SQL statements and the median time of
+ChatService.get_user_contacts_with_details for the reader. Without
+REDIS_URL, presence comes from the in-memory fallback.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.common import database_path, load_app, median_ms
+
+SIZES = (10, 100, 1000)
+
+
+def main():
+    per_conversation = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    path = database_path("contacts")
+    if os.path.exists(path):
+        os.remove(path)
+    app = load_app(path)
+
+    from sqlalchemy import event, insert, text
+    from app.models import db, User, Conversations, Messages
+    from app.services.chat_service import ChatService
+    from app.services.summary_service import ConversationSummaryService
+
+    with app.app_context():
+        statements = []
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        started_at = datetime(2025, 1, 1)
+
+        for size in SIZES:
+            reader = User(username=f"reader-{size}")
+            peers = [User(username=f"peer-{size}-{i}") for i in range(size * 2)]
+            db.session.add(reader)
+            db.session.add_all(peers)
+            db.session.commit()
+
+            # Half the peers talk to the reader, the other half to each other
+            pairs = [(reader.id, peer.id) for peer in peers[:size]]
+            pairs += [(a.id, b.id) for a, b in zip(peers[size::2], peers[size + 1::2])]
+            conversations = [
+                Conversations(sender_id=a, receiver_id=b, min_user_id=min(a, b), max_user_id=max(a, b))
+                for a, b in pairs
+            ]
+            db.session.add_all(conversations)
+            db.session.flush()
+            db.session.execute(insert(Messages), [
+                {
+                    "conversation_id": conversation.id,
+                    "sender_id": conversation.receiver_id,
+                    "created_at": started_at + timedelta(minutes=i * per_conversation + n),
+                    "message_type": "text",
+                    "content": f"message {n}",
+                }
+                for i, conversation in enumerate(conversations)
+                for n in range(per_conversation)
+            ])
+            db.session.execute(text(
+                "INSERT INTO message_status (message_id, recipient_id, status) "
+                "SELECT messages.id, conversations.sender_id, CASE WHEN messages.id % 3 = 0 THEN 'delivered' ELSE 'read' END "
+                "FROM messages JOIN conversations ON conversations.id = messages.conversation_id "
+                "WHERE conversations.id >= :first"
+            ), {"first": conversations[0].id})
+            db.session.commit()
+        ConversationSummaryService.backfill()
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        print(f"{per_conversation} messages per conversation")
+        for size in SIZES:
+            reader_id = db.session.execute(
+                db.select(User.id).where(User.username == f"reader-{size}")
+            ).scalar_one()
+            statements.clear()
+            contacts = ChatService.get_user_contacts_with_details(reader_id)
+            count = len(statements)
+            elapsed = median_ms(lambda: ChatService.get_user_contacts_with_details(reader_id))
+            print(f"{len(contacts):5} conversations   {count} SQL statement(s)   median {elapsed:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Send throughput and latency with and without the group-commit writer.
+
+    python -m benchmarks.group_commit [threads] [messages per thread]   (default 20 20)
+    BENCHMARK_DATABASE_URL=postgresql://... python -m benchmarks.group_commit
+
+Each sender thread sends its messages one after another to the next user,
+first through ChatService.send_message (one commit per message), then
+through a GroupCommitWriter with the default window and batch size. Uses a
+fresh SQLite database unless BENCHMARK_DATABASE_URL points somewhere else;
+there the benchmark users and their messages are left behind.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks.common import database_path, load_app, percentile
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    path = database_path("group-commit")
+    if os.path.exists(path):
+        os.remove(path)
+    app = load_app(path, os.getenv("BENCHMARK_DATABASE_URL"))
+
+    from app.models import db, User
+    from app.services.message_writer import GroupCommitWriter
+
+    with app.app_context():
+        run_id = uuid.uuid4().hex[:8]
+        users = [User(username=f"bench-{run_id}-{i}") for i in range(threads)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        print(f"{db.engine.dialect.name}: {threads} threads x {per_thread} messages")
+
+    for label, writer in (("commit per message", GroupCommitWriter(enabled=False)),
+                          ("group commit", GroupCommitWriter(enabled=True))):
+        latencies = []
+        errors = []
+
+        def send(index):
+            with app.app_context():
+                for n in range(per_thread):
+                    start = time.perf_counter()
+                    try:
+                        writer.send_message(user_ids[index], user_ids[(index + 1) % threads], f"message {n}")
+                    except Exception as e:
+                        errors.append(e)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        senders = [threading.Thread(target=send, args=(i,)) for i in range(threads)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        elapsed = time.perf_counter() - start
+
+        stats = writer.stats()
+        print(f"{label:20} {elapsed:6.2f}s  {len(latencies) / elapsed:7.0f} msg/s  "
+              f"p50 {percentile(latencies, 0.5):6.1f} ms  p99 {percentile(latencies, 0.99):6.1f} ms  "
+              f"avg batch {stats['avg_batch_size'] or 1}  errors {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Conversation history: latest page, OFFSET page 10,000 and cursor page 10,000
+(or the last page, if the conversation is shorter).
+
+    python -m benchmarks.history [messages]          (default 500000)
+    READ_TRACKING_MODE=watermark python -m benchmarks.history
+
+Builds a fresh database with one conversation of `messages` messages (pages
+of 50) plus 20% as many in another conversation, all unread by the reader.
+The first history fetch marks them read; it is timed on its own. Then, per
+page, prints the median time of the history SELECT alone and of the whole
+ChatService.get_conversation_messages_formatted call, and the SELECT's plan.
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import database_path, load_app, median_ms
+
+PER_PAGE = 50
+DEEP_PAGE = 10000
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    path = database_path(f"history-{messages}")
+    if os.path.exists(path):
+        os.remove(path)
+    app = load_app(path)
+
+    from sqlalchemy import event, insert, select, text
+    from app.models import db, User, Messages, MessageStatus
+    from app.services.chat_service import ChatService
+    from app.services.summary_service import READ_TRACKING_MODE, ConversationSummaryService
+
+    with app.app_context():
+        reader, peer, other = User(username="reader"), User(username="peer"), User(username="other")
+        db.session.add_all([reader, peer, other])
+        db.session.commit()
+        conversation = ChatService.get_or_create_conversation(reader.id, peer.id)
+        noise = ChatService.get_or_create_conversation(reader.id, other.id)
+
+        start = time.time()
+        started_at = datetime(2025, 1, 1)
+        rows = [
+            {
+                "conversation_id": conversation.id if i % 6 else noise.id,
+                "sender_id": peer.id if i % 6 else other.id,
+                "created_at": started_at + timedelta(seconds=i // 3),  # equal timestamps: the id breaks ties
+                "message_type": "text",
+                "content": f"message {i}",
+            }
+            for i in range(messages * 6 // 5)
+        ]
+        db.session.execute(insert(Messages), rows)
+        db.session.execute(text(
+            "INSERT INTO message_status (message_id, recipient_id, status) SELECT id, :reader, 'delivered' FROM messages"
+        ), {"reader": reader.id})
+        db.session.commit()
+        ConversationSummaryService.backfill()
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        total = db.session.execute(
+            select(db.func.count(Messages.id)).where(Messages.conversation_id == conversation.id)
+        ).scalar()
+        print(f"{READ_TRACKING_MODE} mode: {total} messages in the conversation ({total // PER_PAGE} pages), "
+              f"built in {time.time() - start:.1f}s")
+
+        first = time.perf_counter()
+        ChatService.get_conversation_messages_formatted(reader.id, peer.id, per_page=PER_PAGE)
+        print(f"first fetch, marks {total} messages read: {(time.perf_counter() - first) * 1000:.1f} ms")
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, statement, parameters, context, many:
+                     statements.append((statement, parameters)) if statement.lstrip().startswith("SELECT messages.") else None)
+        raw = db.session.connection().connection.dbapi_connection
+
+        def run(label, **kwargs):
+            fetch = lambda: ChatService.get_conversation_messages_formatted(reader.id, peer.id, per_page=PER_PAGE, **kwargs)
+            full = median_ms(fetch)
+            statement, parameters = statements[-1]
+            query = median_ms(lambda: raw.execute(statement, parameters).fetchall())
+            print(f"{label:32} query {query:8.2f} ms   full call {full:8.2f} ms")
+            for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters):
+                print(f"    plan: {row[-1]}")
+
+        run("page=1, no cursor")
+        deep_page = min(DEEP_PAGE, total // PER_PAGE)
+        run(f"page={deep_page}, OFFSET", page=deep_page)
+        deep = db.session.execute(
+            select(Messages).where(Messages.conversation_id == conversation.id)
+            .order_by(Messages.created_at.desc(), Messages.id.desc())
+            .offset((deep_page - 1) * PER_PAGE - 1).limit(1)
+        ).scalar_one()
+        run(f"before=<cursor at page {deep_page}>", before=ChatService.encode_cursor(deep))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Friend suggestion scoring over a MatchingSnapshot.
+
+    python -m benchmarks.matching [users ...] [--tags N]   (default 10000 100000, 2000 tags)
+
+Generates users with three hobby tags each, drawn from a Zipf-distributed
+vocabulary, an age (or none) and a last-active time within 90 days. Per
+size, prints the snapshot build time and size, then the median time of one
+top-10 suggestion for a user with popular tags, rare tags, and no tags or
+age, against a plain Python loop that splits every row's hobbies and scores
+the tag overlap only.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import database_path, load_app, median_ms
+
+
+def generate_users(count: int, vocabulary: int, rng: random.Random) -> list:
+    tags = [f"tag{i}" for i in range(vocabulary)]
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    now = datetime.utcnow()
+    return [
+        (
+            user_id,
+            rng.choice([None] + list(range(18, 70))),
+            ",".join(rng.choices(tags, weights, k=3)),
+            now - timedelta(days=rng.random() * 90),
+        )
+        for user_id in range(1, count + 1)
+    ]
+
+
+def main():
+    args = sys.argv[1:]
+    vocabulary = 2000
+    if "--tags" in args:
+        index = args.index("--tags")
+        vocabulary = int(args[index + 1])
+        del args[index:index + 2]
+    sizes = [int(arg) for arg in args] or [10000, 100000]
+
+    load_app(database_path("matching"))
+    from app.services.matching import MatchingSnapshot
+
+    # Contacts to leave out, as suggest_users passes them
+    exclude = list(range(1, 200, 3))
+    popular = ["tag0", "tag1", "tag2"]
+    rare = [f"tag{vocabulary // 4}", f"tag{vocabulary // 2}", f"tag{vocabulary * 3 // 4}"]
+
+    for size in sizes:
+        users = generate_users(size, vocabulary, random.Random(1))
+        start = time.perf_counter()
+        snapshot = MatchingSnapshot.build(users)
+        build = (time.perf_counter() - start) * 1000
+
+        def python_loop():
+            mine = set(popular)
+            scored = []
+            for user_id, _, hobbies, _ in users:
+                theirs = set(hobbies.split(","))
+                scored.append((len(mine & theirs) / (len(theirs) * len(mine)) ** 0.5, user_id))
+            return sorted(scored)[-10:]
+
+        print(f"{size} users, {vocabulary} tags: build {build:.0f} ms, {snapshot.nbytes() / 1e6:.1f} MB")
+        print(f"  popular tags     {median_ms(lambda: snapshot.top(popular, 30, exclude, 10), runs=200):8.2f} ms")
+        print(f"  rare tags        {median_ms(lambda: snapshot.top(rare, 30, exclude, 10), runs=200):8.2f} ms")
+        print(f"  no tags, no age  {median_ms(lambda: snapshot.top([], None, exclude, 10), runs=200):8.2f} ms")
+        print(f"  Python loop      {median_ms(python_loop, runs=5):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Event loop lag while WebSocket chat messages are being persisted.
+
+    python -m benchmarks.persistence [senders] [messages per sender]   (default 20 25)
+
+A ticker task sleeps 5 ms at a time on the event loop and records how late
+each tick wakes up, while every sender sends its messages to one recipient:
+  idle     - senders only sleep, as a baseline
+  inline   - persist_chat_message called straight from the coroutine, as
+             handle_message did before the persistence lanes
+  executor - handle_message, which persists on persistence_executor's lanes
+Uses a fresh SQLite file, so each message is a real commit.
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.common import database_path, load_app, percentile
+
+TICK = 0.005
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_sender = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    path = database_path("persistence")
+    if os.path.exists(path):
+        os.remove(path)
+    app = load_app(path)
+
+    from app.models import db, User
+    from app.websocket import server as websocket_server
+
+    websocket_server.set_flask_app(app)
+    with app.app_context():
+        users = [User(username=f"user{i}") for i in range(senders + 1)]
+        db.session.add_all(users)
+        db.session.commit()
+        recipient_id, *sender_ids = [user.id for user in users]
+
+    async def inline(sender_id, content):
+        payload = websocket_server.persist_chat_message(sender_id, recipient_id, content, "text")
+        await websocket_server.send_to_user(recipient_id, {"type": "new_message", "data": payload})
+
+    async def executor(sender_id, content):
+        await websocket_server.handle_message(
+            None, sender_id, {"type": "send_message", "recipient_id": recipient_id, "content": content}
+        )
+
+    async def measure(send):
+        loop = asyncio.get_running_loop()
+        lags = []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                expected = loop.time() + TICK
+                await asyncio.sleep(TICK)
+                lags.append((loop.time() - expected) * 1000)
+
+        async def sender(sender_id):
+            for n in range(per_sender):
+                if send is None:
+                    await asyncio.sleep(0.01)
+                else:
+                    await send(sender_id, f"message {n}")
+
+        ticks = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(sender_id) for sender_id in sender_ids))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await ticks
+        return elapsed, lags
+
+    print(f"{senders} senders x {per_sender} messages, {TICK * 1000:.0f} ms ticks")
+    for label, send in (("idle", None), ("inline", inline), ("executor", executor)):
+        elapsed, lags = asyncio.run(measure(send))
+        print(f"{label:9} {elapsed:6.2f}s  ticks {len(lags):5}  lag p50 {percentile(lags, 0.5):7.1f} ms  "
+              f"p99 {percentile(lags, 0.99):7.1f} ms  max {max(lags):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
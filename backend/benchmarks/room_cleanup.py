@@ -0,0 +1,57 @@
+"""Disconnect cleanup: finding a socket's private rooms.
+
+    python -m benchmarks.room_cleanup [rooms] [sockets]   (default 100000 10000)
+
+Fills private_rooms with `rooms` rooms and puts each socket in one of them.
+Then times finding and leaving every socket's rooms:
+  index - socket_rooms.pop() plus remove_room_members(), as the disconnect
+          cleanup does now
+  scan  - checking every room for the socket, as it did before socket_rooms;
+          timed on 100 sockets and scaled up to all of them
+"""
+import contextlib
+import io
+import sys
+import time
+
+from benchmarks.common import database_path, load_app
+
+SCAN_SAMPLE = 100
+
+
+class FakeSocket:
+    pass
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sockets = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    load_app(database_path("room-cleanup"))
+    from app.websocket import server as websocket_server
+
+    room_ids = [f"room-{i}" for i in range(rooms)]
+    with contextlib.redirect_stdout(io.StringIO()):  # one log line per room
+        for room_id in room_ids:
+            websocket_server.create_private_room(room_id)
+    members = [FakeSocket() for _ in range(sockets)]
+    for i, ws in enumerate(members):
+        websocket_server.add_room_member(room_ids[i * rooms // sockets], ws)
+
+    start = time.perf_counter()
+    for ws in members[:SCAN_SAMPLE]:
+        [room_id for room_id, room in websocket_server.private_rooms.items() if ws in room["users"]]
+    scan = (time.perf_counter() - start) / SCAN_SAMPLE
+
+    start = time.perf_counter()
+    for ws in members:
+        for room_id in websocket_server.socket_rooms.pop(ws, set()):
+            websocket_server.remove_room_members(room_id, [ws])
+    index = (time.perf_counter() - start) / sockets
+
+    print(f"{rooms} rooms, {sockets} sockets")
+    print(f"index  {index * 1e6:9.2f} us per disconnect   {index * sockets * 1000:9.1f} ms for all")
+    print(f"scan   {scan * 1e6:9.2f} us per disconnect   {scan * sockets * 1000:9.1f} ms for all (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
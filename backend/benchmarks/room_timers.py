@@ -0,0 +1,67 @@
+"""Room TTL timers: a sleeping task per room against the ExpiryScheduler.
+
+    python -m benchmarks.room_timers [rooms]   (default 20000)
+
+Arms a one-hour timer for every room both ways and prints the memory each
+timer holds (tracemalloc, room id strings included), and the average cost
+of arming and cancelling one.
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import database_path, load_app
+
+TTL_SECONDS = 3600
+
+
+async def measure(rooms: int, arm, cancel):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    timers = [arm(f"room-{i}") for i in range(rooms)]
+    armed = time.perf_counter() - start
+    await asyncio.sleep(0)  # let the tasks start sleeping
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for timer in timers:
+        cancel(timer)
+    cancelled = time.perf_counter() - start
+    await asyncio.sleep(0)
+    return size / rooms, armed / rooms * 1e6, cancelled / rooms * 1e6
+
+
+async def run(rooms: int):
+    async def expire_later(room_id):
+        await asyncio.sleep(TTL_SECONDS)
+
+    from app.websocket.room_timers import ExpiryScheduler
+
+    scheduler = ExpiryScheduler(resolution=1.0)
+    results = {
+        "task per room": await measure(
+            rooms, lambda room_id: asyncio.create_task(expire_later(room_id)), lambda task: task.cancel()
+        ),
+        "ExpiryScheduler": await measure(
+            rooms, lambda room_id: scheduler.schedule(room_id, TTL_SECONDS) and room_id, scheduler.cancel
+        ),
+    }
+    print(f"{rooms} rooms")
+    for label, (size, armed, cancelled) in results.items():
+        print(f"{label:16} {size:8.0f} B per room   arm {armed:6.2f} us   cancel {cancelled:6.2f} us")
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    load_app(database_path("room-timers"))
+    asyncio.run(run(rooms))
+
+
+if __name__ == "__main__":
+    main()
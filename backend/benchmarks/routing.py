@@ -0,0 +1,85 @@
+"""Direct message routing between WebSocket nodes through Redis pub/sub.
+
+    python -m benchmarks.routing
+    BENCHMARK_REDIS_URL=redis://host:6379/15 python -m benchmarks.routing
+
+Starts 2, 4 and 8 DirectMessageRouters in one process against the Redis at
+BENCHMARK_REDIS_URL (default redis://127.0.0.1:6379/15), each one on its own
+inbox. Prints the latency of single events routed to the next node, paced
+2 ms apart, and the throughput when every node routes 2000 events at once.
+The figures include the Redis server's own latency.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+from benchmarks.common import database_path, load_app, percentile
+
+REDIS_URL = os.getenv("BENCHMARK_REDIS_URL", "redis://127.0.0.1:6379/15")
+LATENCY_EVENTS = 200
+BURST_EVENTS = 2000
+
+
+async def run(nodes: int):
+    import redis.asyncio as async_redis
+    from app.websocket.cluster import DirectMessageRouter
+
+    client = async_redis.from_url(REDIS_URL, decode_responses=True)
+    run_id = uuid.uuid4().hex[:8]
+    node_ids = [f"bench-{run_id}-{i}" for i in range(nodes)]
+    latencies = []
+    received = [0]
+
+    async def on_batch(items):
+        now = time.perf_counter()
+        for _, event in items:
+            latencies.append((now - event["sent_at"]) * 1000)
+        received[0] += len(items)
+
+    routers = [DirectMessageRouter(node_id) for node_id in node_ids]
+    for router in routers:
+        await router.start(client, on_batch)
+
+    async def send(index):
+        target = {node_ids[(index + 1) % nodes]}
+        await routers[index].route(1, {"type": "new_message", "sent_at": time.perf_counter()}, target)
+
+    async def wait_for(count):
+        while received[0] < count:
+            await asyncio.sleep(0.005)
+
+    try:
+        for n in range(LATENCY_EVENTS):
+            await send(n % nodes)
+            await asyncio.sleep(0.002)
+        await wait_for(LATENCY_EVENTS)
+        paced = list(latencies)
+
+        received[0] = 0
+        start = time.perf_counter()
+
+        async def burst(index):
+            for _ in range(BURST_EVENTS):
+                await send(index)
+
+        await asyncio.gather(*(burst(i) for i in range(nodes)))
+        await wait_for(nodes * BURST_EVENTS)
+        elapsed = time.perf_counter() - start
+        print(f"{nodes} nodes   p50 {percentile(paced, 0.5):6.2f} ms   p95 {percentile(paced, 0.95):6.2f} ms   "
+              f"{nodes * BURST_EVENTS / elapsed:7.0f} events/s")
+    finally:
+        for router in routers:
+            router.listener.cancel()
+            await router.pubsub.aclose()
+        await client.aclose()
+
+
+def main():
+    load_app(database_path("routing"))
+    for nodes in (2, 4, 8):
+        asyncio.run(run(nodes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""User search: indexed ranked search against the unindexed ILIKE scan.
+
+    python -m benchmarks.user_search [users]     (default 100000)
+
+Fills users with generated names, emails and hobbies (users_fts is kept in
+sync by its triggers), then prints the median time of one search of 10
+results per query. "rank of exact" is where an older user whose username is
+exactly the query lands, which must be 1 however many newer users match.
+"""
+import random
+import sqlite3
+import sys
+import time
+
+from benchmarks.common import database_path, load_app, median_ms
+
+FIRST = ("john johanna alice bob carol dave erin frank grace heidi ivan judy mallory niaj olivia peggy "
+         "rupert sybil trent victor walter xavier yara zoe arjun priya rahul sneha vikram anjali").split()
+LAST = "smith kumar nair menon pillai johnson brown garcia lee wong patel singh iyer das rao".split()
+HOBBIES = "chess hiking painting music football cricket coding reading dance photography cooking travel".split()
+QUERIES = ["jo", "john", "chess", "zoe rao", "qx"]
+
+
+def fill(path: str, users: int):
+    random.seed(7)
+    connection = sqlite3.connect(path)
+    # Exact-match targets among the oldest users
+    rows = [(query, f"{query.replace(' ', '.')}@example.com", "", "", "2026-01-01") for query in ("john", "jo")]
+    start = time.time()
+    for i in range(1, users + 1):
+        first, last = random.choice(FIRST), random.choice(LAST)
+        rows.append((f"{first.title()} {last.title()} {i}", f"{first}.{last}{i}@example.com",
+                     "hi I like " + random.choice(HOBBIES), ",".join(random.sample(HOBBIES, 2)), "2026-01-01"))
+        if len(rows) >= 50000:
+            connection.executemany("INSERT INTO users (username, email, bio, hobbies, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+            rows = []
+    connection.executemany("INSERT INTO users (username, email, bio, hobbies, created_at) VALUES (?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+    print(f"inserted {users} users in {time.time() - start:.1f}s")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = database_path(f"user-search-{users}")
+    app = load_app(path)
+
+    from app.models import db, User
+    from app.services.user_search import UserSearchService
+
+    with app.app_context():
+        if not db.session.query(User.id).limit(1).all():
+            fill(path, users)
+        exact = {user.username: user.id for user in db.session.query(User).filter(User.username.in_(("john", "jo")))}
+
+        runs = 20 if users < 1000000 else 5
+        print(f"{'users':>8} {'query':10} {'ILIKE scan ms':>14} {'indexed ms':>11} {'rank of exact':>14}")
+        for query in QUERIES:
+            scan = median_ms(lambda: UserSearchService.scan_ids(query, 0, 10), runs)
+            indexed = median_ms(lambda: UserSearchService.search_ids(query, 0, 10), runs)
+            ids = UserSearchService.search_ids(query, 0, 10)
+            rank = (ids.index(exact[query]) + 1 if exact[query] in ids else "missing") if query in exact else "-"
+            print(f"{users:>8} {query!r:10} {scan:>14.2f} {indexed:>11.2f} {rank!s:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Frame size and encode / decode cost of the JSON and MessagePack wire protocols.
+
+    python -m benchmarks.wire_protocol [iterations]   (default 100000)
+
+Uses a new_message and a room_message event. json is the stdlib module;
+orjson and msgpack are only measured when installed. "msgpack, no
+timestamps" is a plain packb, without the conversion of created_at /
+timestamp strings to native timestamps that encode_event does.
+"""
+import json
+import sys
+import time
+
+from benchmarks.common import database_path, load_app
+
+EVENTS = {
+    "new_message": {
+        "type": "new_message",
+        "data": {
+            "id": 123456, "conversation_id": 4321, "sender_id": 17, "recipient_id": 42,
+            "content": "Hey, are we still on for tomorrow at 10?", "message_type": "text",
+            "is_delivered": False, "is_read": False, "created_at": "2026-10-18T07:38:56.814828",
+            "sender": {"id": 17, "username": "alice", "full_name": "Alice Example", "profile_picture_url": None},
+        },
+    },
+    "room_message": {
+        "type": "room_message",
+        "room_id": "f3a9c2d4-1b6e-4c11-9a55-0d1e2f3a4b5c",
+        "payload": {"x": 0.25, "y": 0.75, "kind": "cursor"},
+        "sender_id": 17,
+        "timestamp": "2026-10-18T07:38:56.814828",
+    },
+}
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    load_app(database_path("wire-protocol"))
+    from app.websocket.server import decode_event, encode_event
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    try:
+        import msgpack
+    except ImportError:
+        msgpack = None
+
+    for name, event in EVENTS.items():
+        as_json = json.dumps(event)
+        print(f"{name}: {len(as_json.encode())} bytes as JSON", end="")
+        if msgpack is not None:
+            print(f", {len(encode_event(event, 'msgpack'))} bytes as MessagePack", end="")
+        print()
+
+        encoders = {"json": lambda: json.dumps(event)}
+        decoders = {"json": lambda: decode_event(as_json)}
+        if orjson is not None:
+            encoders["orjson"] = lambda: orjson.dumps(event).decode()
+        if msgpack is not None:
+            packed = encode_event(event, "msgpack")
+            encoders["msgpack"] = lambda: encode_event(event, "msgpack")
+            encoders["msgpack, no timestamps"] = lambda: msgpack.packb(event, use_bin_type=True)
+            decoders["msgpack"] = lambda: decode_event(packed)
+        for label, fn in encoders.items():
+            print(f"  encode {label:24} {per_call_us(fn, iterations):6.2f} us")
+        for label, fn in decoders.items():
+            print(f"  decode {label:24} {per_call_us(fn, iterations):6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,9 +29,19 @@ from app.models.user import User
 from app.models.converstaions import Conversations
 from app.models.messages import Messages
 from app.models.message_status import MessageStatus
+from app.models.conversation_summary import ConversationSummary
 
 target_metadata = db.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the hand-written user search index out of autogenerate (app/models/user_search.py)"""
+    if type_ == "table" and name.startswith("users_fts"):
+        return False
+    if type_ == "index" and name in ("ix_users_search_document", "ix_users_username_trgm", "ix_users_email_local_trgm", "ix_users_username_prefix"):
+        return False
+    return True
+
 # Set the database URL from environment
 database_url = os.getenv("DATABASE_URL")
 if database_url:
@@ -59,6 +69,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -82,7 +93,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
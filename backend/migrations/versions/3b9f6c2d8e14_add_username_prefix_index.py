@@ -0,0 +1,36 @@
+"""add username prefix index
+
+Revision ID: 3b9f6c2d8e14
+Revises: d7b3e5a1c9f4
+Create Date: 2026-10-18 21:14:37.520318
+
+Ordered b-tree on lower(username) for the username prefix probe of user
+search (byte order on PostgreSQL). The expression must match
+app/models/user_search.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f6c2d8e14'
+down_revision: Union[str, Sequence[str], None] = 'd7b3e5a1c9f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        op.execute("CREATE INDEX ix_users_username_prefix ON users (lower(username))")
+    elif dialect == "postgresql":
+        op.execute('CREATE INDEX ix_users_username_prefix ON users ((lower(username) COLLATE "C"))')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_username_prefix', table_name='users')
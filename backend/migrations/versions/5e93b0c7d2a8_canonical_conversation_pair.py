@@ -0,0 +1,114 @@
+"""canonical conversation pair
+
+Revision ID: 5e93b0c7d2a8
+Revises: c41d2e7f9a03
+Create Date: 2026-10-18 14:05:51.274960
+
+Conversations are keyed by (min_user_id, max_user_id). Existing duplicates
+created in opposite directions are merged into the oldest conversation, and
+the summaries of the conversations that absorbed duplicates are rebuilt.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e93b0c7d2a8'
+down_revision: Union[str, Sequence[str], None] = 'c41d2e7f9a03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same as app/services/summary_service.py
+PREVIEW_LENGTH = 200
+
+
+def rebuild_summaries(bind, conversation_id: int) -> None:
+    """Recompute a conversation's summary rows from its messages / message_status"""
+    sender_id, receiver_id = bind.execute(
+        sa.text("SELECT sender_id, receiver_id FROM conversations WHERE id = :id"), {"id": conversation_id}
+    ).one()
+    last = bind.execute(sa.text("""
+        SELECT id, content, created_at FROM messages WHERE conversation_id = :id
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    """), {"id": conversation_id}).first()
+
+    bind.execute(sa.text("DELETE FROM conversation_summaries WHERE conversation_id = :id"), {"id": conversation_id})
+    participants = [(sender_id, receiver_id)] if sender_id == receiver_id else [(sender_id, receiver_id), (receiver_id, sender_id)]
+    for user_id, peer_id in participants:
+        unread_count = bind.execute(sa.text("""
+            SELECT COUNT(*) FROM message_status
+            JOIN messages ON messages.id = message_status.message_id
+            WHERE messages.conversation_id = :id AND message_status.recipient_id = :user_id
+                AND messages.sender_id != :user_id AND message_status.status IN ('delivered', 'sent')
+        """), {"id": conversation_id, "user_id": user_id}).scalar()
+        bind.execute(sa.text("""
+            INSERT INTO conversation_summaries
+                (conversation_id, user_id, peer_id, last_message_id, last_message_preview, last_message_at, unread_count)
+            VALUES (:conversation_id, :user_id, :peer_id, :last_message_id, :preview, :last_message_at, :unread_count)
+        """), {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "peer_id": peer_id,
+            "last_message_id": last.id if last else None,
+            "preview": last.content[:PREVIEW_LENGTH] if last and last.content else None,
+            "last_message_at": last.created_at if last else None,
+            "unread_count": unread_count,
+        })
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('min_user_id', sa.Integer(), nullable=True))
+    op.add_column('conversations', sa.Column('max_user_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE conversations SET
+            min_user_id = CASE WHEN sender_id <= receiver_id THEN sender_id ELSE receiver_id END,
+            max_user_id = CASE WHEN sender_id <= receiver_id THEN receiver_id ELSE sender_id END
+    """)
+
+    # Merge duplicates into the oldest conversation of each pair. Only the
+    # duplicates' messages are moved; duplicates are rare, one UPDATE each.
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("""
+        SELECT dup.id, MIN(keeper.id) FROM conversations dup
+        JOIN conversations keeper ON keeper.min_user_id = dup.min_user_id
+            AND keeper.max_user_id = dup.max_user_id AND keeper.id < dup.id
+        GROUP BY dup.id
+    """)).all()
+    for duplicate_id, keeper_id in duplicates:
+        bind.execute(
+            sa.text("UPDATE messages SET conversation_id = :keeper_id WHERE conversation_id = :duplicate_id"),
+            {"keeper_id": keeper_id, "duplicate_id": duplicate_id}
+        )
+    op.execute("""
+        DELETE FROM conversation_summaries WHERE conversation_id IN (
+            SELECT dup.id FROM conversations dup
+            JOIN conversations keeper ON keeper.min_user_id = dup.min_user_id
+                AND keeper.max_user_id = dup.max_user_id AND keeper.id < dup.id
+        )
+    """)
+    op.execute("""
+        DELETE FROM conversations WHERE id IN (
+            SELECT dup.id FROM conversations dup
+            JOIN conversations keeper ON keeper.min_user_id = dup.min_user_id
+                AND keeper.max_user_id = dup.max_user_id AND keeper.id < dup.id
+        )
+    """)
+    # Their last message and unread counts now include the merged messages
+    for keeper_id in sorted({keeper_id for _, keeper_id in duplicates}):
+        rebuild_summaries(bind, keeper_id)
+
+    op.alter_column('conversations', 'min_user_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('conversations', 'max_user_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_constraint('unique_conversation', 'conversations', type_='unique')
+    op.create_unique_constraint('unique_conversation_pair', 'conversations', ['min_user_id', 'max_user_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('unique_conversation_pair', 'conversations', type_='unique')
+    op.create_unique_constraint('unique_conversation', 'conversations', ['sender_id', 'receiver_id'])
+    op.drop_column('conversations', 'max_user_id')
+    op.drop_column('conversations', 'min_user_id')
@@ -0,0 +1,52 @@
+"""add read watermarks
+
+Revision ID: 8f2a61d4c5b7
+Revises: 5e93b0c7d2a8
+Create Date: 2026-10-18 16:48:27.530816
+
+Watermarks are seeded from message_status. After upgrading, set
+READ_TRACKING_MODE=watermark to stop writing message_status rows.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2a61d4c5b7'
+down_revision: Union[str, Sequence[str], None] = '5e93b0c7d2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversation_summaries', sa.Column('last_read_message_id', sa.Integer(), nullable=True))
+    op.add_column('conversation_summaries', sa.Column('last_delivered_message_id', sa.Integer(), nullable=True))
+    op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', 'id'], unique=False)
+
+    op.execute("""
+        UPDATE conversation_summaries SET
+            last_read_message_id = (
+                SELECT MAX(m.id) FROM messages m
+                JOIN message_status ms ON ms.message_id = m.id
+                WHERE m.conversation_id = conversation_summaries.conversation_id
+                    AND ms.recipient_id = conversation_summaries.user_id
+                    AND ms.status = 'read'
+            ),
+            last_delivered_message_id = (
+                SELECT MAX(m.id) FROM messages m
+                JOIN message_status ms ON ms.message_id = m.id
+                WHERE m.conversation_id = conversation_summaries.conversation_id
+                    AND ms.recipient_id = conversation_summaries.user_id
+                    AND ms.status IN ('delivered', 'read')
+            )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_id_id', table_name='messages')
+    op.drop_column('conversation_summaries', 'last_delivered_message_id')
+    op.drop_column('conversation_summaries', 'last_read_message_id')
@@ -0,0 +1,28 @@
+"""add messages keyset index
+
+Revision ID: c41d2e7f9a03
+Revises: 1a878dd41024
+Create Date: 2026-10-18 11:40:02.593114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d2e7f9a03'
+down_revision: Union[str, Sequence[str], None] = '1a878dd41024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_conversation_created_id', 'messages', ['conversation_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_created_id', table_name='messages')
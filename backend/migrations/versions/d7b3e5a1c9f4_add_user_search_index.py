@@ -0,0 +1,87 @@
+"""add user search index
+
+Revision ID: d7b3e5a1c9f4
+Revises: 8f2a61d4c5b7
+Create Date: 2026-10-18 19:02:11.408215
+
+SQLite: users_fts (FTS5) plus triggers keeping it in sync with users, filled
+from the existing rows. PostgreSQL: a tsvector GIN index and pg_trgm indexes
+on users; CREATE EXTENSION pg_trgm needs a role allowed to create extensions.
+The index expressions must match app/models/user_search.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3e5a1c9f4'
+down_revision: Union[str, Sequence[str], None] = '8f2a61d4c5b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_EMAIL_LOCAL = "CASE WHEN instr({row}.email, '@') > 0 THEN substr({row}.email, 1, instr({row}.email, '@') - 1) ELSE {row}.email END"
+
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(split_part(email, '@', 1), '')"
+    " || ' ' || coalesce(bio, '') || ' ' || coalesce(hobbies, ''))"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        op.execute("""
+            CREATE VIRTUAL TABLE users_fts USING fts5(
+                username, email_local, bio, hobbies,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        op.execute(f"""
+            CREATE TRIGGER users_fts_insert AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+                VALUES (new.id, new.username, {SQLITE_EMAIL_LOCAL.format(row="new")}, new.bio, new.hobbies);
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER users_fts_update AFTER UPDATE OF username, email, bio, hobbies ON users BEGIN
+                DELETE FROM users_fts WHERE rowid = old.id;
+                INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+                VALUES (new.id, new.username, {SQLITE_EMAIL_LOCAL.format(row="new")}, new.bio, new.hobbies);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER users_fts_delete AFTER DELETE ON users BEGIN
+                DELETE FROM users_fts WHERE rowid = old.id;
+            END
+        """)
+        op.execute(f"""
+            INSERT INTO users_fts (rowid, username, email_local, bio, hobbies)
+            SELECT id, username, {SQLITE_EMAIL_LOCAL.format(row="users")}, bio, hobbies FROM users
+        """)
+
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"CREATE INDEX ix_users_search_document ON users USING gin ({PG_DOCUMENT})")
+        op.execute("CREATE INDEX ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_users_email_local_trgm ON users USING gin (lower(split_part(email, '@', 1)) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS users_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS users_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS users_fts_insert")
+        op.execute("DROP TABLE IF EXISTS users_fts")
+
+    elif dialect == "postgresql":
+        op.drop_index('ix_users_email_local_trgm', table_name='users')
+        op.drop_index('ix_users_username_trgm', table_name='users')
+        op.drop_index('ix_users_search_document', table_name='users')
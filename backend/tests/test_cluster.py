@@ -0,0 +1,295 @@
+"""Multi-node WebSocket tests: server processes sharing one Redis.
+
+Needs a running Redis. Point TEST_REDIS_URL at a database the test may write
+to (default redis://127.0.0.1:6379/15); the tests are skipped when it isn't
+reachable. Run from backend/:
+
+    python -m pytest tests
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import jwt
+import pytest
+import redis
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://127.0.0.1:6379/15")
+SECRET_KEY = "cluster-test-secret-key-of-32-bytes!"
+USERS = (1, 2, 3)
+HEARTBEAT_SECONDS = 2
+
+# Imports the app (which creates the schema and starts the WebSocket server
+# in a thread), then either seeds the users and exits or keeps serving
+NODE_SCRIPT = """
+import os, sys, time
+from app import app
+if sys.argv[1:] == ["seed"]:
+    from app.models import db, User
+    with app.app_context():
+        db.session.add_all([User(id=i, username=f"user{i}") for i in (%s)])
+        db.session.commit()
+    os._exit(0)
+while True:
+    time.sleep(3600)
+""" % ", ".join(map(str, USERS))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"node on port {port} exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"node on port {port} didn't start")
+
+
+@pytest.fixture(scope="module")
+def redis_client():
+    client = redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip(f"no Redis at {REDIS_URL}")
+    yield client
+    client.close()
+
+
+def child_pids(pid: int) -> list:
+    """Pids of the processes whose parent is pid (Linux /proc)"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # pid (comm) state ppid ...; comm may contain spaces
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(entry))
+    return children
+
+
+@pytest.fixture(scope="module")
+def cluster_env(redis_client, tmp_path_factory):
+    """Environment for node processes, with a shared SQLite database holding USERS"""
+    database = tmp_path_factory.mktemp("cluster") / "chat.db"
+    run_id = uuid.uuid4().hex[:8]
+    base_env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{database}",
+        REDIS_URL=REDIS_URL,
+        SECRET_KEY=SECRET_KEY,
+        FLASK_ENV="production",
+        WEBSOCKET_HOST="127.0.0.1",
+        WEBSOCKET_CLUSTER="1",
+        WEBSOCKET_WORKERS="0",
+        # Lease of 6 seconds, so a killed node drops out quickly
+        WEBSOCKET_HEARTBEAT_SECONDS=str(HEARTBEAT_SECONDS),
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", NODE_SCRIPT, "seed"], cwd=BACKEND_DIR, check=True, timeout=60,
+        env=dict(base_env, WEBSOCKET_PORT=str(free_port()), WEBSOCKET_NODE_ID=f"seed-{run_id}"),
+        stdout=subprocess.DEVNULL
+    )
+    return base_env
+
+
+@pytest.fixture(scope="module")
+def nodes(cluster_env):
+    """{node id: port} of three nodes with WEBSOCKET_CLUSTER=1 and a shared SQLite database"""
+    run_id = uuid.uuid4().hex[:8]
+    ports = {f"node{i}-{run_id}": free_port() for i in (1, 2, 3)}
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", NODE_SCRIPT], cwd=BACKEND_DIR,
+            env=dict(cluster_env, WEBSOCKET_PORT=str(port), WEBSOCKET_NODE_ID=node_id),
+            stdout=subprocess.DEVNULL
+        )
+        for node_id, port in ports.items()
+    ]
+    try:
+        for process, port in zip(processes, ports.values()):
+            wait_for_port(port, process)
+        yield ports
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+async def connect(port: int, user_id: int):
+    token = jwt.encode({"user_id": user_id, "type": "websocket"}, SECRET_KEY, algorithm="HS256")
+    websocket = await websockets.connect(f"ws://127.0.0.1:{port}")
+    await websocket.send(json.dumps({"type": "authenticate", "token": token}))
+    response = json.loads(await websocket.recv())
+    assert response["type"] == "authenticated", response
+    return websocket
+
+
+async def receive(websocket, message_type: str, timeout: float = 5) -> dict:
+    """Next event of the given type, skipping the others"""
+    deadline = time.monotonic() + timeout
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), deadline - time.monotonic()))
+        if message.get("type") == message_type:
+            return message
+
+
+def test_room_message_crosses_nodes(nodes):
+    node1, node2, _ = nodes.values()
+    room_id = f"room-{uuid.uuid4().hex[:8]}"
+
+    async def scenario():
+        creator = await connect(node1, 1)
+        member = await connect(node2, 2)
+        try:
+            await creator.send(json.dumps({"type": "create_private_room", "room_id": room_id}))
+            await receive(creator, "room_created")
+
+            await member.send(json.dumps({"type": "join_private_room", "room_id": room_id}))
+            joined = await receive(member, "joined_room")
+            assert joined["user_count"] == 2
+
+            await creator.send(json.dumps({"type": "room_message", "room_id": room_id, "payload": {"text": "hi"}}))
+            message = await receive(member, "room_message")
+            assert message["room_id"] == room_id
+            assert message["payload"] == {"text": "hi"}
+        finally:
+            await creator.close()
+            await member.close()
+
+    asyncio.run(scenario())
+
+
+def test_direct_message_goes_to_the_recipients_node_only(nodes, redis_client):
+    (id1, node1), (id2, node2), (id3, node3) = nodes.items()
+    inboxes = {node_id: f"ws:node:{node_id}:inbox" for node_id in (id1, id2, id3)}
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*inboxes.values())
+
+    async def scenario():
+        sender = await connect(node1, 1)
+        recipient = await connect(node2, 2)
+        # Keeps node 3 a live node with a user of its own
+        bystander = await connect(node3, 3)
+        try:
+            # Drop the subscribe confirmations and anything routed while connecting
+            while pubsub.get_message(timeout=0.2):
+                pass
+
+            await sender.send(json.dumps({"type": "send_message", "recipient_id": 2, "content": "hello"}))
+            message = await receive(recipient, "new_message")
+            assert message["data"]["content"] == "hello"
+            assert message["data"]["sender_id"] == 1
+        finally:
+            await sender.close()
+            await recipient.close()
+            await bystander.close()
+
+    asyncio.run(scenario())
+
+    routed = {node_id: [] for node_id in inboxes}
+    channels = {channel: node_id for node_id, channel in inboxes.items()}
+    deadline = time.monotonic() + 1
+    while time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.1)
+        if message:
+            routed[channels[message["channel"]]].append(json.loads(message["data"]))
+    pubsub.close()
+
+    new_messages = {
+        node_id: [envelope for envelope in envelopes if envelope["event"].get("type") == "new_message"]
+        for node_id, envelopes in routed.items()
+    }
+    assert [envelope["user_id"] for envelope in new_messages[id2]] == [2]
+    assert new_messages[id1] == []
+    assert new_messages[id3] == []
+
+
+def test_restarted_worker_leaves_no_stale_room_members(nodes, cluster_env, redis_client):
+    node1 = next(iter(nodes.values()))
+    supervisor_id = f"supervisor-{uuid.uuid4().hex[:8]}"
+    port = free_port()
+    supervisor = subprocess.Popen(
+        [sys.executable, "-c", NODE_SCRIPT], cwd=BACKEND_DIR,
+        env=dict(cluster_env, WEBSOCKET_WORKERS="1", WEBSOCKET_PORT=str(port), WEBSOCKET_NODE_ID=supervisor_id),
+        stdout=subprocess.DEVNULL
+    )
+    room_id = f"room-{uuid.uuid4().hex[:8]}"
+    room_key = f"ws:room:{room_id}"
+    crashed_worker = f"{supervisor_id}-w0.0"
+
+    async def wait_until(condition, timeout: float = 15):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            await asyncio.sleep(0.2)
+
+    async def scenario():
+        creator = await connect(node1, 1)
+        member = await connect(port, 2)
+        try:
+            await creator.send(json.dumps({"type": "create_private_room", "room_id": room_id}))
+            await receive(creator, "room_created")
+            await member.send(json.dumps({"type": "join_private_room", "room_id": room_id}))
+            assert (await receive(member, "joined_room"))["user_count"] == 2
+            assert redis_client.hget(room_key, f"node:{crashed_worker}") == "1"
+
+            # Crash the worker with its socket still in the room; the supervisor restarts it
+            [worker] = child_pids(supervisor.pid)
+            os.kill(worker, signal.SIGKILL)
+            await wait_until(lambda: [pid for pid in child_pids(supervisor.pid) if pid != worker])
+            wait_for_port(port, supervisor)
+            lease_expired = lambda: (redis_client.zscore("ws:nodes", crashed_worker) or 0) < time.time() - 3 * HEARTBEAT_SECONDS
+            await wait_until(lease_expired)
+
+            newcomer = await connect(port, 3)
+            try:
+                await newcomer.send(json.dumps({"type": "join_private_room", "room_id": room_id}))
+                # The crashed worker's member isn't counted any more, and its field is gone
+                assert (await receive(newcomer, "joined_room"))["user_count"] == 2
+                assert redis_client.hget(room_key, f"node:{crashed_worker}") is None
+
+                await newcomer.send(json.dumps({"type": "leave_private_room", "room_id": room_id}))
+                await receive(newcomer, "left_room")
+                await creator.send(json.dumps({"type": "leave_private_room", "room_id": room_id}))
+                await receive(creator, "left_room")
+                await wait_until(lambda: not redis_client.exists(room_key), timeout=5)
+            finally:
+                await newcomer.close()
+        finally:
+            await creator.close()
+            await member.close()
+
+    try:
+        wait_for_port(port, supervisor)
+        asyncio.run(scenario())
+    finally:
+        supervisor.terminate()
+        try:
+            supervisor.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            supervisor.kill()
+            supervisor.wait()
@@ -25,7 +25,7 @@ export async function GET(
         }
 
         const response = await fetch(
-            `${BACKEND_URL}/api/chat/conversation/${userId}`,
+            `${BACKEND_URL}/api/chat/conversation/${userId}${request.nextUrl.search}`,
             {
                 method: "GET",
                 headers: {